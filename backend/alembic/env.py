@@ -12,7 +12,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd())))
 
 from app.db.base import Base  # noqa
 from app.models.user import User  # noqa
-from app.models.provider import Establishment, Provider, ProviderWorkHours  # noqa
+from app.models.provider import Establishment, Provider, ProviderWorkHours, ProviderSlot  # noqa
 from app.models.appointment import Appointment  # noqa
 from app.core.config import settings
 
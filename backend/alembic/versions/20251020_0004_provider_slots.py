@@ -0,0 +1,39 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0004'
+down_revision = '20251020_0003'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('providers', sa.Column('timezone', sa.Text(), server_default=sa.text("'America/Sao_Paulo'"), nullable=False))
+    op.add_column('providers', sa.Column('slot_inventory_enabled', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+    op.add_column('providers', sa.Column('slots_generated_until', sa.Date(), nullable=True))
+
+    op.create_table('provider_slots',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('providers.id'), nullable=False),
+        sa.Column('starts_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('ends_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('status', sa.Text(), server_default=sa.text("'FREE'"), nullable=False),
+        sa.Column('appointment_id', postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_unique_constraint('uq_provider_slots_start', 'provider_slots', ['provider_id', 'starts_at'])
+    op.create_check_constraint('provider_slot_status_chk', 'provider_slots', "status in ('FREE','BOOKED')")
+    # leitura de disponibilidade: só linhas livres, em ordem de horário
+    op.create_index('idx_provider_slots_free', 'provider_slots', ['provider_id', 'starts_at'], postgresql_where=sa.text("status = 'FREE'"))
+    # liberação no cancelamento
+    op.create_index('idx_provider_slots_appt', 'provider_slots', ['appointment_id'], postgresql_where=sa.text('appointment_id IS NOT NULL'))
+
+def downgrade():
+    op.drop_index('idx_provider_slots_appt', table_name='provider_slots')
+    op.drop_index('idx_provider_slots_free', table_name='provider_slots')
+    op.drop_constraint('provider_slot_status_chk', 'provider_slots', type_='check')
+    op.drop_constraint('uq_provider_slots_start', 'provider_slots', type_='unique')
+    op.drop_table('provider_slots')
+    op.drop_column('providers', 'slots_generated_until')
+    op.drop_column('providers', 'slot_inventory_enabled')
+    op.drop_column('providers', 'timezone')
@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0005'
+down_revision = '20251020_0004'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # range scan do agendador de lembretes: só agendamentos ativos, por horário
+    op.create_index('idx_appointments_active_starts', 'appointments', ['starts_at'],
+                    postgresql_where=sa.text("status IN ('PENDING','CONFIRMED')"))
+
+    # tipo da mensagem agendada (ex.: 'reminder_1440m'); NULL para mensagens de evento do outbox
+    op.add_column('notification_messages', sa.Column('kind', sa.Text(), nullable=True))
+    # no máximo um lembrete de cada tipo por agendamento
+    op.create_index('uq_notification_messages_appt_kind', 'notification_messages', ['appointment_id', 'kind'],
+                    unique=True, postgresql_where=sa.text('kind IS NOT NULL'))
+
+def downgrade():
+    op.drop_index('uq_notification_messages_appt_kind', table_name='notification_messages')
+    op.drop_column('notification_messages', 'kind')
+    op.drop_index('idx_appointments_active_starts', table_name='appointments')
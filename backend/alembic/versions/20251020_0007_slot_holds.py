@@ -0,0 +1,27 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0007'
+down_revision = '20251020_0006'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('slot_holds',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('providers.id'), nullable=False),
+        sa.Column('starts_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_unique_constraint('uq_slot_holds_slot', 'slot_holds', ['provider_id', 'starts_at'])
+    # limpeza periódica dos holds vencidos
+    op.create_index('idx_slot_holds_expires', 'slot_holds', ['expires_at'])
+
+def downgrade():
+    op.drop_index('idx_slot_holds_expires', table_name='slot_holds')
+    op.drop_constraint('uq_slot_holds_slot', 'slot_holds', type_='unique')
+    op.drop_table('slot_holds')
@@ -0,0 +1,15 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0008'
+down_revision = '20251020_0007'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # incrementado a cada mudança de expediente (PUT /schedule conta uma vez)
+    op.add_column('providers', sa.Column('schedule_version', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+def downgrade():
+    op.drop_column('providers', 'schedule_version')
@@ -0,0 +1,69 @@
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0009'
+down_revision = '20251020_0008'
+branch_labels = None
+depends_on = None
+
+# agendamentos ativos que começam antes do fim de um anterior do mesmo prestador
+# (o expediente nunca exigiu a grade de slots: 10:00 e 10:15 podem coexistir)
+OVERLAPS_SQL = """
+    SELECT id, provider_id, starts_at, ends_at, prev_end, count(*) OVER () AS total
+    FROM (
+        SELECT id, provider_id, starts_at, ends_at,
+               max(ends_at) OVER (
+                   PARTITION BY provider_id ORDER BY starts_at, id
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ) AS prev_end
+        FROM appointments
+        WHERE status IN ('PENDING','CONFIRMED')
+    ) a
+    WHERE starts_at < prev_end
+    ORDER BY provider_id, starts_at
+    LIMIT 20
+"""
+
+def _check_no_overlaps():
+    rows = op.get_bind().execute(sa.text(OVERLAPS_SQL)).all()
+    if not rows:
+        return
+    listed = "\n".join(
+        f"  provider {r.provider_id}: appointment {r.id} [{r.starts_at}, {r.ends_at}) starts before {r.prev_end}"
+        for r in rows
+    )
+    raise RuntimeError(
+        f"appointments_no_overlap não pode ser criada: {rows[0].total} agendamento(s) ativo(s) se sobrepõem "
+        f"a outro do mesmo prestador (primeiros {len(rows)}):\n{listed}\n"
+        "Cancele ou remarque os conflitos (status = 'CANCELED') e rode a migration de novo."
+    )
+
+def upgrade():
+    _check_no_overlaps()
+    # btree_gist: igualdade de provider_id (uuid) dentro do índice GiST
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist;")
+    # coluna gerada: o ADD COLUMN preenche as linhas existentes a partir de starts_at/ends_at
+    op.execute("""
+        ALTER TABLE appointments
+        ADD COLUMN period tstzrange
+        GENERATED ALWAYS AS (tstzrange(starts_at, ends_at, '[)')) STORED;
+    """)
+    # nenhum par de agendamentos ativos do mesmo prestador pode se sobrepor
+    op.execute("""
+        ALTER TABLE appointments
+        ADD CONSTRAINT appointments_no_overlap
+        EXCLUDE USING gist (provider_id WITH =, period WITH &&)
+        WHERE (status IN ('PENDING','CONFIRMED'));
+    """)
+    # a exclusão cobre o caso de mesmo starts_at
+    op.execute("DROP INDEX IF EXISTS uq_appointments_provider_slot;")
+
+def downgrade():
+    op.execute("""
+        CREATE UNIQUE INDEX uq_appointments_provider_slot
+        ON appointments(provider_id, starts_at)
+        WHERE status IN ('PENDING','CONFIRMED');
+    """)
+    op.execute("ALTER TABLE appointments DROP CONSTRAINT IF EXISTS appointments_no_overlap;")
+    op.execute("ALTER TABLE appointments DROP COLUMN IF EXISTS period;")
@@ -0,0 +1,15 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0010'
+down_revision = '20251020_0009'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # exportação por prestador e intervalo, em ordem de início e com todos os status
+    # (o índice GiST de sobreposição só cobre os ativos)
+    op.create_index('idx_appointments_provider_starts', 'appointments', ['provider_id', 'starts_at'])
+
+def downgrade():
+    op.drop_index('idx_appointments_provider_starts', table_name='appointments')
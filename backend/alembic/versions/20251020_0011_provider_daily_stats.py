@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0011'
+down_revision = '20251020_0010'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # rollup por prestador e dia local, mantido pelo relay do outbox (APPT_CREATED/APPT_CANCELED)
+    op.create_table('provider_daily_stats',
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('providers.id'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('booked', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('canceled', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('booked_minutes', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+def downgrade():
+    op.drop_table('provider_daily_stats')
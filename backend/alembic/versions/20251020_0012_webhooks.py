@@ -0,0 +1,53 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0012'
+down_revision = '20251020_0011'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('webhook_subscriptions',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('providers.id'), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('secret', sa.Text(), nullable=False),
+        sa.Column('event_types', postgresql.ARRAY(sa.Text()), nullable=True),
+        sa.Column('batch_size', sa.Integer(), server_default=sa.text('1'), nullable=False),
+        sa.Column('max_concurrency', sa.Integer(), server_default=sa.text('2'), nullable=False),
+        sa.Column('active', sa.Boolean(), server_default=sa.text('true'), nullable=False),
+        # backoff do endpoint: falhas seguidas e até quando a entrega fica pausada
+        sa.Column('failure_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('paused_until', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_webhook_subscriptions_provider', 'webhook_subscriptions', ['provider_id'], postgresql_where=sa.text('active'))
+
+    op.create_table('webhook_deliveries',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column('subscription_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('webhook_subscriptions.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('outbox_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('event_type', sa.Text(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(), nullable=False),
+        sa.Column('status', sa.Text(), server_default=sa.text("'PENDING'"), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('next_attempt_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('sent_at', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.CheckConstraint("status in ('PENDING','SENDING','SENT','DEAD')", name='webhook_delivery_status_chk'),
+    )
+    # fan-out idempotente: um evento gera no máximo uma entrega por assinatura
+    op.create_unique_constraint('uq_webhook_deliveries_sub_event', 'webhook_deliveries', ['subscription_id', 'outbox_id'])
+    op.create_index('idx_webhook_deliveries_due', 'webhook_deliveries', ['subscription_id', 'next_attempt_at'],
+                    postgresql_where=sa.text("status IN ('PENDING','SENDING')"))
+
+def downgrade():
+    op.drop_index('idx_webhook_deliveries_due', table_name='webhook_deliveries')
+    op.drop_constraint('uq_webhook_deliveries_sub_event', 'webhook_deliveries', type_='unique')
+    op.drop_table('webhook_deliveries')
+    op.drop_index('idx_webhook_subscriptions_provider', table_name='webhook_subscriptions')
+    op.drop_table('webhook_subscriptions')
@@ -0,0 +1,26 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0013'
+down_revision = '20251020_0012'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('revoked_access_tokens',
+        sa.Column('jti', sa.Text(), primary_key=True),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('revoked_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    # atualização incremental do Bloom filter de cada processo da API
+    op.create_index('idx_revoked_access_tokens_revoked_at', 'revoked_access_tokens', ['revoked_at'])
+    # limpeza das revogações de tokens já vencidos
+    op.create_index('idx_revoked_access_tokens_expires', 'revoked_access_tokens', ['expires_at'])
+
+def downgrade():
+    op.drop_index('idx_revoked_access_tokens_expires', table_name='revoked_access_tokens')
+    op.drop_index('idx_revoked_access_tokens_revoked_at', table_name='revoked_access_tokens')
+    op.drop_table('revoked_access_tokens')
@@ -0,0 +1,44 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0014'
+down_revision = '20251020_0013'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('providers', sa.Column('slot_capacity', sa.Integer(), server_default=sa.text('1'), nullable=False))
+    op.create_check_constraint('provider_slot_capacity_chk', 'providers', 'slot_capacity >= 1')
+    op.add_column('appointments', sa.Column('group_booking', sa.Boolean(), server_default=sa.text('false'), nullable=False))
+
+    # vagas de grupo ficam fora da exclusão: o limite delas é o contador em slot_bookings
+    op.execute("ALTER TABLE appointments DROP CONSTRAINT appointments_no_overlap;")
+    op.execute("""
+        ALTER TABLE appointments
+        ADD CONSTRAINT appointments_no_overlap
+        EXCLUDE USING gist (provider_id WITH =, period WITH &&)
+        WHERE (status IN ('PENDING','CONFIRMED') AND NOT group_booking);
+    """)
+
+    # um contador por (prestador, início); a PK também atende a leitura por intervalo do dia
+    op.create_table('slot_bookings',
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('providers.id'), primary_key=True),
+        sa.Column('starts_at', sa.TIMESTAMP(timezone=True), primary_key=True),
+        sa.Column('booked', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.CheckConstraint('booked >= 0', name='slot_booking_booked_chk'),
+    )
+
+def downgrade():
+    op.drop_table('slot_bookings')
+    op.execute("ALTER TABLE appointments DROP CONSTRAINT appointments_no_overlap;")
+    op.execute("""
+        ALTER TABLE appointments
+        ADD CONSTRAINT appointments_no_overlap
+        EXCLUDE USING gist (provider_id WITH =, period WITH &&)
+        WHERE (status IN ('PENDING','CONFIRMED'));
+    """)
+    op.drop_column('appointments', 'group_booking')
+    op.drop_constraint('provider_slot_capacity_chk', 'providers', type_='check')
+    op.drop_column('providers', 'slot_capacity')
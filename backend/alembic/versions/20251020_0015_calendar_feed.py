@@ -0,0 +1,29 @@
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0015'
+down_revision = '20251020_0014'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('providers', sa.Column('calendar_token_hash', sa.Text(), nullable=True))
+    op.add_column('providers', sa.Column('calendar_version', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # VEVENTs prontos, mantidos pelo relay do outbox: o feed não lê appointments
+    op.create_table('provider_calendar_events',
+        sa.Column('appointment_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('appointments.id'), primary_key=True),
+        sa.Column('provider_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('providers.id'), nullable=False),
+        sa.Column('starts_at', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('vevent', sa.Text(), nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_provider_calendar_events_window', 'provider_calendar_events', ['provider_id', 'starts_at'])
+
+def downgrade():
+    op.drop_index('idx_provider_calendar_events_window', table_name='provider_calendar_events')
+    op.drop_table('provider_calendar_events')
+    op.drop_column('providers', 'calendar_version')
+    op.drop_column('providers', 'calendar_token_hash')
@@ -0,0 +1,14 @@
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '20251020_0016'
+down_revision = '20251020_0015'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # respostas de signup gravadas antes do escopo por e-mail continham access/refresh token em claro
+    op.execute("DELETE FROM idempotency_keys WHERE scope = 'auth.signup'")
+
+def downgrade():
+    pass
@@ -33,6 +33,14 @@ tags_metadata = [
         "name": "Appointments",
         "description": "Agendamentos: CRUD e status (Confirmado, Pendente, Finalizado, Cancelado, No-show).",
     },
+    {
+        "name": "Establishments",
+        "description": "Estabelecimentos: disponibilidade agregada dos prestadores.",
+    },
+    {
+        "name": "Webhooks",
+        "description": "Assinaturas de webhooks dos parceiros (eventos de agendamento assinados com HMAC).",
+    },
     {"name": "__internal__", "description": "Rotas internas (healthcheck, utilitários)."},
 ]
 
@@ -49,6 +57,8 @@ def _include_v1_routes(r: APIRouter) -> None:
         # Availability como subdomínio de providers reflete a hierarquia de negócio:
         ("app.api.availability", "router", "/providers", ["Availability"]),
         ("app.api.appointments", "router", "/appointments", ["Appointments"]),
+        ("app.api.establishments", "router", "/establishments", ["Establishments"]),
+        ("app.api.webhooks", "router", "/webhooks", ["Webhooks"]),
     ]
 
     for mod_path, attr, prefix, tags in specs:
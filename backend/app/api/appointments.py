@@ -1,32 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
-from datetime import timedelta, time, datetime
+from sqlalchemy import select, and_, func, update
+from sqlalchemy.exc import IntegrityError
+from datetime import timedelta, datetime
+from uuid import UUID, uuid4
 from zoneinfo import ZoneInfo
-from app.schemas.appointments import AppointmentCreate, AppointmentOut
-from app.api.deps import get_db, get_current_user_id
+from app.core.config import settings
+from app.schemas.appointments import AppointmentCreate, AppointmentOut, HoldCreate, HoldOut
+from app.api.deps import IDEMPOTENCY_HEADER, begin_idempotent, get_db, get_read_db, get_current_user_id, mark_recent_write
 from app.models.appointment import Appointment
-from app.models.provider import ProviderWorkHours
+from app.models.provider import Provider, ProviderWorkHours
+from app.services import idempotency
+from app.services.group_slots import book_seat, is_group, release_seat
 from app.services.outbox import enqueue_event
+from app.services.holds import acquire_hold, consume_hold, delete_hold, hold_owners, release_other_holds
+from app.services.slot_inventory import claim_slot, release_slot, slot_exists, slot_status
+from app.services.slots import SLOT_MINUTES, blocks_of, db_weekday, fits_work_blocks
 
 router = APIRouter()
-SLOT_MINUTES = 30
 
 def _is_within_work_hours(db: Session, provider_id: str, starts_local: datetime) -> bool:
-    weekday = starts_local.date().weekday()
-    weekday_db = (weekday + 1) % 7  # convert Mon=0 -> our 0=Sun
-    blocks = db.execute(select(ProviderWorkHours).where(ProviderWorkHours.provider_id==provider_id, ProviderWorkHours.weekday==weekday_db)).scalars().all()
-    if not blocks:
-        return False
-    for b in blocks:
-        b_start = datetime.combine(starts_local.date(), b.start_time, starts_local.tzinfo)
-        b_end = datetime.combine(starts_local.date(), b.end_time, starts_local.tzinfo)
-        if b_start <= starts_local < b_end and starts_local + timedelta(minutes=SLOT_MINUTES) <= b_end:
-            return True
-    return False
+    blocks = db.execute(select(ProviderWorkHours).where(ProviderWorkHours.provider_id==provider_id, ProviderWorkHours.weekday==db_weekday(starts_local.date()))).scalars().all()
+    return fits_work_blocks(blocks_of(blocks), starts_local)
+
+def _has_overlap(db: Session, provider_id: str, starts_utc: datetime, ends_utc: datetime) -> bool:
+    # Range overlap on the appointments_no_overlap GiST index (same partial predicate)
+    return db.scalar(select(Appointment.id).where(
+        and_(
+            Appointment.provider_id==provider_id,
+            Appointment.status.in_(("PENDING","CONFIRMED")),
+            ~Appointment.group_booking,
+            Appointment.period.overlaps(func.tstzrange(starts_utc, ends_utc, "[)")),
+        )
+    ).limit(1)) is not None
 
 @router.post("", response_model=AppointmentOut, status_code=201)
-def create_appointment(payload: AppointmentCreate, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def create_appointment(payload: AppointmentCreate, response: Response, user_id: str = Depends(get_current_user_id), idempotency_key: str | None = Header(default=None, alias=IDEMPOTENCY_HEADER), db: Session = Depends(get_db)):
+    # Keys are scoped per user; a replay skips every check below
+    scope = f"appointments.create:{user_id}"
+    fingerprint = idempotency.request_fingerprint(payload.model_dump(mode="json"))
+    if idempotency_key is not None:
+        replay = begin_idempotent(db, scope, idempotency_key, fingerprint)
+        if replay is not None:
+            mark_recent_write(replay, user_id)
+            return replay
+
     tzinfo = ZoneInfo(payload.tz)
     starts_local = payload.starts_at_iso.astimezone(tzinfo)
     ends_local = starts_local + timedelta(minutes=SLOT_MINUTES)
@@ -34,46 +52,141 @@ def create_appointment(payload: AppointmentCreate, user_id: str = Depends(get_cu
     if starts_local <= datetime.now(tzinfo):
         raise HTTPException(status_code=400, detail="cannot book in the past")
 
-    if not _is_within_work_hours(db, str(payload.provider_id), starts_local):
-        raise HTTPException(status_code=400, detail="outside provider work hours")
-
     starts_utc = starts_local.astimezone(ZoneInfo("UTC"))
     ends_utc = ends_local.astimezone(ZoneInfo("UTC"))
 
-    conflict = db.scalar(select(Appointment).where(
-        and_(
-            Appointment.provider_id==str(payload.provider_id),
-            Appointment.starts_at==starts_utc,
-            Appointment.status.in_(("PENDING","CONFIRMED"))
-        )
-    ))
-    if conflict:
-        raise HTTPException(status_code=409, detail="slot already taken")
+    provider = db.get(Provider, payload.provider_id)
+    group = is_group(provider)
+
+    # A live hold by another client overlapping this slot wins; our own is consumed by this booking
+    owners = set() if group else hold_owners(db, payload.provider_id, starts_utc, ends_utc)
+    if any(str(o) != str(user_id) for o in owners):
+        raise HTTPException(status_code=409, detail="slot is held by another client")
+
+    if group:
+        # Group slot: the conditional counter upsert takes a seat, no overlap query
+        if provider.slot_inventory_enabled:
+            fits = slot_exists(db, provider.id, starts_utc)
+        else:
+            fits = _is_within_work_hours(db, str(provider.id), starts_local)
+        if not fits:
+            raise HTTPException(status_code=400, detail="outside provider work hours")
+        if book_seat(db, provider.id, starts_utc, provider.slot_capacity) is None:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="slot is full")
+        appt = Appointment(user_id=user_id, provider_id=str(payload.provider_id), starts_at=starts_utc, ends_at=ends_utc, status="PENDING", group_booking=True)
+    elif provider is not None and provider.slot_inventory_enabled:
+        # Inventory mode: the atomic claim replaces the work-hour check and the conflict query
+        appt_id = uuid4()
+        if not claim_slot(db, provider.id, starts_utc, appt_id):
+            if slot_exists(db, provider.id, starts_utc):
+                raise HTTPException(status_code=409, detail="slot already taken")
+            raise HTTPException(status_code=400, detail="outside provider work hours")
+        appt = Appointment(id=appt_id, user_id=user_id, provider_id=str(payload.provider_id), starts_at=starts_utc, ends_at=ends_utc, status="PENDING")
+    else:
+        if not _is_within_work_hours(db, str(payload.provider_id), starts_local):
+            raise HTTPException(status_code=400, detail="outside provider work hours")
+
+        if _has_overlap(db, str(payload.provider_id), starts_utc, ends_utc):
+            raise HTTPException(status_code=409, detail="slot already taken")
+
+        appt = Appointment(user_id=user_id, provider_id=str(payload.provider_id), starts_at=starts_utc, ends_at=ends_utc, status="PENDING")
 
-    appt = Appointment(user_id=user_id, provider_id=str(payload.provider_id), starts_at=starts_utc, ends_at=ends_utc, status="PENDING")
     db.add(appt)
-    db.flush()  # get appt.id
-    enqueue_event(db, "Appointment", str(appt.id), "APPT_CREATED", {"provider_id": str(payload.provider_id), "starts_at": starts_utc.isoformat()})
+    try:
+        db.flush()  # get appt.id
+    except IntegrityError:
+        # lost the race on the appointments_no_overlap exclusion constraint
+        db.rollback()
+        raise HTTPException(status_code=409, detail="slot already taken")
+    enqueue_event(db, "Appointment", str(appt.id), "APPT_CREATED", {"provider_id": str(payload.provider_id), "starts_at": starts_utc.isoformat(), "ends_at": ends_utc.isoformat()})
+    if owners:
+        consume_hold(db, payload.provider_id, starts_utc, ends_utc, user_id)
+    body = {"id": str(appt.id), "status": appt.status}
+    if idempotency_key is not None:
+        idempotency.store(db, scope, idempotency_key, fingerprint, 201, body)
     db.commit()
-    db.refresh(appt)
-    return {"id": appt.id, "status": appt.status}
+    mark_recent_write(response, user_id)
+    return body
+
+@router.post("/holds", response_model=HoldOut, status_code=201)
+def create_hold(payload: HoldCreate, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """Reserve a slot for SLOT_HOLD_TTL_SECONDS while the client finishes checkout."""
+    tzinfo = ZoneInfo(payload.tz)
+    starts_local = payload.starts_at_iso.astimezone(tzinfo)
+    if starts_local <= datetime.now(tzinfo):
+        raise HTTPException(status_code=400, detail="cannot hold a slot in the past")
+    starts_utc = starts_local.astimezone(ZoneInfo("UTC"))
+    ends_utc = starts_utc + timedelta(minutes=SLOT_MINUTES)
+
+    provider = db.get(Provider, payload.provider_id)
+    if provider is None:
+        raise HTTPException(status_code=404, detail="provider not found")
+    if is_group(provider):
+        # Seats are taken by the counter at booking time; a hold would block the whole slot
+        raise HTTPException(status_code=400, detail="group slots cannot be held")
+    # Off-grid starts (10:00 vs 10:15) conflict by overlap, not only on the exact start;
+    # hold_owners also takes the provider lock before the appointment checks below
+    if any(str(o) != str(user_id) for o in hold_owners(db, provider.id, starts_utc, ends_utc)):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="slot is held by another client")
+    if provider.slot_inventory_enabled:
+        status = slot_status(db, provider.id, starts_utc)
+        if status is None:
+            raise HTTPException(status_code=400, detail="outside provider work hours")
+        if status != "FREE":
+            raise HTTPException(status_code=409, detail="slot already taken")
+    else:
+        if not _is_within_work_hours(db, str(provider.id), starts_local):
+            raise HTTPException(status_code=400, detail="outside provider work hours")
+        if _has_overlap(db, str(provider.id), starts_utc, ends_utc):
+            raise HTTPException(status_code=409, detail="slot already taken")
+
+    hold = acquire_hold(db, provider.id, starts_utc, user_id, settings.slot_hold_ttl_seconds)
+    if hold is None:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="slot is held by another client")
+    release_other_holds(db, provider.id, user_id, starts_utc)
+    db.commit()
+    return {"id": hold.id, "provider_id": provider.id, "starts_at": starts_utc, "expires_at": hold.expires_at}
+
+@router.delete("/holds/{hold_id}", status_code=204)
+def release_hold(hold_id: UUID, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    if not delete_hold(db, hold_id, user_id):
+        raise HTTPException(status_code=404, detail="not found")
+    db.commit()
+    return Response(status_code=204)
 
 @router.delete("/{appointment_id}")
-def cancel_appointment(appointment_id: str, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def cancel_appointment(appointment_id: str, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
     appt = db.scalar(select(Appointment).where(Appointment.id==appointment_id))
     if not appt:
         raise HTTPException(status_code=404, detail="not found")
     if str(appt.user_id) != str(user_id):
         raise HTTPException(status_code=403, detail="forbidden")
-    if appt.status == "CANCELED":
+    # Conditional update: of two concurrent cancels only one changes the row (the other
+    # waits on the row lock and then matches nothing), so the seat/slot is released and
+    # APPT_CANCELED is written exactly once
+    changed = db.execute(
+        update(Appointment)
+        .where(Appointment.id == appt.id, Appointment.status != "CANCELED")
+        .values(status="CANCELED")
+        .returning(Appointment.id)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if changed is None:
+        db.rollback()
         return {"status": "CANCELED", "id": appointment_id}
-    appt.status = "CANCELED"
-    db.add(appt)
-    enqueue_event(db, "Appointment", str(appt.id), "APPT_CANCELED", {"starts_at": appt.starts_at.isoformat()})
+    if appt.group_booking:
+        release_seat(db, appt.provider_id, appt.starts_at)
+    else:
+        release_slot(db, appt.id)
+    enqueue_event(db, "Appointment", str(appt.id), "APPT_CANCELED", {"provider_id": str(appt.provider_id), "starts_at": appt.starts_at.isoformat(), "ends_at": appt.ends_at.isoformat()})
     db.commit()
+    mark_recent_write(response, user_id)
     return {"status": "CANCELED", "id": appointment_id}
 
 @router.get("", response_model=list[AppointmentOut])
-def list_my_appointments(user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def list_my_appointments(user_id: str = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
     rows = db.execute(select(Appointment).where(Appointment.user_id==user_id).order_by(Appointment.starts_at.desc())).scalars().all()
     return [{"id": r.id, "status": r.status} for r in rows]
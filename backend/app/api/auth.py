@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import JWTError
 from sqlalchemy.orm import Session
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from app.db.session import SessionLocal
 from app.models.user import User
 from app.schemas.auth import SignupIn, LoginIn, TokenOut, RefreshIn
-from app.core.security import hash_password, verify_password, create_access_token
+from app.core.security import hash_password, verify_password, create_access_token, decode_access_token
 from app.core.tokens import issue_refresh_token, rotate_refresh_token, revoke_refresh_token
+from app.api.deps import IDEMPOTENCY_HEADER, lookup_idempotent, optional_auth_scheme
+from app.services import idempotency
+from app.services.token_revocation import get_revocation_list, revoke_access_token
 
 router = APIRouter()
 
@@ -16,17 +23,42 @@ def get_db():
     finally:
         db.close()
 
+def _issue_tokens(db: Session, user_id: str) -> dict:
+    access = create_access_token(user_id)
+    refresh = issue_refresh_token(db, user_id, commit=False)
+    return {"access_token": access, "refresh_token": refresh, "token_type": "bearer"}
+
 @router.post("/signup", status_code=201, response_model=TokenOut)
-def signup(payload: SignupIn, db: Session = Depends(get_db)):
+def signup(payload: SignupIn, response: Response, idempotency_key: str | None = Header(default=None, alias=IDEMPOTENCY_HEADER), db: Session = Depends(get_db)):
+    # Keys are scoped per email; only the created user id is stored, never the tokens.
+    # The password stays out of the fingerprint and is checked against the user on replay.
+    scope = f"auth.signup:{payload.email.lower()}"
+    fingerprint = idempotency.request_fingerprint({"email": payload.email, "full_name": payload.full_name})
+    if idempotency_key is not None:
+        replay = lookup_idempotent(db, scope, idempotency_key, fingerprint)
+        if replay is not None:
+            user = db.get(User, replay.response_body.get("user_id"))
+            if not user or not verify_password(payload.password, user.password_hash):
+                raise HTTPException(status_code=401, detail="invalid credentials")
+            body = _issue_tokens(db, str(user.id))
+            db.commit()
+            response.headers["Idempotent-Replayed"] = "true"
+            return body
     if db.scalar(select(User).where(User.email == payload.email)):
         raise HTTPException(status_code=409, detail="email already registered")
     user = User(email=payload.email, password_hash=hash_password(payload.password), full_name=payload.full_name)
     db.add(user)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="email already registered")
+    body = _issue_tokens(db, str(user.id))
+    if idempotency_key is not None:
+        idempotency.store(db, scope, idempotency_key, fingerprint, 201, {"user_id": str(user.id)})
+    # usuário, refresh token e chave de idempotência no mesmo commit
     db.commit()
-    db.refresh(user)
-    access = create_access_token(str(user.id))
-    refresh = issue_refresh_token(db, str(user.id))
-    return {"access_token": access, "refresh_token": refresh}
+    return body
 
 @router.post("/login", response_model=TokenOut)
 def login(payload: LoginIn, db: Session = Depends(get_db)):
@@ -46,6 +78,19 @@ def refresh(data: RefreshIn, db: Session = Depends(get_db)):
     return {"access_token": access, "refresh_token": refresh}
 
 @router.post("/logout")
-def logout(data: RefreshIn, db: Session = Depends(get_db)):
+def logout(data: RefreshIn, token: HTTPAuthorizationCredentials | None = Depends(optional_auth_scheme), db: Session = Depends(get_db)):
+    """Revokes the refresh token and, when sent as Bearer, the current access token."""
+    claims = None
+    if token is not None:
+        try:
+            claims = decode_access_token(token.credentials)
+        except JWTError:
+            pass  # access token já inválido/vencido: nada a revogar
+    if claims and claims.get("jti") and claims.get("sub"):
+        revoke_access_token(db, claims["jti"], claims["sub"], datetime.fromtimestamp(claims["exp"], tz=timezone.utc))
     revoke_refresh_token(db, data.refresh_token)
+    db.commit()
+    # neste processo vale na hora; nos demais, na próxima atualização do filtro
+    if claims and claims.get("jti"):
+        get_revocation_list().note_revoked(claims["jti"])
     return {"ok": True}
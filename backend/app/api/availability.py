@@ -1,18 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import select, and_
-from datetime import datetime, timedelta, time
+from datetime import datetime
+from uuid import UUID
 from zoneinfo import ZoneInfo
-from app.api.deps import get_db
-from app.models.provider import ProviderWorkHours
-from app.models.appointment import Appointment
+from app.api.deps import get_optional_user_id, get_read_db
+from app.core.config import settings
+from app.models.provider import Provider
+from app.schemas.establishments import NextAvailableOut
+from app.services.availability import day_availability
+from app.services.availability_stream import RESYNC, get_hub
+from app.services.group_slots import booked_counts, is_group
+from app.services.next_available import find_next_available
+from app.services.slots import UTC, day_bounds_utc
 
 router = APIRouter()
 
-SLOT_MINUTES = 30
-
 @router.get("/{provider_id}/availability")
-def get_availability(provider_id: str, date: str, tz: str = "America/Sao_Paulo", db: Session = Depends(get_db)):
+def get_availability(provider_id: str, date: str, tz: str = "America/Sao_Paulo", include_remaining: bool = False, user_id: str | None = Depends(get_optional_user_id), db: Session = Depends(get_read_db)):
+    """
+    Free slot starts of the day. With `include_remaining=true` each item is
+    `{"starts_at", "remaining"}`: open seats, from the slot_bookings counters for
+    group providers (slot_capacity > 1) and 1 otherwise.
+    """
     # Parse date & tz
     try:
         day = datetime.fromisoformat(date).date()  # YYYY-MM-DD
@@ -20,57 +33,131 @@ def get_availability(provider_id: str, date: str, tz: str = "America/Sao_Paulo",
     except Exception:
         raise HTTPException(status_code=400, detail="invalid date or tz")
 
-    weekday = day.weekday()  # Monday=0 ... Sunday=6; our table uses 0..6 with 0=Sunday, adapt:
-    # Convert to our convention (0=Sunday) -> Python Mon=0 => Sunday=6
-    weekday_db = (weekday + 1) % 7
-
-    # Work hours blocks
-    blocks = db.execute(select(ProviderWorkHours).where(ProviderWorkHours.provider_id == provider_id, ProviderWorkHours.weekday == weekday_db)).scalars().all()
-    if not blocks:
-        return []
-
-    # Build candidate slots in local tz
-    def generate_slots(start_t: time, end_t: time):
-        start_dt_local = datetime.combine(day, start_t, tzinfo)
-        end_dt_local = datetime.combine(day, end_t, tzinfo)
-        cur = start_dt_local
-        while cur + timedelta(minutes=SLOT_MINUTES) <= end_dt_local:
-            yield cur
-            cur += timedelta(minutes=SLOT_MINUTES)
-
-    candidate_local = []
-    for b in blocks:
-        candidate_local.extend(list(generate_slots(b.start_time, b.end_time)))
-
-    if not candidate_local:
-        return []
-
-    # Fetch taken slots for that provider/day (consider PENDING & CONFIRMED)
-    day_start_utc = datetime.combine(day, time(0,0,tzinfo=tzinfo)).astimezone(ZoneInfo("UTC"))
-    day_end_utc = (day_start_utc + timedelta(days=1))
-
-    taken = db.execute(
-        select(Appointment.starts_at).where(
-            and_(
-                Appointment.provider_id == provider_id,
-                Appointment.status.in_(("PENDING","CONFIRMED")),
-                Appointment.starts_at >= day_start_utc,
-                Appointment.starts_at < day_end_utc,
-            )
-        )
-    ).scalars().all()
-    taken_set = set(taken)
-
-    # Filter out taken and past slots
-    now_local = datetime.now(tzinfo)
-    available_local = []
-    for s in candidate_local:
-        s_utc = s.astimezone(ZoneInfo("UTC"))
-        if s_utc in taken_set:
-            continue
-        if s <= now_local:
-            continue
-        available_local.append(s)
-
-    # Return ISO strings in requested tz
-    return [s.isoformat() for s in sorted(available_local)]
+    slots = day_availability(db, provider_id, day, tzinfo, exclude_hold_user_id=user_id)
+    if not include_remaining:
+        return [s.isoformat() for s in slots]
+    provider = db.get(Provider, provider_id)  # already in the session identity map
+    if not is_group(provider):
+        return [{"starts_at": s.isoformat(), "remaining": 1} for s in slots]
+    booked = booked_counts(db, provider.id, *day_bounds_utc(day, tzinfo))
+    return [
+        {"starts_at": s.isoformat(), "remaining": provider.slot_capacity - booked.get(s.astimezone(UTC), 0)}
+        for s in slots
+    ]
+
+
+def parse_search_start(after: str | None, tz: str, max_days: int | None):
+    """Shared query parsing for the next-available routes: (tzinfo, start, horizon)."""
+    try:
+        tzinfo = ZoneInfo(tz)
+        start = datetime.now(UTC)
+        if after:
+            after_dt = datetime.fromisoformat(after)
+            if after_dt.tzinfo is None:
+                after_dt = after_dt.replace(tzinfo=tzinfo)
+            start = max(start, after_dt.astimezone(UTC))
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid after or tz")
+    horizon = settings.next_available_max_days if max_days is None else max_days
+    if not 1 <= horizon <= settings.next_available_max_days:
+        raise HTTPException(status_code=400, detail=f"max_days must be between 1 and {settings.next_available_max_days}")
+    return tzinfo, start, horizon
+
+
+def next_available_out(result, tzinfo) -> dict:
+    return {
+        "provider_id": result.provider_id,
+        "starts_at": result.starts_at.astimezone(tzinfo).isoformat() if result.starts_at else None,
+        "searched_until": result.searched_until.isoformat(),
+    }
+
+
+@router.get("/{provider_id}/next-available", response_model=NextAvailableOut)
+def get_next_available(provider_id: UUID, after: str | None = None, tz: str = "America/Sao_Paulo", max_days: int | None = None, user_id: str | None = Depends(get_optional_user_id), db: Session = Depends(get_read_db)):
+    """
+    First free slot at or after `after` (default: now), searched in growing windows
+    up to `max_days` (capped by NEXT_AVAILABLE_MAX_DAYS). starts_at is null when
+    nothing is free within the horizon.
+    """
+    tzinfo, start, horizon = parse_search_start(after, tz, max_days)
+    provider = db.get(Provider, provider_id)
+    if provider is None:
+        raise HTTPException(status_code=404, detail="not found")
+    result = find_next_available(db, [provider], tzinfo, start, horizon, exclude_hold_user_id=user_id)
+    return next_available_out(result, tzinfo)
+
+
+def _sse(event: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@router.get("/{provider_id}/availability/stream")
+async def stream_availability(provider_id: UUID, request: Request, date: str, tz: str = "America/Sao_Paulo"):
+    """
+    Server-Sent Events for a public booking page: one `snapshot` event with the day's
+    free slots, then `slot-taken` / `slot-freed` deltas as appointments are booked or
+    canceled. Slots held by anyone count as taken (anonymous view). A client that falls
+    behind gets a fresh `snapshot` instead of the missed deltas.
+    """
+    try:
+        day = datetime.fromisoformat(date).date()
+        ZoneInfo(tz)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid date or tz")
+    hub = get_hub()
+    try:
+        sub = await run_in_threadpool(hub.subscribe, provider_id, day, tz, asyncio.get_running_loop())
+    except RuntimeError:
+        raise HTTPException(status_code=503, detail="live availability unavailable")
+    if sub is None:
+        raise HTTPException(status_code=404, detail="not found")
+
+    def snapshot() -> str:
+        version, slots = sub.snapshot()
+        return _sse("snapshot", {"date": day.isoformat(), "tz": tz, "slots": slots}, version)
+
+    async def wait_disconnect():
+        # uvicorn (ASGI 2.4) drops writes to a closed socket silently; watch receive() instead
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    async def events():
+        disconnected = asyncio.ensure_future(wait_disconnect())
+        try:
+            yield "retry: 3000\n\n" + snapshot()
+            while True:
+                getter = asyncio.ensure_future(sub.queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, disconnected}, timeout=settings.availability_stream_keepalive_seconds,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if getter not in done:
+                    getter.cancel()
+                    if disconnected in done:
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                msg = getter.result()
+                if msg is RESYNC:
+                    yield snapshot()
+                    continue
+                version, taken, freed = msg
+                if version <= sub.version:
+                    continue  # already in the snapshot
+                sub.version = version
+                out = ""
+                if taken:
+                    out += _sse("slot-taken", {"slots": taken}, version)
+                if freed:
+                    out += _sse("slot-freed", {"slots": freed}, version)
+                yield out
+        finally:
+            disconnected.cancel()
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
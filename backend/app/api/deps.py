@@ -1,12 +1,19 @@
+import threading
+import time
 from typing import Generator
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
-from app.db.session import SessionLocal
+from jose import JWTError
+from app.db.session import SessionLocal, ReadSessionLocal
+from app.db.replica import replica_health
 from app.core.config import settings
+from app.core.security import decode_access_token
+from app.services import idempotency
+from app.services.token_revocation import get_revocation_list
 
-ALGO = "HS256"
 auth_scheme = HTTPBearer()
 
 def get_db() -> Generator[Session, None, None]:
@@ -16,12 +23,125 @@ def get_db() -> Generator[Session, None, None]:
     finally:
         db.close()
 
+# Read-your-writes: após uma escrita o cliente lê do primário por READ_YOUR_WRITES_SECONDS.
+#   - cookie primary_until (navegadores);
+#   - header X-Primary-Until na resposta da escrita, que o cliente devolve nas leituras
+#     (apps que não guardam cookie; vale entre processos);
+#   - marca por usuário no próprio processo: GET com o Bearer de quem acabou de escrever
+#     vai ao primário mesmo sem cookie nem header.
+PRIMARY_UNTIL_COOKIE = "primary_until"
+PRIMARY_UNTIL_HEADER = "X-Primary-Until"
+
+class RecentWriters:
+    """user_id -> fim da janela de read-your-writes (epoch); vencidos saem na limpeza preguiçosa."""
+
+    def __init__(self, max_entries: int = 100_000):
+        self._until: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def mark(self, user_id, until: float) -> None:
+        with self._lock:
+            if len(self._until) >= self._max_entries:
+                now = time.time()
+                self._until = {u: t for u, t in self._until.items() if t > now}
+            self._until[str(user_id)] = until
+
+    def active(self, user_id) -> bool:
+        until = self._until.get(str(user_id))
+        return until is not None and until > time.time()
+
+    def __bool__(self) -> bool:
+        return bool(self._until)
+
+recent_writers = RecentWriters()
+
+def mark_recent_write(response: Response, user_id=None) -> None:
+    until = int(time.time()) + settings.read_your_writes_seconds
+    response.set_cookie(PRIMARY_UNTIL_COOKIE, str(until), max_age=settings.read_your_writes_seconds, httponly=True, samesite="lax")
+    response.headers[PRIMARY_UNTIL_HEADER] = str(until)
+    if user_id is not None:
+        recent_writers.mark(user_id, until)
+
+def _within_window(raw: str | None, now: float) -> bool:
+    # o valor vem do cliente: só vale até READ_YOUR_WRITES_SECONDS à frente
+    try:
+        return raw is not None and now < int(raw) <= now + settings.read_your_writes_seconds
+    except ValueError:
+        return False
+
+def _bearer_user_id(request: Request) -> str | None:
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not credentials:
+        return None
+    try:
+        return decode_access_token(credentials).get("sub")
+    except JWTError:
+        return None
+
+def _wants_primary(request: Request) -> bool:
+    now = time.time()
+    if _within_window(request.cookies.get(PRIMARY_UNTIL_COOKIE), now) or _within_window(request.headers.get(PRIMARY_UNTIL_HEADER), now):
+        return True
+    if not recent_writers:
+        return False
+    user_id = _bearer_user_id(request)
+    return user_id is not None and recent_writers.active(user_id)
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """
+    Sessão para rotas GET: usa a réplica quando configurada e saudável,
+    senão (ou dentro da janela de read-your-writes) cai no primário.
+    """
+    use_replica = ReadSessionLocal is not None and not _wants_primary(request) and replica_health.is_healthy()
+    db = ReadSessionLocal() if use_replica else SessionLocal()
+    try:
+        yield db
+    except OperationalError:
+        if use_replica:
+            replica_health.mark_down()
+        raise
+    finally:
+        db.close()
+
+# Idempotency-Key: replay da resposta gravada ou None (o handler executa e chama idempotency.store)
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+def lookup_idempotent(db: Session, scope: str, key: str, fingerprint: str):
+    """Takes the key's lock and returns the stored row (or None); errors map to 400/409/422."""
+    if not key or len(key) > idempotency.MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="invalid Idempotency-Key")
+    try:
+        return idempotency.begin(db, scope, key, fingerprint)
+    except idempotency.IdempotencyKeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+    except idempotency.IdempotencyInProgress:
+        raise HTTPException(status_code=409, detail="request with this Idempotency-Key is still in progress")
+
+def begin_idempotent(db: Session, scope: str, key: str, fingerprint: str) -> Response | None:
+    row = lookup_idempotent(db, scope, key, fingerprint)
+    if row is None:
+        return None
+    return JSONResponse(status_code=row.status_code, content=row.response_body, headers={"Idempotent-Replayed": "true"})
+
 def get_current_user_id(token: HTTPAuthorizationCredentials = Depends(auth_scheme)) -> str:
     try:
-        payload = jwt.decode(token.credentials, settings.secret_key, algorithms=[ALGO])
+        payload = decode_access_token(token.credentials)
         sub = payload.get("sub")
         if not sub:
             raise ValueError("no sub")
-        return sub
     except (JWTError, ValueError):
         raise HTTPException(status_code=401, detail="invalid token")
+    # tokens emitidos antes do jti não são revogáveis: valem até o exp (ACCESS_TOKEN_EXPIRES_MIN)
+    jti = payload.get("jti")
+    if jti and get_revocation_list().is_revoked(jti):
+        raise HTTPException(status_code=401, detail="token revoked")
+    return sub
+
+optional_auth_scheme = HTTPBearer(auto_error=False)
+
+def get_optional_user_id(token: HTTPAuthorizationCredentials | None = Depends(optional_auth_scheme)) -> str | None:
+    """Rotas públicas que mudam com o usuário (ex.: disponibilidade ignora os próprios holds)."""
+    if token is None:
+        return None
+    return get_current_user_id(token)
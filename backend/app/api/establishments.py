@@ -0,0 +1,70 @@
+from datetime import datetime
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api.availability import next_available_out, parse_search_start
+from app.api.deps import get_optional_user_id, get_read_db
+from app.models.provider import Establishment, Provider
+from app.schemas.establishments import EstablishmentAvailabilityOut, NextAvailableOut
+from app.services.availability import availability_by_provider
+from app.services.next_available import find_next_available
+from app.services.slots import UTC
+
+router = APIRouter()
+
+@router.get("/{establishment_id}/availability", response_model=EstablishmentAvailabilityOut)
+def get_establishment_availability(establishment_id: UUID, date: str, tz: str = "America/Sao_Paulo", user_id: str | None = Depends(get_optional_user_id), db: Session = Depends(get_read_db)):
+    """
+    Availability for every provider of the establishment, plus the union ("any provider").
+    Same rules as the provider route (services.availability.availability_by_provider); the query
+    count is fixed, independent of how many providers the establishment has.
+    """
+    try:
+        day = datetime.fromisoformat(date).date()
+        tzinfo = ZoneInfo(tz)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid date or tz")
+
+    if db.get(Establishment, establishment_id) is None:
+        raise HTTPException(status_code=404, detail="not found")
+
+    providers = db.execute(
+        select(Provider).where(Provider.establishment_id == establishment_id).order_by(Provider.display_name)
+    ).scalars().all()
+    if not providers:
+        return {"date": day.isoformat(), "tz": tz, "any": [], "providers": []}
+
+    slots_by_provider = availability_by_provider(db, providers, day, tzinfo, exclude_hold_user_id=user_id)
+
+    per_provider = []
+    union: set[datetime] = set()
+    for p in providers:
+        slots = slots_by_provider[p.id]
+        union.update(s.astimezone(UTC) for s in slots)
+        per_provider.append({
+            "provider_id": p.id,
+            "display_name": p.display_name,
+            "slots": [s.astimezone(tzinfo).isoformat() for s in slots],
+        })
+
+    return {
+        "date": day.isoformat(),
+        "tz": tz,
+        "any": [s.astimezone(tzinfo).isoformat() for s in sorted(union)],
+        "providers": per_provider,
+    }
+
+
+@router.get("/{establishment_id}/next-available", response_model=NextAvailableOut)
+def get_establishment_next_available(establishment_id: UUID, after: str | None = None, tz: str = "America/Sao_Paulo", max_days: int | None = None, user_id: str | None = Depends(get_optional_user_id), db: Session = Depends(get_read_db)):
+    """Earliest free slot across all providers of the establishment (same search as the provider route)."""
+    tzinfo, start, horizon = parse_search_start(after, tz, max_days)
+    if db.get(Establishment, establishment_id) is None:
+        raise HTTPException(status_code=404, detail="not found")
+    providers = db.execute(select(Provider).where(Provider.establishment_id == establishment_id)).scalars().all()
+    result = find_next_available(db, providers, tzinfo, start, horizon, exclude_hold_user_id=user_id)
+    return next_available_out(result, tzinfo)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from app.db.replica import replica_health
 
 router = APIRouter()
 
@@ -8,4 +9,4 @@ def healthz():
 
 @router.get("/ready")
 def ready():
-    return {"status": "ready"}
+    return {"status": "ready", "read_replica": replica_health.status()}
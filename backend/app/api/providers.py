@@ -1,51 +1,101 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 from uuid import UUID
-from datetime import time
-from app.api.deps import get_db, get_current_user_id
-from app.schemas.providers import ProviderCreate, ProviderOut, WorkHourCreate, WorkHourOut
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from app.api.deps import get_db, get_read_db, get_current_user_id, mark_recent_write
+from app.schemas.providers import CalendarFeedOut, ProviderCreate, ProviderOut, ProviderUpdate, ProviderStatsOut, ScheduleIn, ScheduleOut, WorkHourCreate, WorkHourOut
 from app.models.provider import Provider, ProviderWorkHours
+from app.services import calendar_feed
+from app.services.availability_notify import notify_slot_change
+from app.services.daily_stats import capacity_minutes_by_weekday, stats_range
+from app.services.exports import EXPORT_MEDIA_TYPES, stream_appointments
+from app.services.group_slots import has_upcoming_appointments, is_group
+from app.services.schedule import bump_schedule_version, replace_schedule
+from app.services.slot_inventory import drop_inventory, sync_provider_slots
+from app.services.slots import db_weekday
 
 router = APIRouter()
 
+def _provider_out(p: Provider) -> dict:
+    return {"id": p.id, "display_name": p.display_name, "establishment_id": p.establishment_id, "timezone": p.timezone, "slot_inventory_enabled": p.slot_inventory_enabled, "slot_capacity": p.slot_capacity, "schedule_version": p.schedule_version}
+
+def _work_hour_out(r: ProviderWorkHours) -> dict:
+    return {"id": r.id, "weekday": r.weekday, "start_time": r.start_time.isoformat(timespec='minutes'), "end_time": r.end_time.isoformat(timespec='minutes')}
+
+def _check_timezone(tz: str) -> None:
+    try:
+        ZoneInfo(tz)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid tz")
+
 @router.post("", response_model=ProviderOut, status_code=201)
-def create_provider(payload: ProviderCreate, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
-    p = Provider(user_id=user_id, establishment_id=str(payload.establishment_id) if payload.establishment_id else None, display_name=payload.display_name)
+def create_provider(payload: ProviderCreate, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    _check_timezone(payload.timezone)
+    p = Provider(user_id=user_id, establishment_id=str(payload.establishment_id) if payload.establishment_id else None, display_name=payload.display_name,
+                 timezone=payload.timezone, slot_inventory_enabled=payload.slot_inventory_enabled, slot_capacity=payload.slot_capacity)
     db.add(p)
     db.commit()
     db.refresh(p)
-    return {"id": p.id, "display_name": p.display_name, "establishment_id": p.establishment_id}
+    mark_recent_write(response, user_id)
+    return _provider_out(p)
 
 @router.get("", response_model=list[ProviderOut])
-def list_providers(db: Session = Depends(get_db)):
+def list_providers(db: Session = Depends(get_read_db)):
     rows = db.execute(select(Provider)).scalars().all()
-    return [{"id": r.id, "display_name": r.display_name, "establishment_id": r.establishment_id} for r in rows]
+    return [_provider_out(r) for r in rows]
 
 @router.get("/{provider_id}", response_model=ProviderOut)
-def get_provider(provider_id: UUID, db: Session = Depends(get_db)):
+def get_provider(provider_id: UUID, db: Session = Depends(get_read_db)):
     p = db.get(Provider, provider_id)
     if not p:
         raise HTTPException(status_code=404, detail="not found")
-    return {"id": p.id, "display_name": p.display_name, "establishment_id": p.establishment_id}
+    return _provider_out(p)
 
 @router.patch("/{provider_id}", response_model=ProviderOut)
-def update_provider(provider_id: UUID, payload: ProviderCreate, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def update_provider(provider_id: UUID, payload: ProviderUpdate, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
     p = db.get(Provider, provider_id)
     if not p:
         raise HTTPException(status_code=404, detail="not found")
     if str(p.user_id) != str(user_id):
         raise HTTPException(status_code=403, detail="forbidden")
-    p.display_name = payload.display_name
-    p.establishment_id = str(payload.establishment_id) if payload.establishment_id else None
+    # Only fields present in the body change; null is accepted only for establishment_id
+    changes = {k: v for k, v in payload.model_dump(exclude_unset=True).items() if v is not None or k == "establishment_id"}
+    if "timezone" in changes:
+        _check_timezone(changes["timezone"])
+    tz_changed = "timezone" in changes and p.timezone != changes["timezone"]
+    was_enabled = p.slot_inventory_enabled
+    if "display_name" in changes:
+        p.display_name = changes["display_name"]
+    if "establishment_id" in changes:
+        p.establishment_id = str(changes["establishment_id"]) if changes["establishment_id"] else None
+    if tz_changed:
+        p.timezone = changes["timezone"]
+    if "slot_capacity" in changes:
+        if (changes["slot_capacity"] > 1) != is_group(p) and has_upcoming_appointments(db, p.id):
+            # individual and group bookings are guarded by different mechanisms (exclusion vs counter)
+            raise HTTPException(status_code=409, detail="cannot switch between individual and group slots with upcoming appointments")
+        p.slot_capacity = changes["slot_capacity"]
+    if "slot_inventory_enabled" in changes:
+        p.slot_inventory_enabled = changes["slot_inventory_enabled"]
+        if was_enabled and not p.slot_inventory_enabled:
+            drop_inventory(db, p)
+    if p.slot_inventory_enabled and (tz_changed or not was_enabled):
+        sync_provider_slots(db, p)
+    if tz_changed or "slot_capacity" in changes or p.slot_inventory_enabled != was_enabled:
+        # slots shift for every day: live availability streams recompute in this transaction
+        notify_slot_change(db, p.id)
     db.add(p)
     db.commit()
     db.refresh(p)
-    return {"id": p.id, "display_name": p.display_name, "establishment_id": p.establishment_id}
+    mark_recent_write(response, user_id)
+    return _provider_out(p)
 
 # Work hours
 @router.post("/{provider_id}/work-hours", response_model=WorkHourOut, status_code=201)
-def add_work_hour(provider_id: UUID, payload: WorkHourCreate, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def add_work_hour(provider_id: UUID, payload: WorkHourCreate, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
     p = db.get(Provider, provider_id)
     if not p:
         raise HTTPException(status_code=404, detail="provider not found")
@@ -58,17 +108,45 @@ def add_work_hour(provider_id: UUID, payload: WorkHourCreate, user_id: str = Dep
         raise HTTPException(status_code=400, detail="invalid time format")
     row = ProviderWorkHours(provider_id=str(provider_id), weekday=payload.weekday, start_time=st, end_time=et)
     db.add(row)
+    bump_schedule_version(db, p)
+    if p.slot_inventory_enabled:
+        db.flush()
+        sync_provider_slots(db, p, weekdays={row.weekday})
     db.commit()
     db.refresh(row)
-    return {"id": row.id, "weekday": row.weekday, "start_time": row.start_time.isoformat(timespec='minutes'), "end_time": row.end_time.isoformat(timespec='minutes')}
+    mark_recent_write(response, user_id)
+    return _work_hour_out(row)
 
 @router.get("/{provider_id}/work-hours", response_model=list[WorkHourOut])
-def list_work_hours(provider_id: UUID, db: Session = Depends(get_db)):
+def list_work_hours(provider_id: UUID, db: Session = Depends(get_read_db)):
     rows = db.execute(select(ProviderWorkHours).where(ProviderWorkHours.provider_id==str(provider_id))).scalars().all()
-    return [{"id": r.id, "weekday": r.weekday, "start_time": r.start_time.isoformat(timespec='minutes'), "end_time": r.end_time.isoformat(timespec='minutes')} for r in rows]
+    return [_work_hour_out(r) for r in rows]
+
+@router.put("/{provider_id}/schedule", response_model=ScheduleOut)
+def replace_weekly_schedule(provider_id: UUID, payload: ScheduleIn, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """Substitui a semana inteira numa transação: blocos sobrepostos são fundidos, o resto é diff."""
+    # lock do prestador serializa PUTs concorrentes do mesmo expediente
+    p = db.get(Provider, provider_id, with_for_update=True)
+    if not p:
+        raise HTTPException(status_code=404, detail="provider not found")
+    if str(p.user_id) != str(user_id):
+        raise HTTPException(status_code=403, detail="forbidden")
+    try:
+        blocks = [(b.weekday, time.fromisoformat(b.start_time), time.fromisoformat(b.end_time)) for b in payload.work_hours]
+        replace_schedule(db, p, blocks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    rows = db.execute(
+        select(ProviderWorkHours)
+        .where(ProviderWorkHours.provider_id == p.id)
+        .order_by(ProviderWorkHours.weekday, ProviderWorkHours.start_time)
+    ).scalars().all()
+    mark_recent_write(response, user_id)
+    return {"schedule_version": p.schedule_version, "work_hours": [_work_hour_out(r) for r in rows]}
 
 @router.delete("/{provider_id}/work-hours/{row_id}")
-def delete_work_hour(provider_id: UUID, row_id: int, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def delete_work_hour(provider_id: UUID, row_id: int, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
     p = db.get(Provider, provider_id)
     if not p:
         raise HTTPException(status_code=404, detail="provider not found")
@@ -78,5 +156,117 @@ def delete_work_hour(provider_id: UUID, row_id: int, user_id: str = Depends(get_
     if not row or str(row.provider_id) != str(provider_id):
         raise HTTPException(status_code=404, detail="not found")
     db.delete(row)
+    bump_schedule_version(db, p)
+    if p.slot_inventory_enabled:
+        db.flush()
+        sync_provider_slots(db, p, weekdays={row.weekday})
     db.commit()
+    mark_recent_write(response, user_id)
     return {"ok": True}
+
+@router.get("/{provider_id}/appointments/export")
+def export_appointments(provider_id: UUID, date_from: str, date_to: str, format: str = "csv", tz: str | None = None, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
+    """
+    Streams the provider's appointments with starts_at in [date_from, date_to) (local dates,
+    inclusive start, exclusive end) as CSV or NDJSON, ordered by start. Owner only.
+    """
+    p = db.get(Provider, provider_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="not found")
+    if str(p.user_id) != str(user_id):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    tz = tz or p.timezone
+    _check_timezone(tz)
+    tzinfo = ZoneInfo(tz)
+    try:
+        starts = datetime.combine(datetime.fromisoformat(date_from).date(), time(0), tzinfo)
+        ends = datetime.combine(datetime.fromisoformat(date_to).date(), time(0), tzinfo)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid date_from or date_to")
+    if ends <= starts:
+        raise HTTPException(status_code=400, detail="date_to must be after date_from")
+    # The request session is released before the body is iterated; the generator opens its own
+    filename = f"appointments-{provider_id}-{date_from}-{date_to}.{format}"
+    return StreamingResponse(
+        stream_appointments(p.id, starts, ends, tzinfo, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@router.post("/{provider_id}/calendar-token", response_model=CalendarFeedOut)
+def create_calendar_token(provider_id: UUID, request: Request, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """Turns the iCalendar feed on, or rotates its token (the previous URL stops working)."""
+    p = db.get(Provider, provider_id, with_for_update=True)
+    if not p:
+        raise HTTPException(status_code=404, detail="not found")
+    if str(p.user_id) != str(user_id):
+        raise HTTPException(status_code=403, detail="forbidden")
+    token = calendar_feed.enable_feed(db, p)
+    db.commit()
+    mark_recent_write(response, user_id)
+    url = str(request.url_for("get_calendar_feed", provider_id=str(p.id)).include_query_params(token=token))
+    return {"url": url, "token": token}
+
+@router.delete("/{provider_id}/calendar-token", status_code=204)
+def delete_calendar_token(provider_id: UUID, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    p = db.get(Provider, provider_id, with_for_update=True)
+    if not p:
+        raise HTTPException(status_code=404, detail="not found")
+    if str(p.user_id) != str(user_id):
+        raise HTTPException(status_code=403, detail="forbidden")
+    calendar_feed.disable_feed(db, p)
+    db.commit()
+    return Response(status_code=204)
+
+@router.get("/{provider_id}/calendar.ics", name="get_calendar_feed")
+def get_calendar_feed(provider_id: UUID, token: str = "", if_none_match: str | None = Header(default=None), db: Session = Depends(get_read_db)):
+    """
+    Subscription feed (Google/Apple Calendar) with the provider's active appointments in a rolling
+    window. Authenticated by the URL token; an unchanged feed answers 304 after reading only the
+    provider row, a changed one is assembled from pre-rendered VEVENT blocks (never from appointments).
+    """
+    head = calendar_feed.feed_head(db, provider_id)
+    # unknown provider, feed off and wrong token all look the same
+    if head is None or not calendar_feed.token_matches(head.calendar_token_hash, token):
+        raise HTTPException(status_code=404, detail="not found")
+    window = calendar_feed.feed_window(head.timezone)
+    etag = calendar_feed.feed_etag(head.calendar_version, window[0], head.display_name, head.timezone)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if calendar_feed.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    body = calendar_feed.feed_body(db, provider_id, head, etag, window)
+    return Response(content=body, media_type=calendar_feed.MEDIA_TYPE, headers=headers)
+
+MAX_STATS_DAYS = 366
+
+@router.get("/{provider_id}/stats", response_model=ProviderStatsOut)
+def get_provider_stats(provider_id: UUID, date_from: date = Query(alias="from"), date_to: date = Query(alias="to"), user_id: str = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
+    """
+    Per-day counts for [from, to) read from the provider_daily_stats rollup (never from
+    appointments). Days without bookings come back as zeros; capacity uses the current work hours.
+    """
+    p = db.get(Provider, provider_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="not found")
+    if str(p.user_id) != str(user_id):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if not date_from < date_to or (date_to - date_from).days > MAX_STATS_DAYS:
+        raise HTTPException(status_code=400, detail=f"to must be after from, at most {MAX_STATS_DAYS} days")
+
+    rows = {r.day: r for r in stats_range(db, p.id, date_from, date_to)}
+    capacity = capacity_minutes_by_weekday(db, p.id)
+    days = []
+    day = date_from
+    while day < date_to:
+        r = rows.get(day)
+        booked, canceled, minutes = (r.booked, r.canceled, r.booked_minutes) if r else (0, 0, 0)
+        cap = capacity.get(db_weekday(day), 0)
+        days.append({
+            "day": day, "booked": booked, "canceled": canceled, "active": booked - canceled,
+            "booked_minutes": minutes, "capacity_minutes": cap,
+            "occupancy": round(minutes / cap, 4) if cap else None,
+        })
+        day += timedelta(days=1)
+    return {"provider_id": p.id, "date_from": date_from, "date_to": date_to, "days": days}
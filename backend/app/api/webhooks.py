@@ -0,0 +1,69 @@
+import secrets
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user_id, get_db, get_read_db, mark_recent_write
+from app.core.config import settings
+from app.models.provider import Provider
+from app.models.webhook import WebhookSubscription
+from app.schemas.webhooks import WebhookCreate, WebhookOut
+from app.services.webhooks import WEBHOOK_EVENTS, check_public_url
+
+router = APIRouter()
+
+def _webhook_out(s: WebhookSubscription, with_secret: bool = False) -> dict:
+    return {
+        "id": s.id, "provider_id": s.provider_id, "url": s.url, "event_types": s.event_types,
+        "batch_size": s.batch_size, "max_concurrency": s.max_concurrency, "active": s.active,
+        "failure_count": s.failure_count, "paused_until": s.paused_until,
+        "secret": s.secret if with_secret else None,
+    }
+
+@router.post("", response_model=WebhookOut, status_code=201)
+def create_webhook(payload: WebhookCreate, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    """Subscribe a URL to the provider's appointment events. The signing secret is only returned here."""
+    p = db.get(Provider, payload.provider_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="provider not found")
+    if str(p.user_id) != str(user_id):
+        raise HTTPException(status_code=403, detail="forbidden")
+    if payload.event_types is not None:
+        unknown = sorted(set(payload.event_types) - set(WEBHOOK_EVENTS))
+        if unknown or not payload.event_types:
+            raise HTTPException(status_code=400, detail=f"event_types must be a non-empty subset of {list(WEBHOOK_EVENTS)}")
+    try:
+        # no internal targets (loopback, private networks, cloud metadata...)
+        check_public_url(str(payload.url), settings.webhook_allow_private_hosts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"url not allowed: {e}")
+    s = WebhookSubscription(
+        user_id=user_id, provider_id=p.id, url=str(payload.url), secret=secrets.token_hex(32),
+        event_types=sorted(set(payload.event_types)) if payload.event_types else None,
+        batch_size=payload.batch_size, max_concurrency=payload.max_concurrency,
+    )
+    db.add(s)
+    db.commit()
+    db.refresh(s)
+    mark_recent_write(response, user_id)
+    return _webhook_out(s, with_secret=True)
+
+@router.get("", response_model=list[WebhookOut])
+def list_webhooks(user_id: str = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
+    rows = db.execute(
+        select(WebhookSubscription).where(WebhookSubscription.user_id == user_id).order_by(WebhookSubscription.created_at)
+    ).scalars().all()
+    return [_webhook_out(s) for s in rows]
+
+@router.delete("/{webhook_id}", status_code=204)
+def delete_webhook(webhook_id: UUID, response: Response, user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    s = db.get(WebhookSubscription, webhook_id)
+    if not s or str(s.user_id) != str(user_id):
+        raise HTTPException(status_code=404, detail="not found")
+    # pending deliveries go with it (ON DELETE CASCADE)
+    db.delete(s)
+    db.commit()
+    mark_recent_write(response, user_id)
+    return Response(status_code=204)
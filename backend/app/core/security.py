@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta, timezone
+from uuid import uuid4
 from jose import jwt
 from argon2 import PasswordHasher
 from app.core.config import settings
@@ -8,9 +9,14 @@ ph = PasswordHasher()
 
 def create_access_token(sub: str) -> str:
     expire = datetime.now(tz=timezone.utc) + timedelta(minutes=settings.access_token_expires_min)
-    to_encode = {"sub": sub, "exp": expire}
+    # jti: identifica o token na lista de revogação (logout)
+    to_encode = {"sub": sub, "exp": expire, "jti": uuid4().hex}
     return jwt.encode(to_encode, settings.secret_key, algorithm=ALGO)
 
+def decode_access_token(token: str) -> dict:
+    """Claims de um access token válido; JWTError se assinatura/exp não conferem."""
+    return jwt.decode(token, settings.secret_key, algorithms=[ALGO])
+
 def verify_password(pwd: str, pwd_hash: str) -> bool:
     try:
         ph.verify(pwd_hash, pwd)
@@ -9,7 +9,7 @@ from app.models.refresh_token import RefreshToken
 def _now_utc():
     return datetime.now(timezone.utc)
 
-def issue_refresh_token(db: Session, user_id: str) -> str:
+def issue_refresh_token(db: Session, user_id: str, commit: bool = True) -> str:
     token_id = str(uuid4())
     secret = token_urlsafe(32)
     token_plain = f"{token_id}.{secret}"
@@ -17,7 +17,8 @@ def issue_refresh_token(db: Session, user_id: str) -> str:
     expires = _now_utc() + timedelta(days=settings.refresh_token_expires_days)
     row = RefreshToken(id=token_id, user_id=user_id, token_hash=token_hash, expires_at=expires)
     db.add(row)
-    db.commit()
+    if commit:
+        db.commit()
     return token_plain
 
 def rotate_refresh_token(db: Session, token_plain: str) -> tuple[str, str]:
@@ -0,0 +1,87 @@
+"""
+Saúde da réplica de leitura, com failover para o primário.
+- O check roda no máximo a cada `read_replica_health_interval_seconds`, por processo,
+  dentro do próprio request que encontrar o estado expirado (sem thread extra).
+- Réplica é "saudável" se responde e o atraso de replay <= `read_replica_max_lag_seconds`.
+- Erros de conexão durante um request marcam a réplica como fora até o próximo check.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import read_engine
+
+log = logging.getLogger(__name__)
+
+# Sem WAL pendente o atraso é 0 (evita falso positivo com primário ocioso);
+# numa instância que não é réplica as funções retornam NULL -> 0.
+_LAG_SQL = text(
+    """
+    SELECT COALESCE(
+        CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END, 0)
+    """
+)
+
+
+class ReplicaHealth:
+    def __init__(self, engine, interval: float, max_lag: float):
+        self._engine = engine
+        self._interval = interval
+        self._max_lag = max_lag
+        self._lock = threading.Lock()
+        self._healthy = engine is not None
+        self._checked_at = 0.0
+        self.last_lag: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._engine is not None
+
+    def is_healthy(self) -> bool:
+        if self._engine is None:
+            return False
+        if time.monotonic() - self._checked_at >= self._interval and self._lock.acquire(blocking=False):
+            # um único request por processo faz o check; os demais usam o último estado
+            try:
+                self._check()
+            finally:
+                self._lock.release()
+        return self._healthy
+
+    def _check(self) -> None:
+        try:
+            with self._engine.connect() as conn:
+                lag = float(conn.execute(_LAG_SQL).scalar() or 0.0)
+            self.last_lag = lag
+            healthy = lag <= self._max_lag
+        except Exception as e:
+            log.warning("read replica check failed: %s", e)
+            self.last_lag = None
+            healthy = False
+        if healthy != self._healthy:
+            log.warning("read replica %s (lag=%s)", "up" if healthy else "down", self.last_lag)
+        self._healthy = healthy
+        self._checked_at = time.monotonic()
+
+    def mark_down(self) -> None:
+        self._healthy = False
+        self._checked_at = time.monotonic()
+
+    def status(self) -> str:
+        if self._engine is None:
+            return "disabled"
+        return "up" if self.is_healthy() else "down"
+
+
+replica_health = ReplicaHealth(
+    read_engine,
+    interval=settings.read_replica_health_interval_seconds,
+    max_lag=settings.read_replica_max_lag_seconds,
+)
@@ -4,3 +4,15 @@ from app.core.config import settings
 
 engine = create_engine(settings.database_url, pool_pre_ping=True, future=True)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
+
+# Réplica de leitura opcional: connect_timeout curto para o failover não segurar requests
+read_engine = (
+    create_engine(settings.database_read_url, pool_pre_ping=True, future=True, connect_args={"connect_timeout": 2})
+    if settings.database_read_url
+    else None
+)
+ReadSessionLocal = (
+    sessionmaker(bind=read_engine, autocommit=False, autoflush=False, future=True)
+    if read_engine is not None
+    else None
+)
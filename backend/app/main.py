@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from app.core.config import settings
-from app.api import auth, availability, appointments, health, providers
+from app.api import auth, availability, appointments, establishments, health, providers, webhooks
 
 def create_app() -> FastAPI:
     app = FastAPI(title="MVP Backend", version="0.1.0")
@@ -10,6 +10,8 @@ def create_app() -> FastAPI:
     app.include_router(availability.router, prefix="/providers", tags=["availability"])
     app.include_router(providers.router, prefix="/providers", tags=["providers"])
     app.include_router(appointments.router, prefix="/appointments", tags=["appointments"])
+    app.include_router(establishments.router, prefix="/establishments", tags=["establishments"])
+    app.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
     return app
 
 app = create_app()
@@ -1,6 +1,6 @@
 import uuid
-from sqlalchemy import Column, String, TIMESTAMP, text, CheckConstraint, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, TIMESTAMP, text, Boolean, CheckConstraint, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, TSTZRANGE, ExcludeConstraint
 from app.db.base import Base
 
 class Appointment(Base):
@@ -11,9 +11,21 @@ class Appointment(Base):
     starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
     ends_at = Column(TIMESTAMP(timezone=True), nullable=False)
     status = Column(String, nullable=False)
+    # [starts_at, ends_at) gerado pelo banco; base da exclusão de sobreposição
+    period = Column(TSTZRANGE, Computed("tstzrange(starts_at, ends_at, '[)')", persisted=True))
+    # vaga de horário em grupo (slot_capacity > 1): limitada pelo contador em slot_bookings,
+    # fora da exclusão de sobreposição
+    group_booking = Column(Boolean, nullable=False, server_default=text("false"), default=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
     updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
 
     __table_args__ = (
         CheckConstraint("status in ('PENDING','CONFIRMED','CANCELED')", name="appointment_status_chk"),
+        ExcludeConstraint(
+            ("provider_id", "="), ("period", "&&"),
+            name="appointments_no_overlap", using="gist",
+            where=text("status IN ('PENDING','CONFIRMED') AND NOT group_booking"),
+        ),
+        Index("idx_appointments_provider_starts", "provider_id", "starts_at"),
+        Index("idx_appointments_active_starts", "starts_at", postgresql_where=text("status IN ('PENDING','CONFIRMED')")),
     )
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Text, TIMESTAMP, text, SmallInteger, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.base import Base
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    scope = Column(Text, primary_key=True)        # ex.: 'appointments.create:<user_id>', 'auth.signup:<email>' (signup guarda só o user_id)
+    key = Column(Text, primary_key=True)          # header Idempotency-Key enviado pelo cliente
+    request_hash = Column(Text, nullable=False)   # sha256 do corpo relevante: mesma chave com outro corpo = erro
+    status_code = Column(SmallInteger, nullable=False)
+    response_body = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    __table_args__ = (
+        Index("idx_idempotency_keys_expires", "expires_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Text, TIMESTAMP, text, SmallInteger, CheckConstraint, ForeignKey, Integer
+from sqlalchemy import Column, Text, TIMESTAMP, text, SmallInteger, CheckConstraint, ForeignKey, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from app.db.base import Base
 
@@ -13,8 +13,10 @@ class NotificationMessage(Base):
     attempts = Column(SmallInteger, nullable=False, server_default=text("0"))
     last_error = Column(Text, nullable=True)
     appointment_id = Column(UUID(as_uuid=True), ForeignKey("appointments.id"), nullable=True)
+    kind = Column(Text, nullable=True)       # ex.: 'reminder_1440m'; NULL = mensagem de evento do outbox
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
     sent_at = Column(TIMESTAMP(timezone=True), nullable=True)
     __table_args__ = (
         CheckConstraint("status in ('QUEUED','SENT','FAILED')", name='notification_status_chk'),
+        Index("uq_notification_messages_appt_kind", "appointment_id", "kind", unique=True, postgresql_where=text("kind IS NOT NULL")),
     )
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, TIMESTAMP, text, ForeignKey, Time, SmallInteger, UniqueConstraint, Integer
+from sqlalchemy import Column, String, TIMESTAMP, text, ForeignKey, Time, SmallInteger, UniqueConstraint, Integer, Boolean, Date, BigInteger, Index, Text, CheckConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from app.db.base import Base
 
@@ -15,7 +15,20 @@ class Provider(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     establishment_id = Column(UUID(as_uuid=True), ForeignKey("establishments.id"), nullable=True)
     display_name = Column(String, nullable=False)
+    timezone = Column(String, nullable=False, server_default=text("'America/Sao_Paulo'"), default="America/Sao_Paulo")
+    # opt-in: inventário materializado em provider_slots (ver app/services/slot_inventory.py)
+    slot_inventory_enabled = Column(Boolean, nullable=False, server_default=text("false"), default=False)
+    slots_generated_until = Column(Date, nullable=True)
+    # incrementado uma vez por mudança de expediente (ver app/services/schedule.py)
+    schedule_version = Column(Integer, nullable=False, server_default=text("0"), default=0)
+    # clientes por horário: 1 = atendimento individual; >1 = turma/sessão em grupo (ver app/services/group_slots.py)
+    slot_capacity = Column(Integer, nullable=False, server_default=text("1"), default=1)
+    # feed iCalendar: sha256 do token da URL (NULL = feed desligado) e versão do feed,
+    # incrementada pelo relay a cada lote que muda os eventos (ver app/services/calendar_feed.py)
+    calendar_token_hash = Column(Text, nullable=True)
+    calendar_version = Column(Integer, nullable=False, server_default=text("0"), default=0)
     created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    __table_args__ = (CheckConstraint("slot_capacity >= 1", name="provider_slot_capacity_chk"),)
 
 class ProviderWorkHours(Base):
     __tablename__ = "provider_work_hours"
@@ -25,3 +38,26 @@ class ProviderWorkHours(Base):
     start_time = Column(Time, nullable=False)
     end_time = Column(Time, nullable=False)
     __table_args__ = (UniqueConstraint("provider_id","weekday","start_time","end_time", name="uq_work_hours_block"),)
+
+class ProviderSlot(Base):
+    __tablename__ = "provider_slots"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("providers.id"), nullable=False)
+    starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    ends_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    status = Column(Text, nullable=False, server_default=text("'FREE'"))  # 'FREE'|'BOOKED'
+    appointment_id = Column(UUID(as_uuid=True), nullable=True)
+    __table_args__ = (
+        UniqueConstraint("provider_id", "starts_at", name="uq_provider_slots_start"),
+        CheckConstraint("status in ('FREE','BOOKED')", name="provider_slot_status_chk"),
+        Index("idx_provider_slots_free", "provider_id", "starts_at", postgresql_where=text("status = 'FREE'")),
+        Index("idx_provider_slots_appt", "appointment_id", postgresql_where=text("appointment_id IS NOT NULL")),
+    )
+
+class SlotBooking(Base):
+    """Vagas ocupadas por horário de prestadores com slot_capacity > 1."""
+    __tablename__ = "slot_bookings"
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("providers.id"), primary_key=True)
+    starts_at = Column(TIMESTAMP(timezone=True), primary_key=True)
+    booked = Column(Integer, nullable=False, server_default=text("0"))
+    __table_args__ = (CheckConstraint("booked >= 0", name="slot_booking_booked_chk"),)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Text, TIMESTAMP, text, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.base import Base
+
+class ProviderCalendarEvent(Base):
+    """Bloco VEVENT já renderizado de um agendamento ativo (feed iCalendar do prestador)."""
+    __tablename__ = "provider_calendar_events"
+    appointment_id = Column(UUID(as_uuid=True), ForeignKey("appointments.id"), primary_key=True)
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("providers.id"), nullable=False)
+    starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    vevent = Column(Text, nullable=False)  # BEGIN:VEVENT ... END:VEVENT, linhas com CRLF
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    __table_args__ = (
+        # o feed lê só a janela do prestador, em ordem
+        Index("idx_provider_calendar_events_window", "provider_id", "starts_at"),
+    )
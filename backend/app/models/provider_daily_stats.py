@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Date, Integer, TIMESTAMP, text, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.base import Base
+
+class ProviderDailyStats(Base):
+    __tablename__ = "provider_daily_stats"
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("providers.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # data local no timezone do prestador
+    booked = Column(Integer, nullable=False, server_default=text("0"))  # agendamentos criados para o dia
+    canceled = Column(Integer, nullable=False, server_default=text("0"))
+    booked_minutes = Column(Integer, nullable=False, server_default=text("0"))  # minutos ainda ativos
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
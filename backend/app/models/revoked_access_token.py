@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Text, TIMESTAMP, text, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.base import Base
+
+class RevokedAccessToken(Base):
+    __tablename__ = "revoked_access_tokens"
+    jti = Column(Text, primary_key=True)          # claim jti do access token
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)  # exp do token: depois disso a linha pode sair
+    revoked_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    __table_args__ = (
+        # atualização incremental do Bloom filter de cada processo
+        Index("idx_revoked_access_tokens_revoked_at", "revoked_at"),
+        Index("idx_revoked_access_tokens_expires", "expires_at"),
+    )
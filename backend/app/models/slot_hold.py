@@ -0,0 +1,18 @@
+import uuid
+from sqlalchemy import Column, TIMESTAMP, text, ForeignKey, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.db.base import Base
+
+class SlotHold(Base):
+    __tablename__ = "slot_holds"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("providers.id"), nullable=False)
+    starts_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    __table_args__ = (
+        # uma linha por slot; hold vencido é reaproveitado pelo próximo cliente
+        UniqueConstraint("provider_id", "starts_at", name="uq_slot_holds_slot"),
+        Index("idx_slot_holds_expires", "expires_at"),
+    )
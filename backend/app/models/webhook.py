@@ -0,0 +1,42 @@
+import uuid
+from sqlalchemy import Column, BigInteger, Boolean, Integer, Text, TIMESTAMP, text, ForeignKey, CheckConstraint, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
+from app.db.base import Base
+
+class WebhookSubscription(Base):
+    __tablename__ = "webhook_subscriptions"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    provider_id = Column(UUID(as_uuid=True), ForeignKey("providers.id"), nullable=False)
+    url = Column(Text, nullable=False)
+    secret = Column(Text, nullable=False)  # chave do HMAC das entregas
+    event_types = Column(ARRAY(Text), nullable=True)  # null = todos
+    batch_size = Column(Integer, nullable=False, server_default=text("1"))  # eventos por POST
+    max_concurrency = Column(Integer, nullable=False, server_default=text("2"))  # POSTs simultâneos
+    active = Column(Boolean, nullable=False, server_default=text("true"))
+    failure_count = Column(Integer, nullable=False, server_default=text("0"))
+    paused_until = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    __table_args__ = (
+        Index("idx_webhook_subscriptions_provider", "provider_id", postgresql_where=text("active")),
+    )
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    subscription_id = Column(UUID(as_uuid=True), ForeignKey("webhook_subscriptions.id", ondelete="CASCADE"), nullable=False)
+    outbox_id = Column(UUID(as_uuid=True), nullable=False)
+    event_type = Column(Text, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(Text, nullable=False, server_default=text("'PENDING'"))
+    attempts = Column(Integer, nullable=False, server_default=text("0"))
+    # PENDING: quando pode sair; SENDING: fim do lease (vencido = reentregável)
+    next_attempt_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=text("now()"), nullable=False)
+    sent_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    __table_args__ = (
+        CheckConstraint("status in ('PENDING','SENDING','SENT','DEAD')", name="webhook_delivery_status_chk"),
+        UniqueConstraint("subscription_id", "outbox_id", name="uq_webhook_deliveries_sub_event"),
+        Index("idx_webhook_deliveries_due", "subscription_id", "next_attempt_at", postgresql_where=text("status IN ('PENDING','SENDING')")),
+    )
@@ -8,3 +8,14 @@ class AppointmentCreate(BaseModel):
 class AppointmentOut(BaseModel):
     id: UUID4
     status: str
+
+class HoldCreate(BaseModel):
+    provider_id: UUID4
+    starts_at_iso: AwareDatetime
+    tz: str
+
+class HoldOut(BaseModel):
+    id: UUID4
+    provider_id: UUID4
+    starts_at: AwareDatetime
+    expires_at: AwareDatetime
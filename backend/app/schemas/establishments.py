@@ -0,0 +1,17 @@
+from pydantic import BaseModel, UUID4
+
+class ProviderSlotsOut(BaseModel):
+    provider_id: UUID4
+    display_name: str
+    slots: list[str]
+
+class EstablishmentAvailabilityOut(BaseModel):
+    date: str
+    tz: str
+    any: list[str]  # slots com pelo menos um prestador livre
+    providers: list[ProviderSlotsOut]
+
+class NextAvailableOut(BaseModel):
+    provider_id: UUID4 | None = None
+    starts_at: str | None = None  # ISO no tz pedido; null se nada livre no horizonte
+    searched_until: str  # último dia (exclusivo) examinado
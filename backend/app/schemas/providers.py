@@ -1,14 +1,36 @@
 from pydantic import BaseModel, UUID4, Field
+from datetime import date
 from typing import Optional
 
 class ProviderCreate(BaseModel):
     display_name: str = Field(min_length=2, max_length=140)
     establishment_id: Optional[UUID4] = None
+    timezone: str = "America/Sao_Paulo"
+    slot_inventory_enabled: bool = False
+    # clientes por horário (turmas/sessões em grupo quando > 1)
+    slot_capacity: int = Field(default=1, ge=1, le=1000)
+
+class ProviderUpdate(BaseModel):
+    # PATCH: só os campos enviados mudam (model_dump(exclude_unset=True))
+    display_name: Optional[str] = Field(default=None, min_length=2, max_length=140)
+    establishment_id: Optional[UUID4] = None
+    timezone: Optional[str] = None
+    slot_inventory_enabled: Optional[bool] = None
+    slot_capacity: Optional[int] = Field(default=None, ge=1, le=1000)
 
 class ProviderOut(BaseModel):
     id: UUID4
     display_name: str
     establishment_id: Optional[UUID4] = None
+    timezone: str = "America/Sao_Paulo"
+    slot_inventory_enabled: bool = False
+    slot_capacity: int = 1
+    schedule_version: int = 0
+
+class CalendarFeedOut(BaseModel):
+    # o token só aparece nesta resposta (o banco guarda o sha256)
+    url: str
+    token: str
 
 class WorkHourCreate(BaseModel):
     weekday: int  # 0=domingo .. 6=sábado
@@ -20,3 +42,26 @@ class WorkHourOut(BaseModel):
     weekday: int
     start_time: str
     end_time: str
+
+class ScheduleIn(BaseModel):
+    # semana completa: blocos ausentes são removidos
+    work_hours: list[WorkHourCreate]
+
+class ScheduleOut(BaseModel):
+    schedule_version: int
+    work_hours: list[WorkHourOut]
+
+class DailyStatsOut(BaseModel):
+    day: date
+    booked: int
+    canceled: int
+    active: int
+    booked_minutes: int
+    capacity_minutes: int  # pelo expediente atual
+    occupancy: Optional[float] = None  # booked_minutes / capacity_minutes; null sem expediente
+
+class ProviderStatsOut(BaseModel):
+    provider_id: UUID4
+    date_from: date
+    date_to: date  # exclusivo
+    days: list[DailyStatsOut]
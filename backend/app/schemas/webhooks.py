@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, UUID4, AnyHttpUrl, Field
+
+class WebhookCreate(BaseModel):
+    provider_id: UUID4
+    url: AnyHttpUrl
+    event_types: Optional[list[str]] = None  # null = todos
+    batch_size: int = Field(default=1, ge=1, le=100)  # eventos por POST
+    max_concurrency: int = Field(default=2, ge=1, le=10)  # POSTs simultâneos para o endpoint
+
+class WebhookOut(BaseModel):
+    id: UUID4
+    provider_id: UUID4
+    url: str
+    event_types: Optional[list[str]] = None
+    batch_size: int
+    max_concurrency: int
+    active: bool
+    failure_count: int
+    paused_until: Optional[datetime] = None
+    secret: Optional[str] = None  # só na criação
@@ -0,0 +1,98 @@
+"""
+Disponibilidade de um prestador em um dia local (lista de inícios livres).
+
+Regra única da rota GET /providers/{id}/availability, do stream SSE e da rota do
+estabelecimento (availability_by_provider, em lote):
+  - inventário ligado: linhas FREE de provider_slots menos holds de terceiros;
+  - legado: slots do expediente menos agendamentos que se sobrepõem ao dia
+    (range scan GiST), holds de terceiros e horários já passados;
+  - prestador com slot_capacity > 1: em qualquer modo, um horário só sai da lista
+    quando o contador de slot_bookings chega à capacidade.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment
+from app.models.provider import Provider, ProviderWorkHours
+from app.services.group_slots import full_starts_by_provider, is_group
+from app.services.holds import held_starts_by_provider
+from app.services.slot_inventory import free_slot_starts_by_provider
+from app.services.slots import UTC, day_bounds_utc, db_weekday, free_slots
+
+
+def availability_by_provider(db: Session, providers, day: date, tzinfo, exclude_hold_user_id=None) -> dict:
+    """
+    provider_id -> inícios livres do dia (fuso `tzinfo`, em ordem) para vários prestadores.
+    Número fixo de consultas, uma por regra (expediente, agendamentos, holds, vagas de grupo
+    lotadas, inventário), independente de quantos prestadores vierem.
+    """
+    providers = list(providers)
+    if not providers:
+        return {}
+    day_start_utc, day_end_utc = day_bounds_utc(day, tzinfo)
+    group_ids = [p.id for p in providers if is_group(p)]
+    individual_ids = [p.id for p in providers if not is_group(p)]
+    individual = set(individual_ids)
+    legacy_ids = [p.id for p in providers if not p.slot_inventory_enabled]
+    inventory_ids = [p.id for p in providers if p.slot_inventory_enabled]
+
+    # Slots in someone else's checkout count as taken (the caller's own holds stay visible);
+    # group slots have no holds: only full counters are taken
+    taken: dict = {}
+    if individual_ids:
+        taken.update(held_starts_by_provider(db, individual_ids, day_start_utc, day_end_utc, exclude_user_id=exclude_hold_user_id))
+    if group_ids:
+        taken.update(full_starts_by_provider(db, group_ids, day_start_utc, day_end_utc))
+
+    blocks: dict = defaultdict(list)
+    busy: dict = defaultdict(list)
+    if legacy_ids:
+        for r in db.execute(
+            select(ProviderWorkHours.provider_id, ProviderWorkHours.start_time, ProviderWorkHours.end_time)
+            .where(ProviderWorkHours.provider_id.in_(legacy_ids), ProviderWorkHours.weekday == db_weekday(day))
+        ).all():
+            blocks[r.provider_id].append((r.start_time, r.end_time))
+        # Active individual appointments overlapping the local day: one GiST range scan for all
+        busy_ids = [pid for pid in legacy_ids if pid in blocks and pid in individual]
+        if busy_ids:
+            for r in db.execute(
+                select(Appointment.provider_id, Appointment.starts_at, Appointment.ends_at).where(
+                    and_(
+                        Appointment.provider_id.in_(busy_ids),
+                        Appointment.status.in_(("PENDING","CONFIRMED")),
+                        ~Appointment.group_booking,
+                        Appointment.period.overlaps(func.tstzrange(day_start_utc, day_end_utc, "[)")),
+                    )
+                )
+            ).all():
+                busy[r.provider_id].append((r.starts_at, r.ends_at))
+
+    # Opt-in inventory: a single indexed read of FREE rows
+    inventory = (
+        free_slot_starts_by_provider(db, inventory_ids, max(day_start_utc, datetime.now(UTC)), day_end_utc)
+        if inventory_ids else {}
+    )
+
+    now_local = datetime.now(tzinfo)
+    out: dict = {}
+    for p in providers:
+        p_taken = taken.get(p.id, set())
+        if p.slot_inventory_enabled:
+            out[p.id] = [s.astimezone(tzinfo) for s in inventory.get(p.id, []) if s not in p_taken]
+        elif blocks.get(p.id):
+            out[p.id] = [s.astimezone(tzinfo) for s in free_slots(day, blocks[p.id], tzinfo, busy.get(p.id, ()), p_taken, now_local)]
+        else:
+            out[p.id] = []
+    return out
+
+
+def day_availability(db: Session, provider_id, day: date, tzinfo, exclude_hold_user_id=None, provider: Provider | None = None) -> list[datetime]:
+    """Inícios livres do dia de um prestador, no fuso `tzinfo`, em ordem."""
+    if provider is None:
+        provider = db.get(Provider, provider_id)
+    if provider is None:
+        return []
+    return availability_by_provider(db, [provider], day, tzinfo, exclude_hold_user_id)[provider.id]
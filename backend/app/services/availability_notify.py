@@ -0,0 +1,30 @@
+"""
+Aviso de mudança de disponibilidade para os streams SSE (app/services/availability_stream.py).
+
+Módulo folha (sem dependência de outros serviços) para poder ser chamado de qualquer
+escrita que mexe na disponibilidade — agendamentos (via enqueue_event), holds,
+expediente e configuração do prestador — sem import circular.
+
+notify_slot_change faz pg_notify na transação de quem chama: o Postgres só entrega
+no commit, rollback não notifica.
+"""
+import json
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+AVAILABILITY_CHANNEL = "availability_changes"
+
+
+def notify_slot_change(db: Session, provider_id, starts_at=None, ends_at=None) -> None:
+    """
+    Avisa os streams do prestador sobre o intervalo [starts_at, ends_at) (sem ends_at: o
+    slot que começa em starts_at). Sem starts_at, todos os dias do prestador (expediente,
+    fuso, capacidade).
+    """
+    payload = {
+        "provider_id": str(provider_id),
+        "starts_at": str(starts_at) if starts_at else None,
+        "ends_at": str(ends_at) if ends_at else None,
+    }
+    db.execute(text("SELECT pg_notify(:ch, :payload)"), {"ch": AVAILABILITY_CHANNEL, "payload": json.dumps(payload)})
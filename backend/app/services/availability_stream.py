@@ -0,0 +1,255 @@
+"""
+Disponibilidade ao vivo (SSE) para as páginas públicas de agendamento.
+
+  - escrita: toda escrita que muda a disponibilidade chama notify_slot_change
+    (app/services/availability_notify.py), que faz pg_notify(AVAILABILITY_CHANNEL,
+    {provider_id, starts_at, ends_at}) na mesma transação — o Postgres só entrega no
+    commit, rollback não notifica. Agendamentos avisam via enqueue_event; holds
+    (criar, soltar, consumir, expirar) em app/services/holds.py; expediente e fuso/
+    capacidade do prestador avisam sem starts_at (todos os dias do prestador);
+  - leitura: um AvailabilityHub por processo, com uma thread em LISTEN numa
+    conexão psycopg própria. Os clientes são agrupados por (prestador, dia, tz) e
+    cada grupo guarda a lista atual de slots: uma notificação recalcula só os
+    grupos do prestador cujo dia cruza o intervalo — uma vez por grupo, não por
+    cliente — e manda o diff (taken/freed) a todos os inscritos. Notificações que
+    chegam juntas (rajada) são agrupadas num único recálculo;
+  - cada conexão tem uma fila asyncio limitada (AVAILABILITY_STREAM_QUEUE_SIZE):
+    se o cliente não acompanhar, os deltas pendentes são descartados e ele recebe
+    um snapshot novo. Memória por conexão = fila + referência ao grupo.
+
+O recálculo lê do primário: a notificação chega logo após o commit e a réplica
+pode ainda não ter o agendamento.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import psycopg
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.provider import Provider
+from app.services.availability import day_availability
+from app.services.availability_notify import AVAILABILITY_CHANNEL
+from app.services.slots import day_bounds_utc
+
+log = logging.getLogger(__name__)
+
+# janela para juntar notificações de uma rajada num só recálculo por grupo
+_COALESCE_SECONDS = 0.05
+# sem notificações por este tempo, o listener confere se a conexão ainda está viva
+_IDLE_CHECK_SECONDS = 30.0
+# marcador na fila de um cliente lento: mandar snapshot em vez dos deltas perdidos
+RESYNC = object()
+
+
+@dataclass(eq=False)
+class _Group:
+    provider_id: str
+    day: date
+    tz: str
+    start_utc: datetime
+    end_utc: datetime
+    slots: list[str] | None = None  # ISO no fuso do grupo; None até o primeiro cálculo
+    version: int = 0
+    subscribers: set = field(default_factory=set)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def key(self) -> tuple:
+        return (self.provider_id, self.day, self.tz)
+
+
+class Subscription:
+    """Uma conexão SSE: fila limitada no event loop da request."""
+
+    def __init__(self, group: _Group, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.group = group
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.version = 0  # última versão do grupo que o cliente já tem
+
+    def push(self, msg) -> None:
+        """Chamado da thread do listener."""
+        try:
+            self.loop.call_soon_threadsafe(self._offer, msg)
+        except RuntimeError:
+            pass  # loop já encerrado: a conexão caiu
+
+    def _offer(self, msg) -> None:
+        if self.queue.full():
+            # cliente lento: descarta o atrasado e pede um snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            msg = RESYNC
+        self.queue.put_nowait(msg)
+
+    def snapshot(self) -> tuple[int, list[str]]:
+        with self.group.lock:
+            self.version = self.group.version
+            return self.group.version, list(self.group.slots or [])
+
+
+class AvailabilityHub:
+    def __init__(self, dsn: str, queue_size: int):
+        self._dsn = dsn
+        self._queue_size = queue_size
+        self._groups: dict[tuple, _Group] = {}
+        self._by_provider: dict[str, set[tuple]] = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- lado das requests ---
+
+    def subscribe(self, provider_id, day: date, tz: str, loop: asyncio.AbstractEventLoop) -> Subscription | None:
+        """Inscreve a conexão no grupo (calculando o snapshot se for o primeiro). None se o prestador não existe."""
+        self._start()
+        key = (str(provider_id), day, tz)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                start_utc, end_utc = day_bounds_utc(day, ZoneInfo(tz))
+                group = self._groups[key] = _Group(str(provider_id), day, tz, start_utc, end_utc)
+                self._by_provider.setdefault(group.provider_id, set()).add(key)
+            sub = Subscription(group, loop, self._queue_size)
+            group.subscribers.add(sub)
+        try:
+            # inscrito antes de calcular: um commit durante o cálculo gera um recálculo depois
+            with group.lock:
+                if group.slots is None:
+                    slots = self._compute(group)
+                    if slots is None:
+                        raise LookupError(provider_id)
+                    group.slots = slots
+        except LookupError:
+            self.unsubscribe(sub)
+            return None
+        except Exception:
+            self.unsubscribe(sub)
+            raise
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        group = sub.group
+        with self._lock:
+            group.subscribers.discard(sub)
+            if not group.subscribers and self._groups.get(group.key) is group:
+                del self._groups[group.key]
+                keys = self._by_provider.get(group.provider_id)
+                if keys is not None:
+                    keys.discard(group.key)
+                    if not keys:
+                        del self._by_provider[group.provider_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"groups": len(self._groups), "connections": sum(len(g.subscribers) for g in self._groups.values())}
+
+    # --- listener ---
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="availability-listener", daemon=True)
+                self._thread.start()
+        # primeiro LISTEN ativo antes do primeiro snapshot, senão um commit no meio se perde
+        if not self._ready.wait(timeout=5):
+            raise RuntimeError("availability listener not connected")
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                with psycopg.connect(self._dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {AVAILABILITY_CHANNEL}")
+                    if self._ready.is_set():
+                        # reconexão: notificações do intervalo foram perdidas
+                        self._refresh(self._all_groups())
+                    self._ready.set()
+                    backoff = 1.0
+                    while True:
+                        batch = list(conn.notifies(timeout=_IDLE_CHECK_SECONDS, stop_after=1))
+                        if not batch:
+                            conn.execute("SELECT 1")
+                            continue
+                        batch.extend(conn.notifies(timeout=_COALESCE_SECONDS))
+                        self._refresh(self._affected_groups(batch))
+            except Exception:
+                log.exception("availability listener failed; reconnecting in %.0fs", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+    def _all_groups(self) -> list[_Group]:
+        with self._lock:
+            return list(self._groups.values())
+
+    def _affected_groups(self, notifies) -> list[_Group]:
+        affected: dict[int, _Group] = {}
+        for n in notifies:
+            try:
+                data = json.loads(n.payload)
+                pid = data["provider_id"]
+                if data.get("starts_at"):
+                    starts = datetime.fromisoformat(data["starts_at"])
+                    ends = datetime.fromisoformat(data["ends_at"]) if data.get("ends_at") else starts + timedelta(seconds=1)
+                else:
+                    starts = ends = None  # mudança de expediente/configuração: todos os dias
+            except (KeyError, TypeError, ValueError):
+                log.warning("invalid availability notification: %r", n.payload)
+                continue
+            with self._lock:
+                for key in self._by_provider.get(pid, ()):
+                    g = self._groups[key]
+                    if starts is None or (starts < g.end_utc and ends > g.start_utc):
+                        affected[id(g)] = g
+        return list(affected.values())
+
+    def _refresh(self, groups: list[_Group]) -> None:
+        for g in groups:
+            try:
+                with g.lock:
+                    if g.slots is None:
+                        continue  # snapshot ainda sendo calculado pelo subscribe
+                    new = self._compute(g) or []
+                    old_set, new_set = set(g.slots), set(new)
+                    taken = [s for s in g.slots if s not in new_set]
+                    freed = [s for s in new if s not in old_set]
+                    if not taken and not freed:
+                        continue
+                    g.slots = new
+                    g.version += 1
+                    msg = (g.version, taken, freed)
+                with self._lock:
+                    subscribers = list(g.subscribers)
+                for sub in subscribers:
+                    sub.push(msg)
+            except Exception:
+                log.exception("availability refresh failed for %s", g.key)
+
+    def _compute(self, g: _Group) -> list[str] | None:
+        with SessionLocal() as db:
+            provider = db.get(Provider, g.provider_id)
+            if provider is None:
+                return None
+            return [s.isoformat() for s in day_availability(db, provider.id, g.day, ZoneInfo(g.tz), provider=provider)]
+
+
+_hub: AvailabilityHub | None = None
+_hub_lock = threading.Lock()
+
+
+def get_hub() -> AvailabilityHub:
+    """Hub do processo (um listener por processo), criado no primeiro stream."""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            dsn = make_url(settings.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+            _hub = AvailabilityHub(dsn, settings.availability_stream_queue_size)
+        return _hub
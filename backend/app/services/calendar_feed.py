@@ -0,0 +1,280 @@
+"""
+Feed iCalendar por prestador (assinatura no Google Calendar / Apple Calendar).
+
+O feed não é montado a partir de appointments a cada poll:
+  - provider_calendar_events guarda um bloco VEVENT já renderizado por agendamento
+    ativo. O relay do outbox chama apply_calendar_events com o lote de eventos
+    APPT_CREATED/APPT_CANCELED na mesma transação que marca published_at: o bloco
+    do agendamento é regravado (ou apagado, se cancelado) a partir do estado atual
+    da linha — a ordem dos eventos entre relays concorrentes não importa — e
+    providers.calendar_version sobe uma vez por prestador tocado no lote;
+  - o GET lê só a linha do prestador: token, versão e o dia de início da janela
+    formam o ETag, e `If-None-Match` igual responde 304 sem outra consulta. Mudou a
+    versão: concatena os blocos da janela (índice (provider_id, starts_at)) e guarda
+    o corpo pronto num LRU do processo, chaveado pelo ETag.
+
+schedule_version não entra no ETag: ele só muda com o expediente, que não aparece no
+feed; quem muda o conteúdo são agendamentos, nome e fuso do prestador.
+
+Só prestadores com feed ligado (calendar_token_hash) têm blocos; ligar o feed
+reconstrói os blocos a partir de appointments. Um advisory lock (compartilhado no
+relay, exclusivo na reconstrução) impede que um agendamento criado durante a
+reconstrução passe pelo relay antes de o token estar visível e fique de fora.
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+import hashlib
+import hmac
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta, timezone
+from secrets import token_urlsafe
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.appointment import Appointment
+from app.models.provider import Provider
+from app.models.provider_calendar_event import ProviderCalendarEvent
+from app.models.user import User
+
+CALENDAR_EVENTS = ("APPT_CREATED", "APPT_CANCELED")
+ACTIVE_STATUSES = ("PENDING", "CONFIRMED")
+# chave do advisory lock que serializa reconstrução x relay
+CALENDAR_LOCK_KEY = 40_000_002
+MEDIA_TYPE = "text/calendar; charset=utf-8"
+PRODID = "-//Agenda Facil//Agenda do prestador//PT-BR"
+CRLF = "\r\n"
+# sugestão de intervalo de atualização para os clientes que respeitam
+REFRESH_INTERVAL = "PT15M"
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_matches(token_hash: str | None, token: str | None) -> bool:
+    if not token_hash or not token:
+        return False
+    return hmac.compare_digest(token_hash, hash_token(token))
+
+
+# ---------- renderização (RFC 5545) ----------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    """Quebra em linhas de até 75 octetos (continuação começa com espaço), sem partir caracteres UTF-8."""
+    if len(line.encode()) <= 75:
+        return line
+    parts, cur, size = [], [], 0
+    for ch in line:
+        n = len(ch.encode())
+        if size + n > (75 if not parts else 74):
+            parts.append("".join(cur))
+            cur, size = [], 0
+        cur.append(ch)
+        size += n
+    parts.append("".join(cur))
+    return (CRLF + " ").join(parts)
+
+
+def _utc(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def render_vevent(appointment_id, starts_at: datetime, ends_at: datetime, status: str, client: str | None, stamp: datetime) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{appointment_id}@agenda-facil",
+        f"DTSTAMP:{_utc(stamp)}",
+        f"DTSTART:{_utc(starts_at)}",
+        f"DTEND:{_utc(ends_at)}",
+        f"SUMMARY:{_escape(client or 'Agendamento')}",
+        f"STATUS:{'CONFIRMED' if status == 'CONFIRMED' else 'TENTATIVE'}",
+        "END:VEVENT",
+    ]
+    return CRLF.join(_fold(line) for line in lines)
+
+
+def render_feed(display_name: str, tz: str, vevents) -> bytes:
+    head = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        _fold(f"X-WR-CALNAME:{_escape(display_name)}"),
+        f"X-WR-TIMEZONE:{tz}",
+        f"REFRESH-INTERVAL;VALUE=DURATION:{REFRESH_INTERVAL}",
+        f"X-PUBLISHED-TTL:{REFRESH_INTERVAL}",
+    ]
+    return CRLF.join([*head, *vevents, "END:VCALENDAR", ""]).encode()
+
+
+# ---------- manutenção dos blocos ----------
+
+def _appointment_rows(db: Session, *where):
+    return db.execute(
+        select(
+            Appointment.id, Appointment.provider_id, Appointment.starts_at, Appointment.ends_at,
+            Appointment.status, func.coalesce(User.full_name, User.email).label("client"),
+        )
+        .join(User, User.id == Appointment.user_id)
+        .join(Provider, Provider.id == Appointment.provider_id)
+        .where(Provider.calendar_token_hash.is_not(None), *where)
+    ).all()
+
+
+def _upsert_blocks(db: Session, rows) -> None:
+    if not rows:
+        return
+    stamp = datetime.now(timezone.utc)
+    stmt = pg_insert(ProviderCalendarEvent)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProviderCalendarEvent.appointment_id],
+        set_={"starts_at": stmt.excluded.starts_at, "vevent": stmt.excluded.vevent, "updated_at": func.now()},
+    )
+    db.execute(stmt, [
+        {"appointment_id": r.id, "provider_id": r.provider_id, "starts_at": r.starts_at,
+         "vevent": render_vevent(r.id, r.starts_at, r.ends_at, r.status, r.client, stamp)}
+        for r in rows
+    ])
+
+
+def apply_calendar_events(db: Session, events) -> int:
+    """Regrava os blocos dos agendamentos do lote (prestadores com feed ligado). Devolve prestadores tocados."""
+    ids = {ev.aggregate_id for ev in events if ev.event_type in CALENDAR_EVENTS}
+    if not ids:
+        return 0
+    db.execute(text("SELECT pg_advisory_xact_lock_shared(:k)"), {"k": CALENDAR_LOCK_KEY})
+    rows = _appointment_rows(db, Appointment.id.in_(ids))
+    if not rows:
+        return 0
+    _upsert_blocks(db, [r for r in rows if r.status in ACTIVE_STATUSES])
+    canceled = [r.id for r in rows if r.status not in ACTIVE_STATUSES]
+    if canceled:
+        db.execute(delete(ProviderCalendarEvent).where(ProviderCalendarEvent.appointment_id.in_(canceled)))
+    providers = sorted({r.provider_id for r in rows})
+    db.execute(
+        update(Provider).where(Provider.id.in_(providers)).values(calendar_version=Provider.calendar_version + 1)
+    )
+    return len(providers)
+
+
+def rebuild_calendar(db: Session, provider: Provider) -> int:
+    """Reconstrói os blocos do prestador a partir de appointments (agendamentos desde o início da janela)."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": CALENDAR_LOCK_KEY})
+    db.execute(delete(ProviderCalendarEvent).where(ProviderCalendarEvent.provider_id == provider.id))
+    since, _ = feed_window(provider.timezone)
+    rows = _appointment_rows(
+        db,
+        Appointment.provider_id == provider.id,
+        Appointment.status.in_(ACTIVE_STATUSES),
+        Appointment.starts_at >= since,
+    )
+    _upsert_blocks(db, rows)
+    return len(rows)
+
+
+def enable_feed(db: Session, provider: Provider) -> str:
+    """Gera (ou troca) o token do feed; devolve o token em claro, que só existe nesta resposta."""
+    token = token_urlsafe(32)
+    was_enabled = provider.calendar_token_hash is not None
+    provider.calendar_token_hash = hash_token(token)
+    provider.calendar_version = (provider.calendar_version or 0) + 1
+    db.add(provider)
+    if not was_enabled:
+        db.flush()
+        rebuild_calendar(db, provider)
+    return token
+
+
+def disable_feed(db: Session, provider: Provider) -> None:
+    provider.calendar_token_hash = None
+    provider.calendar_version = (provider.calendar_version or 0) + 1
+    db.add(provider)
+    db.execute(delete(ProviderCalendarEvent).where(ProviderCalendarEvent.provider_id == provider.id))
+
+
+# ---------- leitura ----------
+
+def feed_window(tz: str, today: date | None = None) -> tuple[datetime, datetime]:
+    """[início, fim) da janela móvel em UTC, a partir de hoje no fuso do prestador."""
+    tzinfo = ZoneInfo(tz)
+    today = today or datetime.now(tzinfo).date()
+    start = datetime.combine(today - timedelta(days=settings.calendar_feed_past_days), time(0), tzinfo)
+    end = datetime.combine(today + timedelta(days=settings.calendar_feed_future_days + 1), time(0), tzinfo)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def feed_etag(calendar_version: int, window_start: datetime, display_name: str, tz: str) -> str:
+    meta = zlib.crc32(f"{display_name}\x00{tz}".encode())
+    return f'"{calendar_version}-{window_start:%Y%m%d}-{meta:08x}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def feed_head(db: Session, provider_id):
+    """A única leitura de um poll sem mudança: a linha do prestador."""
+    return db.execute(
+        select(Provider.calendar_token_hash, Provider.calendar_version, Provider.display_name, Provider.timezone)
+        .where(Provider.id == provider_id)
+    ).first()
+
+
+class FeedCache:
+    """LRU de corpos prontos por (prestador, ETag); um ETag novo simplesmente não acha a entrada antiga."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> bytes | None:
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+            return body
+
+    def put(self, key, body: bytes) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = body
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_cache = FeedCache(settings.calendar_feed_cache_size)
+
+
+def feed_body(db: Session, provider_id, head, etag: str, window: tuple[datetime, datetime]) -> bytes:
+    key = (provider_id, etag)
+    body = _cache.get(key)
+    if body is None:
+        vevents = db.execute(
+            select(ProviderCalendarEvent.vevent)
+            .where(
+                ProviderCalendarEvent.provider_id == provider_id,
+                ProviderCalendarEvent.starts_at >= window[0],
+                ProviderCalendarEvent.starts_at < window[1],
+            )
+            .order_by(ProviderCalendarEvent.starts_at, ProviderCalendarEvent.appointment_id)
+        ).scalars()
+        body = render_feed(head.display_name, head.timezone, vevents)
+        _cache.put(key, body)
+    return body
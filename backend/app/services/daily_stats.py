@@ -0,0 +1,199 @@
+"""
+Rollup diário por prestador (provider_daily_stats) para o dashboard.
+
+Manutenção incremental: o relay do outbox chama apply_appointment_events com o
+lote de eventos APPT_CREATED/APPT_CANCELED e os deltas entram na mesma
+transação que marca published_at — cada evento é aplicado exatamente uma vez
+(o relay pega as linhas com FOR UPDATE SKIP LOCKED, então dois relays não
+dividem o mesmo evento). O dia é a data local no timezone do prestador.
+
+  APPT_CREATED  -> booked + 1,   booked_minutes + duração
+  APPT_CANCELED -> canceled + 1, booked_minutes - duração
+
+Os deltas só são corretos se cada agendamento gerar no máximo um evento de cada
+tipo: o cancelamento é um UPDATE condicional (só quem trocou o status grava o
+APPT_CANCELED) e, por garantia, um evento repetido do mesmo agendamento dentro
+do lote conta uma vez.
+
+Reconstrução (backfill ou correção): rebuild_daily_stats recalcula a partir
+de appointments e desconta os eventos ainda não publicados, que o relay vai
+aplicar depois. Um advisory lock (compartilhado no relay, exclusivo no
+rebuild) impede que um lote seja publicado no meio da reconstrução.
+
+    python -m app.services.daily_stats [--provider ID] [--from AAAA-MM-DD] [--to AAAA-MM-DD]
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+import argparse
+from collections import defaultdict
+from datetime import date
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment
+from app.models.provider import Provider, ProviderWorkHours
+from app.models.provider_daily_stats import ProviderDailyStats
+
+STATS_EVENTS = ("APPT_CREATED", "APPT_CANCELED")
+# chave do advisory lock que serializa rebuild x relay
+STATS_LOCK_KEY = 40_000_001
+
+
+def apply_appointment_events(db: Session, events) -> int:
+    """Aplica os deltas de um lote de eventos do outbox num único upsert. Devolve linhas tocadas."""
+    ids = [ev.aggregate_id for ev in events if ev.event_type in STATS_EVENTS]
+    if not ids:
+        return 0
+    db.execute(text("SELECT pg_advisory_xact_lock_shared(:k)"), {"k": STATS_LOCK_KEY})
+    appts = {
+        r.id: r
+        for r in db.execute(
+            select(Appointment.id, Appointment.provider_id, Appointment.starts_at, Appointment.ends_at, Provider.timezone)
+            .join(Provider, Provider.id == Appointment.provider_id)
+            .where(Appointment.id.in_(ids))
+        ).all()
+    }
+
+    deltas: dict = defaultdict(lambda: [0, 0, 0])  # (provider, dia) -> [booked, canceled, minutos]
+    seen = set()
+    for ev in events:
+        a = appts.get(ev.aggregate_id)
+        if ev.event_type not in STATS_EVENTS or a is None or (ev.aggregate_id, ev.event_type) in seen:
+            continue
+        seen.add((ev.aggregate_id, ev.event_type))
+        day = a.starts_at.astimezone(ZoneInfo(a.timezone)).date()
+        minutes = int((a.ends_at - a.starts_at).total_seconds() // 60)
+        d = deltas[(a.provider_id, day)]
+        if ev.event_type == "APPT_CREATED":
+            d[0] += 1
+            d[2] += minutes
+        else:
+            d[1] += 1
+            d[2] -= minutes
+    if not deltas:
+        return 0
+
+    stmt = pg_insert(ProviderDailyStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProviderDailyStats.provider_id, ProviderDailyStats.day],
+        set_={
+            "booked": ProviderDailyStats.booked + stmt.excluded.booked,
+            "canceled": ProviderDailyStats.canceled + stmt.excluded.canceled,
+            "booked_minutes": ProviderDailyStats.booked_minutes + stmt.excluded.booked_minutes,
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt, [
+        {"provider_id": pid, "day": day, "booked": b, "canceled": c, "booked_minutes": m}
+        for (pid, day), (b, c, m) in sorted(deltas.items())
+    ])
+    return len(deltas)
+
+
+def rebuild_daily_stats(db: Session, provider_id=None, date_from: date | None = None, date_to: date | None = None) -> int:
+    """Recalcula o rollup (opcionalmente de um prestador e/ou dias [date_from, date_to))."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": STATS_LOCK_KEY})
+
+    filters, params = [], {}
+    if provider_id is not None:
+        filters.append("a.provider_id = :pid")
+        params["pid"] = provider_id
+    if date_from is not None:
+        filters.append("(a.starts_at AT TIME ZONE p.timezone)::date >= :dfrom")
+        params["dfrom"] = date_from
+    if date_to is not None:
+        filters.append("(a.starts_at AT TIME ZONE p.timezone)::date < :dto")
+        params["dto"] = date_to
+    where = " AND ".join(filters) or "true"
+
+    q = delete(ProviderDailyStats)
+    if provider_id is not None:
+        q = q.where(ProviderDailyStats.provider_id == provider_id)
+    if date_from is not None:
+        q = q.where(ProviderDailyStats.day >= date_from)
+    if date_to is not None:
+        q = q.where(ProviderDailyStats.day < date_to)
+    db.execute(q)
+
+    # Um único statement = um snapshot: appointments e outbox pendente vistos no mesmo instante
+    return db.execute(
+        text(
+            f"""
+            INSERT INTO provider_daily_stats (provider_id, day, booked, canceled, booked_minutes)
+            SELECT provider_id, day, sum(booked), sum(canceled), sum(minutes)
+            FROM (
+                SELECT a.provider_id, (a.starts_at AT TIME ZONE p.timezone)::date AS day,
+                       count(*) AS booked,
+                       count(*) FILTER (WHERE a.status = 'CANCELED') AS canceled,
+                       coalesce(sum(extract(epoch FROM a.ends_at - a.starts_at) / 60)
+                                FILTER (WHERE a.status <> 'CANCELED'), 0) AS minutes
+                FROM appointments a JOIN providers p ON p.id = a.provider_id
+                WHERE {where}
+                GROUP BY 1, 2
+                UNION ALL
+                SELECT a.provider_id, (a.starts_at AT TIME ZONE p.timezone)::date,
+                       -count(*) FILTER (WHERE o.event_type = 'APPT_CREATED'),
+                       -count(*) FILTER (WHERE o.event_type = 'APPT_CANCELED'),
+                       sum(CASE WHEN o.event_type = 'APPT_CREATED' THEN -1 ELSE 1 END
+                           * extract(epoch FROM a.ends_at - a.starts_at) / 60)
+                FROM outbox o
+                JOIN appointments a ON a.id = o.aggregate_id
+                JOIN providers p ON p.id = a.provider_id
+                WHERE o.published_at IS NULL AND o.event_type IN ('APPT_CREATED', 'APPT_CANCELED') AND {where}
+                GROUP BY 1, 2
+            ) s
+            GROUP BY provider_id, day
+            """
+        ),
+        params,
+    ).rowcount
+
+
+def capacity_minutes_by_weekday(db: Session, provider_id) -> dict[int, int]:
+    """Minutos de expediente por dia da semana (0=domingo), pelo expediente atual."""
+    out: dict[int, int] = defaultdict(int)
+    for r in db.execute(
+        select(ProviderWorkHours.weekday, ProviderWorkHours.start_time, ProviderWorkHours.end_time)
+        .where(ProviderWorkHours.provider_id == provider_id)
+    ).all():
+        out[r.weekday] += (r.end_time.hour * 60 + r.end_time.minute) - (r.start_time.hour * 60 + r.start_time.minute)
+    return out
+
+
+def stats_range(db: Session, provider_id, date_from: date, date_to: date) -> list:
+    """Linhas do rollup em [date_from, date_to) (dias sem agendamento não têm linha)."""
+    return db.execute(
+        select(ProviderDailyStats)
+        .where(
+            ProviderDailyStats.provider_id == provider_id,
+            ProviderDailyStats.day >= date_from,
+            ProviderDailyStats.day < date_to,
+        )
+        .order_by(ProviderDailyStats.day)
+    ).scalars().all()
+
+
+def main(argv: list[str] | None = None) -> int:
+    from app.db.session import SessionLocal
+
+    p = argparse.ArgumentParser(description="Reconstrói provider_daily_stats a partir de appointments.")
+    p.add_argument("--provider", default=None, help="só este prestador (UUID)")
+    p.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None, help="primeiro dia (local)")
+    p.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None, help="dia final, exclusivo")
+    args = p.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        n = rebuild_daily_stats(db, args.provider, args.date_from, args.date_to)
+        db.commit()
+    finally:
+        db.close()
+    print(f"provider_daily_stats: {n} linhas reconstruídas")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""
+Exportação de agendamentos de um prestador (CSV ou NDJSON) em streaming.
+
+A consulta roda num cursor do lado do servidor (yield_per -> stream_results):
+o Postgres entrega EXPORT_BATCH_SIZE linhas por vez e cada lote vira um pedaço
+da resposta. Memória constante e primeiro byte imediato (o cabeçalho sai antes
+da primeira linha), mesmo para históricos de vários anos.
+
+O gerador abre a própria sessão: a sessão da request já foi devolvida ao pool
+quando o StreamingResponse começa a iterar.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.replica import replica_health
+from app.db.session import ReadSessionLocal, SessionLocal
+from app.models.appointment import Appointment
+from app.models.user import User
+
+EXPORT_COLUMNS = ("id", "starts_at", "ends_at", "status", "client_email", "created_at")
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def appointment_rows(db: Session, provider_id, start_utc: datetime, end_utc: datetime, batch_size: int) -> Iterator:
+    """Agendamentos (todos os status) com starts_at em [start_utc, end_utc), por ordem de início."""
+    stmt = (
+        select(Appointment.id, Appointment.starts_at, Appointment.ends_at, Appointment.status, User.email, Appointment.created_at)
+        .join(User, User.id == Appointment.user_id)
+        .where(
+            Appointment.provider_id == provider_id,
+            Appointment.starts_at >= start_utc,
+            Appointment.starts_at < end_utc,
+        )
+        .order_by(Appointment.starts_at, Appointment.id)
+        .execution_options(yield_per=batch_size)
+    )
+    return iter(db.execute(stmt))
+
+
+def _values(row, tzinfo) -> list:
+    return [
+        str(row.id),
+        row.starts_at.astimezone(tzinfo).isoformat(),
+        row.ends_at.astimezone(tzinfo).isoformat(),
+        row.status,
+        row.email,
+        row.created_at.astimezone(tzinfo).isoformat(),
+    ]
+
+
+def iter_csv(rows: Iterable, tzinfo, chunk_rows: int) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buf.getvalue()
+    buf.seek(0); buf.truncate()
+    n = 0
+    for row in rows:
+        writer.writerow(_values(row, tzinfo))
+        n += 1
+        if n % chunk_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_ndjson(rows: Iterable, tzinfo, chunk_rows: int) -> Iterator[str]:
+    lines: list[str] = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, _values(row, tzinfo))), ensure_ascii=False))
+        if len(lines) >= chunk_rows:
+            yield "\n".join(lines) + "\n"
+            lines.clear()
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def stream_appointments(provider_id, start_utc: datetime, end_utc: datetime, tzinfo, fmt: str) -> Iterator[str]:
+    """Corpo do StreamingResponse. Lê da réplica quando configurada e saudável."""
+    use_replica = ReadSessionLocal is not None and replica_health.is_healthy()
+    db = ReadSessionLocal() if use_replica else SessionLocal()
+    try:
+        rows = appointment_rows(db, provider_id, start_utc, end_utc, settings.export_batch_size)
+        writer = iter_csv if fmt == "csv" else iter_ndjson
+        yield from writer(rows, tzinfo, settings.export_batch_size)
+    finally:
+        db.close()
@@ -0,0 +1,89 @@
+"""
+Horários com várias vagas (turmas, sessões em grupo) para prestadores com slot_capacity > 1.
+
+Uma linha em slot_bookings por (prestador, início) conta as vagas ocupadas:
+  - reservar é um único upsert condicional, `INSERT ... ON CONFLICT DO UPDATE
+    SET booked = booked + 1 WHERE booked < capacidade RETURNING` — a linha fica
+    travada até o commit, então duas reservas da última vaga nunca passam juntas;
+  - cancelar decrementa a mesma linha — só quem de fato trocou o status do
+    agendamento para CANCELED (UPDATE condicional na rota), então dois
+    cancelamentos simultâneos liberam uma vaga só;
+  - disponibilidade lê os contadores do intervalo pela PK, sem COUNT(*) em
+    appointments. Linhas com booked = 0 ficam (são reaproveitadas).
+
+Os agendamentos de grupo têm group_booking = true e ficam fora da exclusão
+appointments_no_overlap. As funções não fazem commit: quem chama controla a transação.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.appointment import Appointment
+from app.models.provider import Provider, SlotBooking
+
+
+def is_group(provider: Provider | None) -> bool:
+    return provider is not None and (provider.slot_capacity or 1) > 1
+
+
+def has_upcoming_appointments(db: Session, provider_id) -> bool:
+    """Agendamentos ativos a partir de agora: trocar entre individual e grupo exige nenhum."""
+    return db.scalar(
+        select(Appointment.id).where(
+            Appointment.provider_id == provider_id,
+            Appointment.status.in_(("PENDING", "CONFIRMED")),
+            Appointment.starts_at >= func.now(),
+        ).limit(1)
+    ) is not None
+
+
+def book_seat(db: Session, provider_id, starts_utc: datetime, capacity: int) -> int | None:
+    """Ocupa uma vaga; devolve quantas ficaram ocupadas, ou None se o horário está lotado."""
+    stmt = pg_insert(SlotBooking).values(provider_id=provider_id, starts_at=starts_utc, booked=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SlotBooking.provider_id, SlotBooking.starts_at],
+        set_={"booked": SlotBooking.booked + 1},
+        where=SlotBooking.booked < capacity,
+    ).returning(SlotBooking.booked)
+    return db.execute(stmt).scalar()
+
+
+def release_seat(db: Session, provider_id, starts_utc: datetime) -> None:
+    db.execute(
+        update(SlotBooking)
+        .where(SlotBooking.provider_id == provider_id, SlotBooking.starts_at == starts_utc, SlotBooking.booked > 0)
+        .values(booked=SlotBooking.booked - 1)
+    )
+
+
+def booked_counts(db: Session, provider_id, start_utc: datetime, end_utc: datetime) -> dict[datetime, int]:
+    """Vagas ocupadas por início no intervalo (só horários com alguma reserva)."""
+    rows = db.execute(
+        select(SlotBooking.starts_at, SlotBooking.booked).where(
+            SlotBooking.provider_id == provider_id,
+            SlotBooking.starts_at >= start_utc,
+            SlotBooking.starts_at < end_utc,
+            SlotBooking.booked > 0,
+        )
+    ).all()
+    return {r.starts_at: r.booked for r in rows}
+
+
+def full_starts_by_provider(db: Session, provider_ids, start_utc: datetime, end_utc: datetime) -> dict:
+    """Horários lotados de vários prestadores numa consulta: provider_id -> set de inícios."""
+    q = (
+        select(SlotBooking.provider_id, SlotBooking.starts_at)
+        .join(Provider, Provider.id == SlotBooking.provider_id)
+        .where(
+            SlotBooking.provider_id.in_(provider_ids),
+            SlotBooking.starts_at >= start_utc,
+            SlotBooking.starts_at < end_utc,
+            SlotBooking.booked >= Provider.slot_capacity,
+        )
+    )
+    out: dict = {}
+    for pid, starts_at in db.execute(q).all():
+        out.setdefault(pid, set()).add(starts_at)
+    return out
@@ -0,0 +1,155 @@
+"""
+Holds curtos de slot durante o checkout.
+
+Um hold é uma linha em slot_holds (única por provider + starts_at) com expires_at:
+  - expirar é O(1): um hold vencido simplesmente deixa de valer nas leituras e é
+    sobrescrito pelo próximo acquire; a limpeza física roda em lote pelo índice
+    idx_slot_holds_expires;
+  - acquire é um upsert que só vence se o slot estiver livre, vencido ou já for
+    do mesmo usuário — a disputa se resolve aqui, antes do checkout;
+  - o agendamento trava o hold do slot (hold_owner) e o consome na própria
+    transação: respeita o hold de outro cliente e remove o do próprio usuário.
+
+Um hold vale para o intervalo [starts_at, starts_at + SLOT_MINUTES): pelo expediente
+um agendamento pode começar fora da grade (10:00 e 10:15 coexistem), então o conflito
+é por sobreposição, não pelo início exato. hold_owners e o acquire da rota de holds
+tomam um advisory lock de transação por prestador, para que um hold e um agendamento
+sobrepostos não passem juntos pela checagem.
+
+Hold ocupa o slot para os outros clientes, então toda escrita aqui avisa os streams
+de disponibilidade (notify_slot_change, na mesma transação). A expiração é avisada
+pela limpeza (holds.purge_expired), que roda a cada poucos segundos.
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.slot_hold import SlotHold
+from app.services.availability_notify import notify_slot_change
+from app.services.slots import SLOT_MINUTES
+
+
+def acquire_hold(db: Session, provider_id, starts_utc: datetime, user_id, ttl_seconds: int) -> SlotHold | None:
+    """Cria/renova o hold do usuário no slot; None se outro cliente tem um hold válido."""
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    stmt = pg_insert(SlotHold).values(provider_id=provider_id, starts_at=starts_utc, user_id=user_id, expires_at=expires_at)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_slot_holds_slot",
+        set_={"user_id": stmt.excluded.user_id, "expires_at": stmt.excluded.expires_at, "created_at": func.now()},
+        where=(SlotHold.expires_at <= now) | (SlotHold.user_id == user_id),
+    ).returning(SlotHold.id, SlotHold.expires_at)
+    row = db.execute(stmt).first()
+    if row is None:
+        return None
+    notify_slot_change(db, provider_id, starts_utc)
+    return SlotHold(id=row.id, provider_id=provider_id, starts_at=starts_utc, user_id=user_id, expires_at=row.expires_at)
+
+
+def _overlapping(provider_id, starts_utc: datetime, ends_utc: datetime) -> tuple:
+    """Holds do prestador cujo intervalo cruza [starts_utc, ends_utc)."""
+    return (
+        SlotHold.provider_id == provider_id,
+        SlotHold.starts_at > starts_utc - timedelta(minutes=SLOT_MINUTES),
+        SlotHold.starts_at < ends_utc,
+    )
+
+
+def lock_provider_holds(db: Session, provider_id) -> None:
+    """Serializa checagem + escrita de holds/agendamentos do prestador até o fim da transação."""
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(f"slot_holds:{provider_id}", 0))))
+
+
+def hold_owners(db: Session, provider_id, starts_utc: datetime, ends_utc: datetime) -> set:
+    """Donos dos holds válidos que se sobrepõem a [starts_utc, ends_utc) (com o lock do prestador)."""
+    lock_provider_holds(db, provider_id)
+    return set(db.execute(
+        select(SlotHold.user_id).where(*_overlapping(provider_id, starts_utc, ends_utc), SlotHold.expires_at > func.now())
+    ).scalars().all())
+
+
+def release_other_holds(db: Session, provider_id, user_id, keep_starts_utc: datetime) -> None:
+    """Um cliente segura no máximo um slot por prestador: solta os demais."""
+    released = db.execute(delete(SlotHold).where(
+        SlotHold.provider_id == provider_id,
+        SlotHold.user_id == user_id,
+        SlotHold.starts_at != keep_starts_utc,
+    ).returning(SlotHold.starts_at)).scalars().all()
+    for starts_at in released:
+        notify_slot_change(db, provider_id, starts_at)
+
+
+def consume_hold(db: Session, provider_id, starts_utc: datetime, ends_utc: datetime, user_id) -> None:
+    """Remove os holds do usuário que o agendamento [starts_utc, ends_utc) cobre."""
+    consumed = db.execute(delete(SlotHold).where(
+        *_overlapping(provider_id, starts_utc, ends_utc),
+        SlotHold.user_id == user_id,
+    ).returning(SlotHold.starts_at)).scalars().all()
+    for starts_at in consumed:
+        notify_slot_change(db, provider_id, starts_at)
+
+
+def delete_hold(db: Session, hold_id, user_id) -> bool:
+    row = db.execute(
+        delete(SlotHold).where(SlotHold.id == hold_id, SlotHold.user_id == user_id)
+        .returning(SlotHold.provider_id, SlotHold.starts_at)
+    ).first()
+    if row is None:
+        return False
+    notify_slot_change(db, row.provider_id, row.starts_at)
+    return True
+
+
+def held_starts(db: Session, provider_id, start_utc: datetime, end_utc: datetime, exclude_user_id=None) -> set[datetime]:
+    """Slots com hold válido de outros usuários no intervalo."""
+    q = select(SlotHold.starts_at).where(
+        SlotHold.provider_id == provider_id,
+        SlotHold.starts_at >= start_utc,
+        SlotHold.starts_at < end_utc,
+        SlotHold.expires_at > func.now(),
+    )
+    if exclude_user_id is not None:
+        q = q.where(SlotHold.user_id != exclude_user_id)
+    return set(db.execute(q).scalars().all())
+
+
+def held_starts_by_provider(db: Session, provider_ids, start_utc: datetime, end_utc: datetime, exclude_user_id=None) -> dict:
+    """held_starts para vários prestadores numa consulta: provider_id -> set de inícios."""
+    q = select(SlotHold.provider_id, SlotHold.starts_at).where(
+        SlotHold.provider_id.in_(provider_ids),
+        SlotHold.starts_at >= start_utc,
+        SlotHold.starts_at < end_utc,
+        SlotHold.expires_at > func.now(),
+    )
+    if exclude_user_id is not None:
+        q = q.where(SlotHold.user_id != exclude_user_id)
+    out: dict = {}
+    for pid, starts_at in db.execute(q).all():
+        out.setdefault(pid, set()).add(starts_at)
+    return out
+
+
+def purge_expired_holds(db: Session, batch_size: int = 5000) -> int:
+    """Apaga um lote de holds vencidos e avisa os streams (uma notificação por prestador)."""
+    rows = db.execute(
+        text(
+            """
+            WITH gone AS (
+                DELETE FROM slot_holds
+                WHERE id IN (SELECT id FROM slot_holds WHERE expires_at < now() LIMIT :n)
+                RETURNING provider_id, starts_at
+            )
+            SELECT provider_id, min(starts_at) AS first_start, max(starts_at) AS last_start, count(*) AS n
+            FROM gone
+            GROUP BY provider_id
+            """
+        ),
+        {"n": batch_size},
+    ).all()
+    for r in rows:
+        notify_slot_change(db, r.provider_id, r.first_start, r.last_start + timedelta(seconds=1))
+    return sum(r.n for r in rows)
@@ -0,0 +1,93 @@
+"""
+Idempotency-Key para POSTs que clientes móveis repetem (agendamento, signup).
+
+Tudo roda na transação do próprio handler:
+  1. begin(): pg_advisory_xact_lock(scope + key) — um duplicado concorrente espera
+     aqui até o original terminar (commit ou rollback liberam o lock);
+  2. se já existe resposta gravada e válida, o handler a devolve sem tocar nas
+     tabelas de negócio;
+  3. senão o handler executa e chama store() antes do seu commit: a resposta e os
+     efeitos ficam visíveis juntos.
+
+Só respostas de sucesso são gravadas: um erro (400/409) faz rollback, libera o lock
+e o retry executa de novo. As funções não fazem commit.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyKeyReused(ValueError):
+    """Mesma chave enviada com outro corpo de requisição."""
+
+
+class IdempotencyInProgress(RuntimeError):
+    """O original ainda está em execução após o lock_timeout."""
+
+
+def request_fingerprint(data: dict) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def begin(db: Session, scope: str, key: str, fingerprint: str) -> IdempotencyKey | None:
+    """Serializa requisições com a mesma chave e devolve a resposta gravada, se houver."""
+    try:
+        db.execute(select(func.set_config("lock_timeout", f"{settings.idempotency_lock_timeout_seconds * 1000}ms", True)))
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(f"{scope}:{key}", 0))))
+        db.execute(text("SET LOCAL lock_timeout = DEFAULT"))
+    except OperationalError:
+        db.rollback()
+        raise IdempotencyInProgress(key)
+
+    row = db.get(IdempotencyKey, (scope, key))
+    if row is None:
+        return None
+    if row.expires_at <= datetime.now(timezone.utc):
+        # vencida: a chave volta a valer como nova (o lock ainda é nosso)
+        db.delete(row)
+        db.flush()
+        return None
+    if row.request_hash != fingerprint:
+        raise IdempotencyKeyReused(key)
+    return row
+
+
+def store(db: Session, scope: str, key: str, fingerprint: str, status_code: int, body: dict) -> None:
+    values = {
+        "scope": scope,
+        "key": key,
+        "request_hash": fingerprint,
+        "status_code": status_code,
+        "response_body": body,
+        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=settings.idempotency_ttl_seconds),
+    }
+    db.execute(
+        pg_insert(IdempotencyKey)
+        .values(**values)
+        .on_conflict_do_update(index_elements=["scope", "key"], set_=values)
+    )
+
+
+def purge_expired(db: Session, batch_size: int = 5000) -> int:
+    """Remove até `batch_size` chaves vencidas; devolve quantas removeu."""
+    return db.execute(
+        text(
+            """
+            DELETE FROM idempotency_keys
+            WHERE (scope, key) IN (
+                SELECT scope, key FROM idempotency_keys WHERE expires_at < now() LIMIT :n
+            )
+            """
+        ),
+        {"n": batch_size},
+    ).rowcount
@@ -0,0 +1,135 @@
+"""
+Busca do próximo horário livre ("primeiro horário disponível") num horizonte longo.
+
+Em vez de consultar dia a dia, a busca anda em janelas crescentes
+(NEXT_AVAILABLE_FIRST_CHUNK_DAYS, depois o dobro a cada janela) até
+NEXT_AVAILABLE_MAX_DAYS:
+  - expediente de todos os prestadores: uma consulta, antes do laço;
+  - por janela: agendamentos que sobrepõem a janela (range scan GiST), holds e
+    horários em grupo lotados — uma consulta cada; prestadores com inventário
+    leem só o primeiro slot FREE livre de cada um (LIMIT 1 por prestador);
+  - dias sem expediente para nenhum prestador são pulados sem custo.
+Para na primeira janela com horário livre, então uma abertura daqui a dois
+meses custa ~4 janelas (7 + 14 + 28 + ...), não 60 consultas.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.appointment import Appointment
+from app.models.provider import Provider, ProviderWorkHours
+from app.services.group_slots import full_starts_by_provider, is_group
+from app.services.holds import held_starts_by_provider
+from app.services.slot_inventory import first_free_slot_by_provider
+from app.services.slots import UTC, day_bounds_utc, db_weekday, free_slots
+
+
+@dataclass
+class NextAvailable:
+    provider_id: object | None
+    starts_at: datetime | None  # UTC
+    searched_until: date
+
+
+def _chunks(first_day: date, horizon_days: int, first_chunk_days: int):
+    """(início, fim exclusivo) de janelas crescentes até o horizonte."""
+    start, size = 0, max(1, first_chunk_days)
+    while start < horizon_days:
+        end = min(start + size, horizon_days)
+        yield first_day + timedelta(days=start), first_day + timedelta(days=end)
+        start, size = end, size * 2
+
+
+def find_next_available(
+    db: Session,
+    providers: list[Provider],
+    tzinfo,
+    after: datetime,
+    horizon_days: int,
+    exclude_hold_user_id=None,
+) -> NextAvailable:
+    """Primeiro slot livre (o mais cedo entre `providers`) estritamente depois de `after`."""
+    after_local = after.astimezone(tzinfo)
+    first_day = after_local.date()
+    last_day = first_day + timedelta(days=horizon_days)
+    if not providers:
+        return NextAvailable(None, None, first_day)
+
+    legacy_ids = [p.id for p in providers if not p.slot_inventory_enabled]
+    inventory_ids = [p.id for p in providers if p.slot_inventory_enabled]
+    legacy_group_ids = [p.id for p in providers if is_group(p) and not p.slot_inventory_enabled]
+
+    blocks: dict = defaultdict(lambda: defaultdict(list))  # provider -> weekday -> blocos
+    if legacy_ids:
+        for r in db.execute(
+            select(ProviderWorkHours.provider_id, ProviderWorkHours.weekday, ProviderWorkHours.start_time, ProviderWorkHours.end_time)
+            .where(ProviderWorkHours.provider_id.in_(legacy_ids))
+        ).all():
+            blocks[r.provider_id][r.weekday].append((r.start_time, r.end_time))
+    working_weekdays = {wd for per_day in blocks.values() for wd in per_day}
+    if not working_weekdays and not inventory_ids:
+        return NextAvailable(None, None, last_day)
+
+    for chunk_start, chunk_end in _chunks(first_day, horizon_days, settings.next_available_first_chunk_days):
+        range_start, _ = day_bounds_utc(chunk_start, tzinfo)
+        range_end, _ = day_bounds_utc(chunk_end, tzinfo)
+        range_start = max(range_start, after.astimezone(UTC))
+
+        # agendamentos da janela, separados por prestador e dia local
+        busy: dict = defaultdict(lambda: defaultdict(list))
+        if legacy_ids and any(db_weekday(chunk_start + timedelta(days=i)) in working_weekdays for i in range((chunk_end - chunk_start).days)):
+            for r in db.execute(
+                select(Appointment.provider_id, Appointment.starts_at, Appointment.ends_at).where(
+                    and_(
+                        Appointment.provider_id.in_(legacy_ids),
+                        Appointment.status.in_(("PENDING","CONFIRMED")),
+                        ~Appointment.group_booking,
+                        Appointment.period.overlaps(func.tstzrange(range_start, range_end, "[)")),
+                    )
+                )
+            ).all():
+                d = r.starts_at.astimezone(tzinfo).date()
+                while d <= r.ends_at.astimezone(tzinfo).date():
+                    busy[r.provider_id][d].append((r.starts_at, r.ends_at))
+                    d += timedelta(days=1)
+
+        held: dict = {}
+        if legacy_ids:
+            held = held_starts_by_provider(db, legacy_ids, range_start, range_end, exclude_user_id=exclude_hold_user_id)
+        # horários em grupo lotados contam como ocupados, igual a um hold
+        if legacy_group_ids:
+            for pid, full in full_starts_by_provider(db, legacy_group_ids, range_start, range_end).items():
+                held.setdefault(pid, set()).update(full)
+
+        best: tuple[datetime, object] | None = None
+        if inventory_ids:
+            first_free = first_free_slot_by_provider(db, inventory_ids, range_start, range_end, exclude_hold_user_id)
+            for pid, first in first_free.items():
+                if best is None or first < best[0]:
+                    best = (first, pid)
+
+        day = chunk_start
+        while day < chunk_end:
+            # o inventário já achou algo antes deste dia: nada do legado pode ser mais cedo
+            if best is not None and best[0] < day_bounds_utc(day, tzinfo)[0]:
+                break
+            wd = db_weekday(day)
+            if wd in working_weekdays:
+                for pid in legacy_ids:
+                    day_blocks = blocks[pid].get(wd)
+                    if not day_blocks:
+                        continue
+                    slots = free_slots(day, day_blocks, tzinfo, busy[pid].get(day, ()), held.get(pid, set()), after_local)
+                    if slots:
+                        first = slots[0].astimezone(UTC)
+                        if best is None or first < best[0]:
+                            best = (first, pid)
+            day += timedelta(days=1)
+
+        if best is not None:
+            return NextAvailable(best[1], best[0], chunk_end)
+    return NextAvailable(None, None, last_day)
@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
 from app.models.outbox import Outbox
+from app.services.availability_notify import notify_slot_change
 
 def enqueue_event(db: Session, aggregate_type: str, aggregate_id: str, event_type: str, payload: dict, headers: dict | None = None):
     row = Outbox(aggregate_type=aggregate_type, aggregate_id=aggregate_id, event_type=event_type, payload=payload, headers=headers or {})
     db.add(row)
+    if aggregate_type == "Appointment" and "provider_id" in payload and "starts_at" in payload:
+        # streams SSE de disponibilidade (pg_notify sai só no commit)
+        notify_slot_change(db, payload["provider_id"], payload["starts_at"], payload.get("ends_at"))
     # do not commit here – caller controls transaction boundary
     return row
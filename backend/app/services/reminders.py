@@ -0,0 +1,73 @@
+"""
+Lembretes de agendamentos por buckets de horário (sem tasks com ETA).
+
+A cada ciclo do beat, para cada antecedência L (minutos) a janela
+[now + L - lookback, now + L + tick) é varrida por `starts_at` sobre
+idx_appointments_active_starts, e as mensagens são criadas em lote com
+INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING id. O índice único
+(appointment_id, kind) garante um lembrete por tipo mesmo com janelas
+sobrepostas, ciclos repetidos ou vários beats.
+
+O lookback recupera ciclos perdidos (beat parado); agendamentos criados
+depois de passada a sua janela não recebem aquele lembrete.
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+REMINDER_TEMPLATE = "appt_reminder"
+
+_INSERT_REMINDERS = text(
+    """
+    INSERT INTO notification_messages (channel, recipient, template, variables, status, appointment_id, kind)
+    SELECT 'whatsapp', :recipient, :template,
+           jsonb_build_object('provider_id', a.provider_id, 'starts_at', a.starts_at, 'lead_minutes', :lead),
+           'QUEUED', a.id, :kind
+    FROM appointments a
+    WHERE a.status IN ('PENDING','CONFIRMED')
+      AND a.starts_at >= :lo AND a.starts_at < :hi
+      AND NOT EXISTS (
+          SELECT 1 FROM notification_messages m WHERE m.appointment_id = a.id AND m.kind = :kind
+      )
+    ORDER BY a.starts_at
+    LIMIT :batch
+    ON CONFLICT (appointment_id, kind) WHERE kind IS NOT NULL DO NOTHING
+    RETURNING id
+    """
+)
+
+
+def reminder_kind(lead_minutes: int) -> str:
+    return f"reminder_{lead_minutes}m"
+
+
+def reminder_window(now: datetime, lead_minutes: int, lookback_minutes: int, tick_seconds: int) -> tuple[datetime, datetime]:
+    lead = timedelta(minutes=lead_minutes)
+    lo = max(now, now + lead - timedelta(minutes=lookback_minutes))
+    return lo, now + lead + timedelta(seconds=tick_seconds)
+
+
+def create_reminder_batch(
+    db: Session,
+    lead_minutes: int,
+    lo: datetime,
+    hi: datetime,
+    batch_size: int,
+    recipient: str,
+) -> list[int]:
+    """Cria até `batch_size` lembretes da janela [lo, hi) e devolve os ids novos."""
+    return db.execute(
+        _INSERT_REMINDERS,
+        {
+            "recipient": recipient,
+            "template": REMINDER_TEMPLATE,
+            "lead": lead_minutes,
+            "kind": reminder_kind(lead_minutes),
+            "lo": lo,
+            "hi": hi,
+            "batch": batch_size,
+        },
+    ).scalars().all()
@@ -0,0 +1,98 @@
+"""
+Substituição do expediente semanal em lote (PUT /providers/{id}/schedule).
+
+Os blocos recebidos são normalizados em memória (por dia, ordenados, com
+sobreposições e encostados fundidos), comparados com as linhas atuais de
+provider_work_hours e aplicados com um DELETE e um INSERT em lote. A versão
+do expediente sobe uma vez e o inventário (se ligado) é regenerado uma vez,
+só para os dias alterados. Os streams de disponibilidade do prestador são
+avisados na mesma transação.
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+from collections import defaultdict
+from datetime import time
+from typing import Iterable
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models.provider import Provider, ProviderWorkHours
+from app.services.availability_notify import notify_slot_change
+from app.services.slot_inventory import sync_provider_slots
+
+Block = tuple[int, time, time]  # (weekday 0=domingo, início, fim)
+
+
+def merge_blocks(blocks: Iterable[Block]) -> list[Block]:
+    """Ordena e funde blocos sobrepostos/encostados do mesmo dia. ValueError se inválido."""
+    by_day: dict[int, list[tuple[time, time]]] = defaultdict(list)
+    for weekday, start, end in blocks:
+        if not 0 <= weekday <= 6:
+            raise ValueError(f"invalid weekday {weekday}")
+        if start >= end:
+            raise ValueError(f"start_time must be before end_time ({start:%H:%M}-{end:%H:%M})")
+        by_day[weekday].append((start, end))
+
+    merged: list[Block] = []
+    for weekday in sorted(by_day):
+        current_start, current_end = None, None
+        for start, end in sorted(by_day[weekday]):
+            if current_end is not None and start <= current_end:
+                current_end = max(current_end, end)
+                continue
+            if current_end is not None:
+                merged.append((weekday, current_start, current_end))
+            current_start, current_end = start, end
+        merged.append((weekday, current_start, current_end))
+    return merged
+
+
+def replace_schedule(db: Session, provider: Provider, blocks: Iterable[Block]) -> dict:
+    """
+    Aplica a semana completa `blocks` ao prestador. Devolve contagens; a versão
+    só sobe se algo mudou.
+    """
+    desired = set(merge_blocks(blocks))
+    existing = {
+        (r.weekday, r.start_time, r.end_time): r.id
+        for r in db.execute(
+            select(ProviderWorkHours.id, ProviderWorkHours.weekday, ProviderWorkHours.start_time, ProviderWorkHours.end_time)
+            .where(ProviderWorkHours.provider_id == provider.id)
+        ).all()
+    }
+
+    stale = {block: row_id for block, row_id in existing.items() if block not in desired}
+    to_delete = list(stale.values())
+    to_insert = sorted(desired - existing.keys())
+    if not to_delete and not to_insert:
+        return {"inserted": 0, "deleted": 0, "changed": False}
+
+    if to_delete:
+        db.execute(delete(ProviderWorkHours).where(ProviderWorkHours.id.in_(to_delete)))
+    if to_insert:
+        db.execute(insert(ProviderWorkHours), [
+            {"provider_id": provider.id, "weekday": wd, "start_time": st, "end_time": et}
+            for wd, st, et in to_insert
+        ])
+
+    db.execute(
+        update(Provider)
+        .where(Provider.id == provider.id)
+        .values(schedule_version=Provider.schedule_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.expire(provider, ["schedule_version"])
+
+    if provider.slot_inventory_enabled:
+        changed_days = {wd for wd, _, _ in to_insert} | {wd for wd, _, _ in stale}
+        sync_provider_slots(db, provider, weekdays=changed_days)
+    notify_slot_change(db, provider.id)
+    return {"inserted": len(to_insert), "deleted": len(to_delete), "changed": True}
+
+
+def bump_schedule_version(db: Session, provider: Provider) -> None:
+    """Para as rotas de bloco único (POST/DELETE work-hours); também avisa os streams."""
+    provider.schedule_version = (provider.schedule_version or 0) + 1
+    db.add(provider)
+    notify_slot_change(db, provider.id)
@@ -0,0 +1,249 @@
+"""
+Inventário materializado de slots (opt-in por prestador).
+
+Para prestadores com `slot_inventory_enabled`, os slots dos próximos
+`slot_inventory_horizon_days` dias ficam pré-gerados em `provider_slots`:
+  - disponibilidade = leitura indexada das linhas FREE (idx_provider_slots_free);
+  - agendamento = claim atômico `UPDATE ... WHERE status='FREE' RETURNING`;
+  - cancelamento = libera a linha de volta para FREE.
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.appointment import Appointment
+from app.models.provider import Provider, ProviderSlot, ProviderWorkHours
+from app.services.slots import SLOT_MINUTES, UTC, candidate_slots, day_bounds_utc, db_weekday
+
+_INSERT_CHUNK = 1000
+
+
+def _today(tzinfo) -> date:
+    return datetime.now(tzinfo).date()
+
+
+def sync_provider_slots(
+    db: Session,
+    provider: Provider,
+    day_from: date | None = None,
+    day_to: date | None = None,
+    weekdays: Iterable[int] | None = None,
+) -> dict:
+    """
+    Alinha provider_slots com provider_work_hours no intervalo [day_from, day_to].
+    - insere slots que faltam (já como BOOKED se houver agendamento ativo no horário);
+    - remove slots FREE que não existem mais no expediente (BOOKED nunca são removidos);
+    - `weekdays` (convenção 0=domingo) restringe o diff aos dias afetados.
+    """
+    tzinfo = ZoneInfo(provider.timezone)
+    today = _today(tzinfo)
+    day_from = max(day_from or today, today)
+    day_to = day_to or today + timedelta(days=settings.slot_inventory_horizon_days)
+    if day_to < day_from:
+        return {"inserted": 0, "deleted": 0}
+    only = set(weekdays) if weekdays is not None else None
+
+    blocks_by_weekday: dict[int, list] = defaultdict(list)
+    for r in db.execute(select(ProviderWorkHours).where(ProviderWorkHours.provider_id == provider.id)).scalars():
+        blocks_by_weekday[r.weekday].append((r.start_time, r.end_time))
+
+    step = timedelta(minutes=SLOT_MINUTES)
+    desired: dict[datetime, datetime] = {}
+    d = day_from
+    while d <= day_to:
+        wd = db_weekday(d)
+        if only is None or wd in only:
+            for s in candidate_slots(d, blocks_by_weekday.get(wd, ()), tzinfo):
+                s_utc = s.astimezone(UTC)
+                desired[s_utc] = s_utc + step
+        d += timedelta(days=1)
+
+    range_start, _ = day_bounds_utc(day_from, tzinfo)
+    _, range_end = day_bounds_utc(day_to, tzinfo)
+
+    existing = db.execute(
+        select(ProviderSlot.id, ProviderSlot.starts_at, ProviderSlot.status).where(
+            ProviderSlot.provider_id == provider.id,
+            ProviderSlot.starts_at >= range_start,
+            ProviderSlot.starts_at < range_end,
+        )
+    ).all()
+    if only is not None:
+        existing = [r for r in existing if db_weekday(r.starts_at.astimezone(tzinfo).date()) in only]
+
+    existing_starts = {r.starts_at for r in existing}
+    stale = [r.id for r in existing if r.status == "FREE" and r.starts_at not in desired]
+    missing = sorted(s for s in desired if s not in existing_starts)
+
+    if missing:
+        taken = dict(db.execute(
+            select(Appointment.starts_at, Appointment.id).where(
+                and_(
+                    Appointment.provider_id == provider.id,
+                    Appointment.status.in_(("PENDING", "CONFIRMED")),
+                    ~Appointment.group_booking,
+                    Appointment.starts_at >= missing[0],
+                    Appointment.starts_at <= missing[-1],
+                )
+            )
+        ).all())
+        values = [
+            {
+                "provider_id": provider.id,
+                "starts_at": s,
+                "ends_at": desired[s],
+                "status": "BOOKED" if s in taken else "FREE",
+                "appointment_id": taken.get(s),
+            }
+            for s in missing
+        ]
+        for i in range(0, len(values), _INSERT_CHUNK):
+            db.execute(
+                pg_insert(ProviderSlot)
+                .values(values[i:i + _INSERT_CHUNK])
+                .on_conflict_do_nothing(index_elements=["provider_id", "starts_at"])
+            )
+
+    if stale:
+        db.execute(delete(ProviderSlot).where(ProviderSlot.id.in_(stale)))
+
+    if only is None and (provider.slots_generated_until is None or provider.slots_generated_until < day_to):
+        provider.slots_generated_until = day_to
+        db.add(provider)
+    return {"inserted": len(missing), "deleted": len(stale)}
+
+
+def extend_horizon(db: Session, provider: Provider) -> dict:
+    """Gera apenas os dias novos do horizonte e descarta slots FREE já passados."""
+    tzinfo = ZoneInfo(provider.timezone)
+    today = _today(tzinfo)
+    horizon = today + timedelta(days=settings.slot_inventory_horizon_days)
+    start = provider.slots_generated_until + timedelta(days=1) if provider.slots_generated_until else today
+    res = sync_provider_slots(db, provider, day_from=start, day_to=horizon)
+    db.execute(delete(ProviderSlot).where(
+        ProviderSlot.provider_id == provider.id,
+        ProviderSlot.status == "FREE",
+        ProviderSlot.starts_at < datetime.now(UTC),
+    ))
+    return res
+
+
+def drop_inventory(db: Session, provider: Provider) -> None:
+    db.execute(delete(ProviderSlot).where(ProviderSlot.provider_id == provider.id))
+    provider.slots_generated_until = None
+    db.add(provider)
+
+
+def free_slot_starts(db: Session, provider_id, start_utc: datetime, end_utc: datetime) -> list[datetime]:
+    return db.execute(
+        select(ProviderSlot.starts_at)
+        .where(
+            ProviderSlot.provider_id == provider_id,
+            ProviderSlot.status == "FREE",
+            ProviderSlot.starts_at >= start_utc,
+            ProviderSlot.starts_at < end_utc,
+        )
+        .order_by(ProviderSlot.starts_at)
+    ).scalars().all()
+
+
+# primeiro FREE de cada prestador: LIMIT 1 por prestador (LATERAL) no idx_provider_slots_free,
+# pulando holds válidos de outros usuários e horários de grupo lotados
+_FIRST_FREE_SQL = text(
+    """
+    SELECT p.pid AS provider_id, s.starts_at
+    FROM unnest(CAST(:ids AS uuid[])) AS p(pid)
+    CROSS JOIN LATERAL (
+        SELECT ps.starts_at
+        FROM provider_slots ps
+        WHERE ps.provider_id = p.pid
+          AND ps.status = 'FREE'
+          AND ps.starts_at >= :lo AND ps.starts_at < :hi
+          AND NOT EXISTS (
+              SELECT 1 FROM slot_holds h
+              WHERE h.provider_id = ps.provider_id AND h.starts_at = ps.starts_at
+                AND h.expires_at > now()
+                AND (CAST(:exclude_user AS uuid) IS NULL OR h.user_id <> CAST(:exclude_user AS uuid))
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM slot_bookings b JOIN providers pr ON pr.id = b.provider_id
+              WHERE b.provider_id = ps.provider_id AND b.starts_at = ps.starts_at
+                AND b.booked >= pr.slot_capacity
+          )
+        ORDER BY ps.starts_at
+        LIMIT 1
+    ) s
+    """
+)
+
+
+def first_free_slot_by_provider(db: Session, provider_ids, start_utc: datetime, end_utc: datetime, exclude_hold_user_id=None) -> dict:
+    """provider_id -> primeiro slot FREE livre em [start_utc, end_utc), uma consulta para todos."""
+    rows = db.execute(_FIRST_FREE_SQL, {
+        "ids": [str(pid) for pid in provider_ids], "lo": start_utc, "hi": end_utc,
+        "exclude_user": str(exclude_hold_user_id) if exclude_hold_user_id is not None else None,
+    }).all()
+    return {r.provider_id: r.starts_at for r in rows}
+
+
+def free_slot_starts_by_provider(db: Session, provider_ids, start_utc: datetime, end_utc: datetime) -> dict:
+    """free_slot_starts para vários prestadores numa consulta: provider_id -> lista ordenada."""
+    out: dict = defaultdict(list)
+    rows = db.execute(
+        select(ProviderSlot.provider_id, ProviderSlot.starts_at)
+        .where(
+            ProviderSlot.provider_id.in_(provider_ids),
+            ProviderSlot.status == "FREE",
+            ProviderSlot.starts_at >= start_utc,
+            ProviderSlot.starts_at < end_utc,
+        )
+        .order_by(ProviderSlot.provider_id, ProviderSlot.starts_at)
+    ).all()
+    for pid, starts_at in rows:
+        out[pid].append(starts_at)
+    return out
+
+
+def claim_slot(db: Session, provider_id, starts_utc: datetime, appointment_id) -> bool:
+    """Claim atômico: só uma transação consegue passar o slot de FREE para BOOKED."""
+    claimed = db.execute(
+        update(ProviderSlot)
+        .where(
+            ProviderSlot.provider_id == provider_id,
+            ProviderSlot.starts_at == starts_utc,
+            ProviderSlot.status == "FREE",
+        )
+        .values(status="BOOKED", appointment_id=appointment_id)
+        .returning(ProviderSlot.id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    return claimed is not None
+
+
+def slot_exists(db: Session, provider_id, starts_utc: datetime) -> bool:
+    return db.scalar(
+        select(ProviderSlot.id).where(ProviderSlot.provider_id == provider_id, ProviderSlot.starts_at == starts_utc)
+    ) is not None
+
+
+def slot_status(db: Session, provider_id, starts_utc: datetime) -> str | None:
+    return db.scalar(
+        select(ProviderSlot.status).where(ProviderSlot.provider_id == provider_id, ProviderSlot.starts_at == starts_utc)
+    )
+
+
+def release_slot(db: Session, appointment_id) -> None:
+    db.execute(
+        update(ProviderSlot)
+        .where(ProviderSlot.appointment_id == appointment_id)
+        .values(status="FREE", appointment_id=None)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,112 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+SLOT_MINUTES = 30
+UTC = ZoneInfo("UTC")
+
+# (start_time, end_time) de um bloco de expediente, em horário local
+WorkBlock = tuple[time, time]
+
+
+def db_weekday(day: date) -> int:
+    # Python Mon=0 .. Sun=6; our table uses 0=Sunday .. 6=Saturday
+    return (day.weekday() + 1) % 7
+
+
+def blocks_of(rows) -> list[WorkBlock]:
+    """Converte linhas de ProviderWorkHours em tuplas (start_time, end_time)."""
+    return [(r.start_time, r.end_time) for r in rows]
+
+
+def generate_slots(day: date, start_t: time, end_t: time, tzinfo, slot_minutes: int = SLOT_MINUTES):
+    """Slots candidatos de um bloco, em horário local."""
+    step = timedelta(minutes=slot_minutes)
+    cur = datetime.combine(day, start_t, tzinfo)
+    end_dt_local = datetime.combine(day, end_t, tzinfo)
+    while cur + step <= end_dt_local:
+        yield cur
+        cur += step
+
+
+def candidate_slots(day: date, blocks: Iterable[WorkBlock], tzinfo, slot_minutes: int = SLOT_MINUTES) -> list[datetime]:
+    out: list[datetime] = []
+    for start_t, end_t in blocks:
+        out.extend(generate_slots(day, start_t, end_t, tzinfo, slot_minutes))
+    return out
+
+
+def day_bounds_utc(day: date, tzinfo) -> tuple[datetime, datetime]:
+    """Início do dia local em UTC e +24h (mesma janela usada nas consultas de ocupação)."""
+    start = datetime.combine(day, time(0, 0, tzinfo=tzinfo)).astimezone(UTC)
+    return start, start + timedelta(days=1)
+
+
+def available_slots(
+    day: date,
+    blocks: Iterable[WorkBlock],
+    tzinfo,
+    taken_utc: set[datetime],
+    now_local: datetime,
+    slot_minutes: int = SLOT_MINUTES,
+) -> list[datetime]:
+    """Slots livres (horário local, ordenados): candidatos - ocupados - passados."""
+    available = []
+    for s in candidate_slots(day, blocks, tzinfo, slot_minutes):
+        if s.astimezone(UTC) in taken_utc:
+            continue
+        if s <= now_local:
+            continue
+        available.append(s)
+    return sorted(available)
+
+
+def overlapping_starts(
+    slots_local: Iterable[datetime],
+    busy_utc: Iterable[tuple[datetime, datetime]],
+    slot_minutes: int = SLOT_MINUTES,
+) -> set[datetime]:
+    """Inícios (UTC) dos slots que se sobrepõem a algum intervalo ocupado [início, fim)."""
+    merged: list[list[datetime]] = []
+    for b_start, b_end in sorted(busy_utc):
+        if merged and b_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b_end)
+        else:
+            merged.append([b_start, b_end])
+
+    step = timedelta(minutes=slot_minutes)
+    out: set[datetime] = set()
+    i = 0
+    for s in sorted(x.astimezone(UTC) for x in slots_local):
+        while i < len(merged) and merged[i][1] <= s:
+            i += 1
+        if i < len(merged) and merged[i][0] < s + step:
+            out.add(s)
+    return out
+
+
+def free_slots(
+    day: date,
+    blocks: Iterable[WorkBlock],
+    tzinfo,
+    busy_utc: Iterable[tuple[datetime, datetime]],
+    blocked_utc: set[datetime],
+    now_local: datetime,
+    slot_minutes: int = SLOT_MINUTES,
+) -> list[datetime]:
+    """Disponibilidade de um prestador no dia: candidatos - sobrepostos a `busy_utc` - `blocked_utc` - passados."""
+    blocks = list(blocks)
+    taken = overlapping_starts(candidate_slots(day, blocks, tzinfo, slot_minutes), busy_utc, slot_minutes)
+    return available_slots(day, blocks, tzinfo, taken | blocked_utc, now_local, slot_minutes)
+
+
+def fits_work_blocks(blocks: Iterable[WorkBlock], starts_local: datetime, slot_minutes: int = SLOT_MINUTES) -> bool:
+    """True se o slot [starts_local, +slot_minutes) cabe inteiro em algum bloco."""
+    d = starts_local.date()
+    tzinfo = starts_local.tzinfo
+    for start_t, end_t in blocks:
+        b_start = datetime.combine(d, start_t, tzinfo)
+        b_end = datetime.combine(d, end_t, tzinfo)
+        if b_start <= starts_local < b_end and starts_local + timedelta(minutes=slot_minutes) <= b_end:
+            return True
+    return False
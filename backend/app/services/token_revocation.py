@@ -0,0 +1,236 @@
+"""
+Revogação de access tokens (jti) sem consulta ao banco por request.
+
+  - revoked_access_tokens (jti, user_id, expires_at, revoked_at) é a lista exata;
+    expires_at é o `exp` do token: depois dele o próprio JWT já é rejeitado e a
+    linha pode ser apagada (auth.purge_revoked_tokens);
+  - cada processo espelha os jtis num Bloom filter em memória. A checagem normal
+    é um probe de ~k bits; só um acerto no filtro (revogado de verdade ou falso
+    positivo, TOKEN_REVOCATION_BLOOM_FP_RATE) vai ao banco pela PK;
+  - o filtro é atualizado de forma incremental no máximo a cada
+    TOKEN_REVOCATION_REFRESH_SECONDS, dentro do request que encontrar o estado
+    vencido (mesmo esquema do check da réplica): lê só as revogações recentes
+    por revoked_at, com uma janela de sobreposição para transações que fizeram
+    commit depois de começar. Revogar no próprio processo vale na hora;
+  - a carga completa (início do processo, ou filtro acima da capacidade, que
+    então dobra) roda numa thread. Enquanto não termina — ou se a atualização
+    falhar por muito tempo — toda checagem vai ao banco: nunca aceita um token
+    revogado por causa de um filtro desatualizado.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.revoked_access_token import RevokedAccessToken
+
+log = logging.getLogger(__name__)
+
+# revogações com revoked_at até esta idade antes da última atualização são relidas: revoked_at
+# é o início da transação do logout, que pode fazer commit depois de uma atualização
+_REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    """Bloom filter em bytearray; posições por double hashing de um blake2b de 128 bits."""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _hash(self, item: str) -> tuple[int, int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+    def add(self, item: str) -> bool:
+        """Marca o item; False se ele (provavelmente) já estava no filtro."""
+        h1, h2 = self._hash(item)
+        bits, size = self.bits, self.size
+        new = False
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            byte, mask = p >> 3, 1 << (p & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, item: str) -> bool:
+        # para de testar no primeiro bit zerado: um jti ausente custa ~1-2 posições, não k
+        h1, h2 = self._hash(item)
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            p = (h1 + i * h2) % size
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+def revoke_access_token(db: Session, jti: str, user_id, expires_at: datetime) -> None:
+    """Grava a revogação (idempotente); não faz commit."""
+    stmt = pg_insert(RevokedAccessToken).values(jti=jti, user_id=user_id, expires_at=expires_at)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["jti"]))
+
+
+def purge_expired(db: Session, batch_size: int = 5000) -> int:
+    """Remove até `batch_size` revogações de tokens já vencidos; devolve quantas removeu."""
+    return db.execute(
+        text(
+            """
+            DELETE FROM revoked_access_tokens
+            WHERE jti IN (SELECT jti FROM revoked_access_tokens WHERE expires_at < now() LIMIT :n)
+            """
+        ),
+        {"n": batch_size},
+    ).rowcount
+
+
+class RevocationList:
+    def __init__(self, refresh_seconds: float, capacity: int, fp_rate: float, bind=engine):
+        self._bind = bind
+        self._refresh_seconds = refresh_seconds
+        self._capacity = capacity
+        self._fp_rate = fp_rate
+        # sem atualização por este tempo o filtro deixa de ser confiável
+        self._stale_after = max(30.0, 10 * refresh_seconds)
+        self._lock = threading.Lock()
+        self._filter: BloomFilter | None = None
+        self._since: datetime | None = None  # relógio do banco na última atualização
+        self._refreshed_at = 0.0
+        self._loading: threading.Thread | None = None
+        self.exact_lookups = 0
+
+    # --- checagem ---
+
+    def is_revoked(self, jti: str) -> bool:
+        bloom = self._current_filter()
+        if bloom is not None and jti not in bloom:
+            return False
+        self.exact_lookups += 1
+        return self._exact(jti)
+
+    def _current_filter(self) -> BloomFilter | None:
+        if self._filter is None:
+            self._start_load()
+            return None
+        if time.monotonic() - self._refreshed_at >= self._refresh_seconds and self._lock.acquire(blocking=False):
+            # um único request por processo atualiza; os demais usam o filtro atual
+            try:
+                self.refresh()
+            except Exception as e:
+                log.warning("revocation list refresh failed: %s", e)
+            finally:
+                self._lock.release()
+        if time.monotonic() - self._refreshed_at > self._stale_after:
+            return None
+        return self._filter
+
+    def _exact(self, jti: str) -> bool:
+        with self._bind.connect() as conn:
+            return conn.execute(select(RevokedAccessToken.jti).where(RevokedAccessToken.jti == jti)).first() is not None
+
+    def note_revoked(self, jti: str) -> None:
+        """Revogação feita neste processo (após o commit): vale sem esperar a atualização."""
+        bloom = self._filter
+        if bloom is not None:
+            bloom.add(jti)
+
+    # --- carga ---
+
+    def _start_load(self) -> None:
+        with self._lock:
+            if self._loading is None or not self._loading.is_alive():
+                self._loading = threading.Thread(target=self._load, name="revocation-list-load", daemon=True)
+                self._loading.start()
+
+    def _load(self) -> None:
+        try:
+            self.load()
+        except Exception:
+            log.exception("revocation list load failed")
+
+    def load(self) -> None:
+        """Carga completa das revogações vigentes num filtro novo."""
+        with self._bind.connect() as conn:
+            since = conn.execute(text("SELECT statement_timestamp()")).scalar_one()
+            count = conn.execute(text("SELECT count(*) FROM revoked_access_tokens WHERE expires_at > now()")).scalar_one()
+            capacity = self._capacity
+            while capacity < count * 1.25:
+                capacity *= 2
+            bloom = BloomFilter(capacity, self._fp_rate)
+            rows = conn.execution_options(stream_results=True, yield_per=10000).execute(
+                text("SELECT jti FROM revoked_access_tokens WHERE expires_at > now()")
+            )
+            for (jti,) in rows:
+                bloom.add(jti)
+        with self._lock:
+            # revogações locais feitas durante a carga vêm na próxima atualização (janela de sobreposição)
+            self._filter = bloom
+            self._capacity = capacity
+            self._since = since
+            self._refreshed_at = time.monotonic()
+
+    def refresh(self) -> None:
+        """Relê as revogações recentes (incremental) para o filtro atual."""
+        bloom = self._filter
+        with self._bind.connect() as conn:
+            now = conn.execute(text("SELECT statement_timestamp()")).scalar_one()
+            rows = conn.execute(
+                select(RevokedAccessToken.jti).where(RevokedAccessToken.revoked_at > self._since - _REFRESH_OVERLAP)
+            ).scalars()
+            for jti in rows:
+                bloom.add(jti)
+        self._since = now
+        self._refreshed_at = time.monotonic()
+        if bloom.count > bloom.capacity and (self._loading is None or not self._loading.is_alive()):
+            # acima da capacidade a taxa de falso positivo sobe: recarrega com o dobro em segundo plano
+            self._capacity = bloom.capacity * 2
+            self._loading = threading.Thread(target=self._load, name="revocation-list-load", daemon=True)
+            self._loading.start()
+
+    def stats(self) -> dict:
+        bloom = self._filter
+        return {
+            "loaded": bloom is not None,
+            "entries": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else self._capacity,
+            "filter_bytes": bloom.nbytes if bloom else 0,
+            "exact_lookups": self.exact_lookups,
+        }
+
+
+_revocations: RevocationList | None = None
+_revocations_lock = threading.Lock()
+
+
+def get_revocation_list() -> RevocationList:
+    """Lista de revogação do processo, criada na primeira checagem."""
+    global _revocations
+    with _revocations_lock:
+        if _revocations is None:
+            _revocations = RevocationList(
+                settings.token_revocation_refresh_seconds,
+                settings.token_revocation_bloom_capacity,
+                settings.token_revocation_bloom_fp_rate,
+            )
+        return _revocations
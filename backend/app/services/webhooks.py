@@ -0,0 +1,226 @@
+"""
+Webhooks de saída para parceiros de integração.
+
+Fluxo:
+  - fan-out: o relay do outbox transforma cada evento de agendamento em uma
+    linha de webhook_deliveries por assinatura ativa do prestador, na mesma
+    transação que publica o evento (INSERT ... SELECT, único por assinatura +
+    evento);
+  - entrega: a task webhooks.deliver pega um "slot" de concorrência do endpoint
+    (pg_try_advisory_lock(hashtext(assinatura), slot), slot < max_concurrency),
+    reivindica até batch_size entregas com lease (FOR UPDATE SKIP LOCKED) e faz
+    um POST assinado com os eventos do lote;
+  - backoff por endpoint: uma falha pausa só aquela assinatura (paused_until,
+    exponencial em failure_count, respeitando Retry-After); as demais seguem.
+
+Assinatura: X-AgendaFacil-Signature: t=<unix>,v1=<hex HMAC-SHA256(secret, "<t>.<corpo>")>.
+
+SSRF: a URL só é aceita se o host resolver apenas para endereços públicos (nada de
+loopback, RFC 1918, link-local como 169.254.169.254, ULA IPv6...). O cadastro
+confere, e a task de entrega confere de novo antes de cada POST, porque o DNS do
+parceiro pode mudar depois do cadastro.
+
+As funções não fazem commit: quem chama controla a transação.
+"""
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+from sqlalchemy import text, update
+from sqlalchemy.orm import Session
+
+from app.models.webhook import WebhookDelivery, WebhookSubscription
+
+WEBHOOK_EVENTS = ("APPT_CREATED", "APPT_CANCELED")
+SIGNATURE_HEADER = "X-AgendaFacil-Signature"
+
+
+def _is_public(ip) -> bool:
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_public_url(url: str, allow_private: bool = False) -> None:
+    """Resolve o host da URL; ValueError se não resolver ou se algum endereço não for público."""
+    parts = urlsplit(url)
+    host = parts.hostname
+    if not host:
+        raise ValueError("url has no host")
+    if allow_private:
+        return
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"cannot resolve host {host}") from e
+    for *_, sockaddr in infos:
+        ip = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        if not _is_public(ip):
+            raise ValueError(f"host {host} resolves to non-public address {ip}")
+
+
+def fan_out_events(db: Session, outbox_ids) -> set:
+    """Cria as entregas dos eventos para as assinaturas interessadas. Devolve os ids das assinaturas."""
+    if not outbox_ids:
+        return set()
+    rows = db.execute(
+        text(
+            """
+            INSERT INTO webhook_deliveries (subscription_id, outbox_id, event_type, payload)
+            SELECT s.id, o.id, o.event_type,
+                   jsonb_build_object('id', o.id, 'type', o.event_type, 'created_at', o.created_at,
+                                      'appointment_id', o.aggregate_id, 'data', o.payload)
+            FROM outbox o
+            JOIN appointments a ON a.id = o.aggregate_id
+            JOIN webhook_subscriptions s
+              ON s.provider_id = a.provider_id AND s.active
+             AND (s.event_types IS NULL OR o.event_type = ANY (s.event_types))
+            WHERE o.id = ANY (:ids) AND o.aggregate_type = 'Appointment'
+            ON CONFLICT ON CONSTRAINT uq_webhook_deliveries_sub_event DO NOTHING
+            RETURNING subscription_id
+            """
+        ),
+        {"ids": list(outbox_ids)},
+    ).scalars().all()
+    return set(rows)
+
+
+def try_concurrency_slot(db: Session, subscription: WebhookSubscription) -> int | None:
+    """
+    Advisory lock de sessão em um dos max_concurrency slots do endpoint; None se todos ocupados.
+    O lock vive na conexão de `db` até release_concurrency_slot (ou até a conexão cair).
+    """
+    for slot in range(max(1, subscription.max_concurrency)):
+        if db.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:sid), :slot)"),
+            {"sid": str(subscription.id), "slot": slot},
+        ).scalar():
+            return slot
+    return None
+
+
+def release_concurrency_slot(db: Session, subscription_id, slot: int) -> None:
+    db.execute(text("SELECT pg_advisory_unlock(hashtext(:sid), :slot)"), {"sid": str(subscription_id), "slot": slot})
+
+
+def claim_batch(db: Session, subscription: WebhookSubscription, lease_seconds: int) -> list:
+    """Reivindica até batch_size entregas vencidas (PENDING ou SENDING com lease expirado)."""
+    rows = db.execute(
+        text(
+            """
+            UPDATE webhook_deliveries d
+            SET status = 'SENDING', attempts = d.attempts + 1,
+                next_attempt_at = now() + make_interval(secs => :lease)
+            WHERE d.id IN (
+                SELECT id FROM webhook_deliveries
+                WHERE subscription_id = :sid AND status IN ('PENDING', 'SENDING') AND next_attempt_at <= now()
+                ORDER BY id
+                LIMIT :n
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING d.id, d.payload, d.attempts
+            """
+        ),
+        {"sid": subscription.id, "n": max(1, subscription.batch_size), "lease": lease_seconds},
+    ).all()
+    return sorted(rows, key=lambda r: r.id)
+
+
+def build_body(deliveries) -> bytes:
+    return json.dumps({"events": [d.payload for d in deliveries]}, separators=(",", ":"), default=str).encode()
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    mac = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={mac}"
+
+
+def backoff_seconds(failure_count: int, base: float, cap: float) -> float:
+    """Exponencial com jitter "full" para o n-ésimo erro seguido do endpoint."""
+    return random.uniform(base, min(cap, base * 2 ** max(0, failure_count - 1)))
+
+
+def mark_sent(db: Session, subscription: WebhookSubscription, delivery_ids) -> None:
+    db.execute(
+        update(WebhookDelivery)
+        .where(WebhookDelivery.id.in_(delivery_ids))
+        .values(status="SENT", sent_at=datetime.now(timezone.utc), last_error=None)
+    )
+    if subscription.failure_count or subscription.paused_until is not None:
+        subscription.failure_count = 0
+        subscription.paused_until = None
+        db.add(subscription)
+
+
+def mark_failed(
+    db: Session,
+    subscription: WebhookSubscription,
+    deliveries,
+    error: str,
+    max_attempts: int,
+    base: float,
+    cap: float,
+    retry_after: float | None = None,
+    disable: bool = False,
+    disable_after: int = 0,
+) -> datetime:
+    """
+    Devolve as entregas para a fila (ou DEAD) e pausa o endpoint. Retorna paused_until.
+    Com disable_after > 0, a falha de número disable_after seguida desativa a assinatura.
+    """
+    subscription.failure_count = (subscription.failure_count or 0) + 1
+    if disable_after > 0 and subscription.failure_count >= disable_after:
+        disable = True
+    delay = backoff_seconds(subscription.failure_count, base, cap)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    resume = datetime.now(timezone.utc) + timedelta(seconds=delay)
+    subscription.paused_until = resume
+    if disable:
+        # 410 Gone, endereço bloqueado ou falhas demais seguidas: as entregas pendentes morrem junto
+        subscription.active = False
+    db.add(subscription)
+
+    dead = [d.id for d in deliveries if disable or d.attempts >= max_attempts]
+    retry = [d.id for d in deliveries if d.id not in dead]
+    if dead:
+        db.execute(update(WebhookDelivery).where(WebhookDelivery.id.in_(dead)).values(status="DEAD", last_error=error[:500]))
+    if retry:
+        db.execute(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.id.in_(retry))
+            .values(status="PENDING", next_attempt_at=resume, last_error=error[:500])
+        )
+    if disable:
+        # o resto da fila da assinatura desativada também não sai mais
+        db.execute(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.subscription_id == subscription.id, WebhookDelivery.status == "PENDING")
+            .values(status="DEAD", last_error=error[:500])
+        )
+    return resume
+
+
+def due_subscriptions(db: Session, limit: int = 500) -> list:
+    """Assinaturas ativas, fora de backoff, com entregas vencidas: (id, slots a acionar)."""
+    return db.execute(
+        text(
+            """
+            SELECT s.id,
+                   least(s.max_concurrency, ceil(count(*)::numeric / greatest(s.batch_size, 1)))::int AS workers
+            FROM webhook_subscriptions s
+            JOIN webhook_deliveries d ON d.subscription_id = s.id
+            WHERE s.active AND (s.paused_until IS NULL OR s.paused_until <= now())
+              AND d.status IN ('PENDING', 'SENDING') AND d.next_attempt_at <= now()
+            GROUP BY s.id
+            LIMIT :n
+            """
+        ),
+        {"n": limit},
+    ).all()
@@ -0,0 +1,79 @@
+"""
+Circuit breaker compartilhado entre processos Celery.
+
+- Estado (closed/open/half-open), contador de falhas e opened_at ficam no Redis via
+  pybreaker.CircuitRedisStorage: um processo que abre o circuito protege a frota toda.
+- Em half-open só um processo faz a chamada de teste: o SingleProbeListener pega um
+  lock `SET NX` no Redis; os demais recebem CircuitBreakerError como se estivesse aberto.
+- Sem Redis (NOTIF_CIRCUIT_STORAGE=memory ou Redis indisponível no boot) cai no
+  breaker em memória por processo, como antes.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+
+import pybreaker
+import redis
+
+from app.core.config import Settings
+
+log = logging.getLogger(__name__)
+
+
+class SingleProbeListener(pybreaker.CircuitBreakerListener):
+    """Limita o half-open a uma única chamada de teste por vez no cluster."""
+
+    def __init__(self, redis_client: redis.Redis, key: str, ttl_seconds: int):
+        self._redis = redis_client
+        self._key = key
+        self._ttl = max(1, int(ttl_seconds))
+        self._held = threading.local()
+
+    def before_call(self, cb, func, *args, **kwargs):
+        if cb.current_state != pybreaker.STATE_HALF_OPEN:
+            return
+        try:
+            acquired = self._redis.set(self._key, "1", nx=True, ex=self._ttl)
+        except redis.RedisError:
+            log.exception("probe lock unavailable; allowing trial call")
+            return
+        if not acquired:
+            raise pybreaker.CircuitBreakerError("half-open trial call already in progress")
+        self._held.value = True
+
+    def success(self, cb):
+        # teste ok -> circuito fechado; libera o lock só se foi este thread que pegou
+        if getattr(self._held, "value", False):
+            self._held.value = False
+            try:
+                self._redis.delete(self._key)
+            except redis.RedisError:
+                log.exception("failed to release probe lock")
+
+    def failure(self, cb, exc):
+        # teste falhou -> circuito reabre; o lock expira sozinho (TTL = reset_timeout)
+        self._held.value = False
+
+
+def build_breaker(settings: Settings, name: str, exclude: tuple = ()) -> pybreaker.CircuitBreaker:
+    kwargs = dict(
+        fail_max=settings.notif_circuit_fail_max,
+        reset_timeout=settings.notif_circuit_reset_seconds,
+        exclude=list(exclude),
+        name=name,
+    )
+    if settings.notif_circuit_storage != "redis":
+        return pybreaker.CircuitBreaker(**kwargs)
+
+    client = redis.Redis.from_url(settings.redis_url, socket_timeout=1.0, socket_connect_timeout=1.0)
+    namespace = f"breaker:{name}"
+    try:
+        storage = pybreaker.CircuitRedisStorage(pybreaker.STATE_CLOSED, client, namespace=namespace)
+    except redis.RedisError:
+        log.warning("redis unavailable; circuit breaker %s falls back to in-process state", name)
+        return pybreaker.CircuitBreaker(**kwargs)
+
+    # o lock expira sozinho se o processo de teste morrer no meio da chamada
+    probe = SingleProbeListener(client, f"{namespace}:probe", ttl_seconds=settings.notif_circuit_reset_seconds)
+    return pybreaker.CircuitBreaker(state_storage=storage, listeners=[probe], **kwargs)
@@ -1,4 +1,5 @@
 from celery.schedules import crontab
+from kombu import Exchange, Queue
 
 from celery import Celery
 import os
@@ -6,14 +7,98 @@ import os
 broker = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/1")
 backend = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/2")
 
+# Filas: primeira tentativa de envio separada das retentativas, para que um backlog
+# de retries nunca atrase confirmações novas. Cada fila tem seu pool de workers
+# (ver docker-compose.yml), com prefetch ajustado ao perfil das tasks.
+QUEUE_OUTBOX = "outbox"
+QUEUE_NOTIFICATIONS = "notifications"
+QUEUE_NOTIFICATIONS_RETRY = "notifications.retry"
+QUEUE_MAINTENANCE = "maintenance"
+# webhooks têm pool próprio: parceiro lento não atrasa notificações
+QUEUE_WEBHOOKS = "webhooks"
+
+# intervalo do agendador de lembretes; também é a largura do bucket varrido por ciclo
+REMINDER_TICK_SECONDS = 60
+
+# Redis: 0 = maior prioridade
+PRIORITY_FIRST_ATTEMPT = 0
+# lembretes dividem a fila de primeira tentativa, mas atrás das confirmações novas
+# (um lote de REMINDER_BATCH_SIZE não passa na frente de quem acabou de agendar)
+PRIORITY_REMINDER = 3
+PRIORITY_RETRY = 6
+
+def _queue(name: str) -> Queue:
+    # exchange/routing key próprios: sem isso todas herdariam o exchange da fila default
+    return Queue(name, Exchange(name, type="direct"), routing_key=name)
+
 celery = Celery("mvp", broker=broker, backend=backend)
+celery.conf.update(
+    task_queues=(
+        _queue(QUEUE_OUTBOX),
+        _queue(QUEUE_NOTIFICATIONS),
+        _queue(QUEUE_NOTIFICATIONS_RETRY),
+        _queue(QUEUE_MAINTENANCE),
+        _queue(QUEUE_WEBHOOKS),
+    ),
+    task_default_queue=QUEUE_MAINTENANCE,
+    task_routes={
+        "outbox.relay": {"queue": QUEUE_OUTBOX},
+        "notifications.send": {"queue": QUEUE_NOTIFICATIONS, "priority": PRIORITY_FIRST_ATTEMPT},
+        "notifications.requeue_stuck": {"queue": QUEUE_MAINTENANCE},
+        "slots.extend_horizon": {"queue": QUEUE_MAINTENANCE},
+        "reminders.schedule": {"queue": QUEUE_MAINTENANCE},
+        "idempotency.purge_expired": {"queue": QUEUE_MAINTENANCE},
+        "holds.purge_expired": {"queue": QUEUE_MAINTENANCE},
+        "auth.purge_revoked_tokens": {"queue": QUEUE_MAINTENANCE},
+        "webhooks.deliver": {"queue": QUEUE_WEBHOOKS},
+        "webhooks.dispatch": {"queue": QUEUE_WEBHOOKS},
+    },
+    # Prioridade no Redis: uma lista por degrau; worker consumindo várias filas
+    # esvazia na ordem declarada em -Q antes de passar para a próxima.
+    broker_transport_options={
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        "queue_order_strategy": "priority",
+    },
+    task_default_priority=PRIORITY_FIRST_ATTEMPT,
+    # tasks de I/O: não reservar mensagens além da que está executando
+    worker_prefetch_multiplier=1,
+)
 celery.autodiscover_tasks(["app.workers.tasks"])
 
 celery.conf.beat_schedule.update({
-    # já deve existir sua task outbox.relay
+    "outbox-relay-every-2s": {
+        "task": "outbox.relay",
+        "schedule": 2.0,
+    },
     "requeue-stuck-every-60s": {
         "task": "notifications.requeue_stuck",
         "schedule": 60.0,
 
      },
-})
\ No newline at end of file
+    "reminders-every-60s": {
+        "task": "reminders.schedule",
+        "schedule": float(REMINDER_TICK_SECONDS),
+    },
+    "idempotency-purge-hourly": {
+        "task": "idempotency.purge_expired",
+        "schedule": 3600.0,
+    },
+    # também é o aviso de expiração para os streams de disponibilidade: intervalo curto
+    "holds-purge-every-15s": {
+        "task": "holds.purge_expired",
+        "schedule": 15.0,
+    },
+    "revoked-tokens-purge-hourly": {
+        "task": "auth.purge_revoked_tokens",
+        "schedule": 3600.0,
+    },
+    "webhooks-dispatch-every-5s": {
+        "task": "webhooks.dispatch",
+        "schedule": 5.0,
+    },
+    "slots-extend-horizon-hourly": {
+        "task": "slots.extend_horizon",
+        "schedule": 3600.0,
+    },
+})
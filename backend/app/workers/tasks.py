@@ -1,3 +1,5 @@
+import random
+import time
 from datetime import datetime, timezone, timedelta
 from sqlalchemy import select, and_, text
 from sqlalchemy.orm import Session
@@ -5,12 +7,28 @@ from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_i
 import httpx
 import pybreaker
 
-from .celery_app import celery
-from app.db.session import SessionLocal
+from .breaker import build_breaker
+from .celery_app import celery, QUEUE_NOTIFICATIONS, QUEUE_NOTIFICATIONS_RETRY, PRIORITY_REMINDER, PRIORITY_RETRY, REMINDER_TICK_SECONDS
+from app.db.session import SessionLocal, engine
 from app.core.config import Settings
 from app.models.outbox import Outbox
 from app.models.notification_message import NotificationMessage
 from app.models.appointment import Appointment  # noqa: F401  -> registra a tabela 'appointments'
+from app.models.provider import Provider
+from app.models.user import User  # noqa: F401  -> registra 'users' (FK de webhook_subscriptions)
+from app.models.webhook import WebhookSubscription
+from app.services.calendar_feed import apply_calendar_events
+from app.services.daily_stats import apply_appointment_events
+from app.services.holds import purge_expired_holds
+from app.services.idempotency import purge_expired
+from app.services.reminders import create_reminder_batch, reminder_window
+from app.services.slot_inventory import extend_horizon
+from app.services.token_revocation import purge_expired as purge_revoked_access_tokens
+from app.services.webhooks import (
+    build_body, check_public_url, claim_batch, due_subscriptions, fan_out_events, mark_failed, mark_sent,
+    release_concurrency_slot, try_concurrency_slot,
+)
+from .webhook_http import post_events
 
 settings = Settings()
 
@@ -25,12 +43,9 @@ class NotificationClient:
     def close(self):
         self._client.close()
 
-# Circuit Breaker em memória
-_breaker = pybreaker.CircuitBreaker(
-    fail_max=settings.notif_circuit_fail_max,
-    reset_timeout=settings.notif_circuit_reset_seconds,
-    name="notifications-http",
-)
+# Circuit Breaker com estado no Redis (compartilhado por todos os processos).
+# Rejeição do provedor (4xx -> ValueError) é erro da mensagem, não do upstream: não conta falha.
+_breaker = build_breaker(settings, "notifications-http", exclude=(ValueError,))
 
 # Chamada protegida pelo breaker
 def _send_whatsapp(client: "NotificationClient", to: str, template: str, variables: dict) -> dict:
@@ -56,7 +71,8 @@ def get_notification_client() -> "NotificationClient":
 def _utcnow():
     return datetime.now(timezone.utc)
 
-@celery.task(name="outbox.relay")
+# acks_late: se o worker morrer no meio, o relay roda de novo (linhas não publicadas são relidas)
+@celery.task(name="outbox.relay", acks_late=True)
 def relay_outbox(batch_size: int = 50):
     db: Session = SessionLocal()
     try:
@@ -65,6 +81,8 @@ def relay_outbox(batch_size: int = 50):
             .where(Outbox.published_at.is_(None))
             .order_by(Outbox.created_at)
             .limit(batch_size)
+            # relays concorrentes não pegam o mesmo evento (rollup aplicado uma vez só)
+            .with_for_update(skip_locked=True)
         ).scalars().all()
 
         to_send: list[int] = []
@@ -87,9 +105,18 @@ def relay_outbox(batch_size: int = 50):
             db.add(ev)
 
         if rows:
+            # rollup do dashboard na mesma transação que marca os eventos como publicados
+            apply_appointment_events(db, rows)
+            # blocos VEVENT do feed iCalendar, idem (o feed nunca relê appointments)
+            apply_calendar_events(db, rows)
+            # fan-out para os webhooks dos parceiros, também na mesma transação
+            subscriptions = fan_out_events(db, [ev.id for ev in rows])
             db.commit()
+            # commit já feito: a mensagem está visível, sem countdown (ETA prende a task na memória do worker)
             for mid in to_send:
-                send_notification.apply_async((mid,), countdown=1)
+                send_notification.apply_async((mid,))
+            for sid in subscriptions:
+                deliver_webhooks.apply_async((str(sid),))
 
     finally:
         db.close()
@@ -97,29 +124,40 @@ def relay_outbox(batch_size: int = 50):
 # --- envio com retry exponencial (tenacity) ---
 
 @retry(
-    stop=stop_after_attempt(lambda: settings.notif_retry_max_attempts),
+    stop=stop_after_attempt(settings.notif_retry_max_attempts),
     wait=wait_exponential_jitter(
         initial=settings.notif_retry_backoff_base,
         max=settings.notif_retry_backoff_max
     ),
     reraise=True,
-    retry=retry_if_exception_type((httpx.RequestError, httpx.HTTPStatusError, pybreaker.CircuitBreakerError))
+    # circuito aberto não é retentado aqui: a task reagenda para depois do reset_timeout
+    retry=retry_if_exception_type((httpx.RequestError, httpx.HTTPStatusError))
 )
 def _send_once_with_retry(to: str, template: str, variables: dict) -> dict:
     client = get_notification_client()
     try:
-        return client.send_whatsapp(to=to, template=template, variables=variables)
+        return _send_whatsapp(client, to=to, template=template, variables=variables)
     finally:
         client.close()
 
-@celery.task(name="notifications.send", bind=True, max_retries=10, default_retry_delay=30)
+def _retry_options() -> dict:
+    # retentativas vão para a fila própria, com prioridade menor que a primeira tentativa
+    return {"queue": QUEUE_NOTIFICATIONS_RETRY, "priority": PRIORITY_RETRY}
+
+def _reminder_options() -> dict:
+    return {"queue": QUEUE_NOTIFICATIONS, "priority": PRIORITY_REMINDER}
+
+@celery.task(name="notifications.send", bind=True, max_retries=10, default_retry_delay=30, acks_late=True, reject_on_worker_lost=True)
 def send_notification(self, message_id: int):
     db: Session = SessionLocal()
     try:
         msg = db.get(NotificationMessage, message_id)
         if not msg:
             # pode ser corrida de visibilidade
-            raise self.retry(countdown=2)
+            raise self.retry(countdown=2, **_retry_options())
+        if msg.status == "SENT":
+            # redelivery (acks_late) ou requeue concorrente: não reenviar
+            return {"ok": True, "id": message_id, "duplicate": True}
 
         # tenta enviar (tenacity lida com retentativas/backoff)
         try:
@@ -141,7 +179,8 @@ def send_notification(self, message_id: int):
             msg.last_error = f"circuit-open: {str(e)}"
             db.add(msg)
             db.commit()
-            raise self.retry(countdown=settings.notif_circuit_reset_seconds)
+            # jitter evita que todas as mensagens represadas acordem juntas no half-open
+            raise self.retry(countdown=settings.notif_circuit_reset_seconds + random.uniform(0, settings.notif_circuit_reset_seconds / 2), **_retry_options())
 
         except (httpx.RequestError, httpx.HTTPStatusError) as e:
             # esgotou as tentativas (tenacity reraise) — marca FAILED e requeue via scheduler
@@ -160,7 +199,7 @@ def send_notification(self, message_id: int):
             msg.last_error = f"unexpected: {str(e)}"
             db.add(msg)
             db.commit()
-            raise self.retry(exc=e, countdown=30)
+            raise self.retry(exc=e, countdown=30, **_retry_options())
 
     finally:
         db.close()
@@ -202,8 +241,203 @@ def requeue_stuck():
         ).scalars().all()
 
         for mid in queued_ids + failed_ids:
-            send_notification.apply_async((mid,), countdown=1)
+            send_notification.apply_async((mid,), **_retry_options())
 
         return {"requeued": len(queued_ids) + len(failed_ids)}
     finally:
         db.close()
+
+# --- inventário de slots (prestadores opt-in) ---
+
+@celery.task(name="slots.extend_horizon")
+def extend_slot_horizon():
+    """
+    Estende o inventário de provider_slots até hoje + slot_inventory_horizon_days
+    (só os dias novos) e descarta slots FREE que já passaram. Um commit por prestador.
+    """
+    db: Session = SessionLocal()
+    try:
+        provider_ids = db.execute(
+            select(Provider.id).where(Provider.slot_inventory_enabled.is_(True))
+        ).scalars().all()
+        inserted = 0
+        for pid in provider_ids:
+            provider = db.get(Provider, pid)
+            if provider is None or not provider.slot_inventory_enabled:
+                continue
+            inserted += extend_horizon(db, provider)["inserted"]
+            db.commit()
+        return {"providers": len(provider_ids), "inserted": inserted}
+    finally:
+        db.close()
+
+# --- lembretes (buckets por starts_at, sem ETA) ---
+
+@celery.task(name="reminders.schedule")
+def schedule_reminders():
+    """
+    Para cada antecedência em REMINDER_LEAD_MINUTES, cria os lembretes do próximo
+    bucket em lotes (commit por lote) e entrega os ids ao envio. Se o processo cair
+    entre o commit e o enfileiramento, requeue_stuck pega as mensagens QUEUED.
+    """
+    db: Session = SessionLocal()
+    try:
+        now = _utcnow()
+        created: dict[str, int] = {}
+        for lead in settings.reminder_leads:
+            lo, hi = reminder_window(now, lead, settings.reminder_lookback_minutes, REMINDER_TICK_SECONDS)
+            total = 0
+            while True:
+                ids = create_reminder_batch(db, lead, lo, hi, settings.reminder_batch_size, recipient="+5500000000000")
+                db.commit()
+                for mid in ids:
+                    send_notification.apply_async((mid,), **_reminder_options())
+                total += len(ids)
+                if len(ids) < settings.reminder_batch_size:
+                    break
+            created[f"{lead}m"] = total
+        return {"created": created}
+    finally:
+        db.close()
+
+# --- Idempotency-Key ---
+
+@celery.task(name="idempotency.purge_expired")
+def purge_idempotency_keys(batch_size: int = 5000):
+    """Apaga chaves vencidas em lotes (commit por lote) para não segurar locks longos."""
+    db: Session = SessionLocal()
+    try:
+        deleted = 0
+        while True:
+            n = purge_expired(db, batch_size)
+            db.commit()
+            deleted += n
+            if n < batch_size:
+                break
+        return {"deleted": deleted}
+    finally:
+        db.close()
+
+# --- holds de checkout ---
+
+@celery.task(name="holds.purge_expired")
+def purge_slot_holds(batch_size: int = 5000):
+    """
+    Remoção física dos holds vencidos (leituras já os ignoram pelo expires_at) e aviso
+    aos streams de disponibilidade de que os slots voltaram, no mesmo commit de cada lote.
+    """
+    db: Session = SessionLocal()
+    try:
+        deleted = 0
+        while True:
+            n = purge_expired_holds(db, batch_size)
+            db.commit()
+            deleted += n
+            if n < batch_size:
+                break
+        return {"deleted": deleted}
+    finally:
+        db.close()
+
+# --- revogação de access tokens ---
+
+@celery.task(name="auth.purge_revoked_tokens")
+def purge_revoked_tokens(batch_size: int = 5000):
+    """Remove revogações de tokens já vencidos (o exp do JWT já os rejeita)."""
+    db: Session = SessionLocal()
+    try:
+        deleted = 0
+        while True:
+            n = purge_revoked_access_tokens(db, batch_size)
+            db.commit()
+            deleted += n
+            if n < batch_size:
+                break
+        return {"deleted": deleted}
+    finally:
+        db.close()
+
+# --- webhooks de parceiros ---
+
+@celery.task(name="webhooks.deliver", ignore_result=True)
+def deliver_webhooks(subscription_id: str):
+    """
+    Drena as entregas vencidas de uma assinatura, em lotes de batch_size por POST.
+    Só roda se conseguir um dos max_concurrency slots do endpoint (advisory lock numa
+    conexão própria, em autocommit); para no primeiro erro (o endpoint entra em
+    backoff) e, ao fim do orçamento de tempo, volta para o fim da fila.
+    """
+    db: Session = SessionLocal()
+    lock_conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    slot = None
+    try:
+        sub = db.get(WebhookSubscription, subscription_id)
+        if sub is None or not sub.active:
+            return {"skipped": "inactive"}
+        slot = try_concurrency_slot(lock_conn, sub)
+        if slot is None:
+            return {"skipped": "busy"}
+
+        sent = 0
+        deadline = time.monotonic() + settings.webhook_task_budget_seconds
+        while time.monotonic() < deadline:
+            if not sub.active or (sub.paused_until is not None and sub.paused_until > _utcnow()):
+                return {"sent": sent, "paused": True}
+            batch = claim_batch(db, sub, settings.webhook_lease_seconds)
+            db.commit()
+            if not batch:
+                return {"sent": sent}
+            try:
+                # o DNS pode ter mudado desde o cadastro: confere o endereço de novo antes do POST
+                check_public_url(sub.url, settings.webhook_allow_private_hosts)
+            except ValueError as e:
+                mark_failed(
+                    db, sub, batch, f"blocked: {e}",
+                    max_attempts=settings.webhook_max_attempts,
+                    base=settings.webhook_backoff_base_seconds,
+                    cap=settings.webhook_backoff_max_seconds,
+                    disable=True,
+                )
+                db.commit()
+                return {"sent": sent, "blocked": str(e)}
+            result = post_events(sub, build_body(batch), max(d.attempts for d in batch), settings.webhook_timeout_seconds)
+            if result.ok:
+                mark_sent(db, sub, [d.id for d in batch])
+                sent += len(batch)
+            else:
+                mark_failed(
+                    db, sub, batch, result.error or "error",
+                    max_attempts=settings.webhook_max_attempts,
+                    base=settings.webhook_backoff_base_seconds,
+                    cap=settings.webhook_backoff_max_seconds,
+                    retry_after=result.retry_after,
+                    disable=result.gone,
+                    disable_after=settings.webhook_disable_after_failures,
+                )
+            db.commit()
+            if not result.ok:
+                return {"sent": sent, "failed": result.error}
+        # orçamento esgotado com trabalho pendente: cede o slot aos outros endpoints
+        deliver_webhooks.apply_async((subscription_id,))
+        return {"sent": sent, "yielded": True}
+    finally:
+        if slot is not None:
+            release_concurrency_slot(lock_conn, subscription_id, slot)
+        lock_conn.close()
+        db.close()
+
+@celery.task(name="webhooks.dispatch")
+def dispatch_webhooks():
+    """
+    Aciona deliver para assinaturas com entregas vencidas (retentativas após backoff,
+    leases expirados), até max_concurrency tasks por endpoint; as sobrando saem sem slot.
+    """
+    db: Session = SessionLocal()
+    try:
+        due = due_subscriptions(db)
+        for sid, workers in due:
+            for _ in range(workers):
+                deliver_webhooks.apply_async((str(sid),))
+        return {"subscriptions": len(due)}
+    finally:
+        db.close()
@@ -0,0 +1,75 @@
+"""
+Clientes HTTP dos webhooks: um httpx.Client por assinatura, reaproveitado entre
+tasks do mesmo processo (keep-alive/TLS por endpoint) e limitado a
+max_concurrency conexões. Um parceiro lento só ocupa o pool dele.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from app.services.webhooks import SIGNATURE_HEADER, sign
+
+_clients: dict = {}
+_lock = threading.Lock()
+
+
+@dataclass
+class WebhookResult:
+    ok: bool
+    status_code: int | None = None
+    error: str | None = None
+    retry_after: float | None = None
+
+    @property
+    def gone(self) -> bool:
+        return self.status_code == 410
+
+
+def get_client(subscription, timeout_seconds: float) -> httpx.Client:
+    """Cliente da assinatura; recriado se URL ou limite de concorrência mudarem."""
+    key = (subscription.url, subscription.max_concurrency, timeout_seconds)
+    with _lock:
+        cached = _clients.get(subscription.id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        client = httpx.Client(
+            timeout=httpx.Timeout(timeout_seconds, connect=min(2.0, timeout_seconds)),
+            limits=httpx.Limits(max_connections=subscription.max_concurrency, max_keepalive_connections=subscription.max_concurrency),
+            headers={"User-Agent": "AgendaFacil-Webhooks/1.0", "Content-Type": "application/json"},
+        )
+        _clients[subscription.id] = (key, client)
+    if cached is not None:
+        cached[1].close()
+    return client
+
+
+def close_clients() -> None:
+    with _lock:
+        clients = [c for _, c in _clients.values()]
+        _clients.clear()
+    for c in clients:
+        c.close()
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    value = resp.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def post_events(subscription, body: bytes, attempt: int, timeout_seconds: float) -> WebhookResult:
+    ts = int(time.time())
+    headers = {SIGNATURE_HEADER: sign(subscription.secret, ts, body), "X-AgendaFacil-Attempt": str(attempt)}
+    try:
+        resp = get_client(subscription, timeout_seconds).post(subscription.url, content=body, headers=headers)
+    except httpx.HTTPError as e:
+        return WebhookResult(ok=False, error=f"{type(e).__name__}: {e}")
+    if 200 <= resp.status_code < 300:
+        return WebhookResult(ok=True, status_code=resp.status_code)
+    return WebhookResult(ok=False, status_code=resp.status_code, error=f"HTTP {resp.status_code}", retry_after=_retry_after(resp))
@@ -0,0 +1,184 @@
+"""
+Benchmark do feed iCalendar (GET /providers/{id}/calendar.ics).
+
+Cria um prestador com --appointments agendamentos ativos dentro da janela
+(20 por dia a partir de amanhã), liga o feed (reconstrução completa dos blocos
+a partir de appointments) e mede, via TestClient:
+  - poll sem mudança com If-None-Match (304): latência e queries;
+  - poll sem If-None-Match (200) com o corpo já no LRU do processo;
+  - depois de cada mudança: o patch do relay (apply_calendar_events com um
+    evento) e o primeiro GET, que remonta o corpo a partir dos blocos;
+  - para comparar, a reconstrução completa (o custo de montar o feed de
+    appointments a cada mudança).
+Conta também as queries que leem appointments nos polls (deve ser 0).
+
+Roda in-process contra o DATABASE_URL do ambiente, com migrations aplicadas.
+Os dados criados são removidos no final.
+
+Uso:
+    python -m benchmarks.bench_calendar
+    python -m benchmarks.bench_calendar --appointments 5000 --requests 200
+"""
+from __future__ import annotations
+
+import argparse
+import time
+import uuid
+from datetime import datetime, time as dtime, timedelta
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, insert
+
+from app.db.session import SessionLocal, engine
+from app.main import create_app
+from app.models.appointment import Appointment
+from app.models.provider import Provider
+from app.models.provider_calendar_event import ProviderCalendarEvent
+from app.models.user import User
+from app.services.calendar_feed import apply_calendar_events, enable_feed, rebuild_calendar
+from benchmarks.common import percentile, write_results
+
+PER_DAY = 20
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.appointments = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, *args):
+        self.count += 1
+        self.appointments += "FROM appointments" in statement or "JOIN appointments" in statement
+
+    def close(self):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+def seed(db, n: int, tzinfo) -> tuple[Provider, list]:
+    tag = uuid.uuid4().hex[:8]
+    user = User(email=f"bench-calendar-{tag}@loadtest.example.com", password_hash="x", full_name="Cliente Bench")
+    db.add(user)
+    db.flush()
+    p = Provider(user_id=user.id, display_name=f"Bench calendar {tag}", timezone=str(tzinfo))
+    db.add(p)
+    db.flush()
+    first = datetime.now(tzinfo).date() + timedelta(days=1)
+    rows = []
+    for i in range(n):
+        day = first + timedelta(days=i // PER_DAY)
+        starts = datetime.combine(day, dtime(8), tzinfo) + timedelta(minutes=30 * (i % PER_DAY))
+        rows.append({"id": uuid.uuid4(), "user_id": user.id, "provider_id": p.id, "starts_at": starts,
+                     "ends_at": starts + timedelta(minutes=30), "status": "CONFIRMED"})
+    if rows:
+        db.execute(insert(Appointment), rows)
+    db.commit()
+    return p, [r["id"] for r in rows]
+
+
+def cleanup(db, provider_id, user_id) -> None:
+    db.rollback()
+    db.execute(delete(ProviderCalendarEvent).where(ProviderCalendarEvent.provider_id == provider_id))
+    db.execute(delete(Appointment).where(Appointment.provider_id == provider_id))
+    db.execute(delete(Provider).where(Provider.id == provider_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+
+
+def summarize(lat: list[float], queries: list[int] | None = None) -> dict:
+    lat = sorted(lat)
+    out = {"p50_ms": round(percentile(lat, 50), 3), "p95_ms": round(percentile(lat, 95), 3)}
+    if queries is not None:
+        out["queries"] = max(queries)
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--appointments", type=int, default=2000, help="agendamentos ativos na janela")
+    p.add_argument("--requests", type=int, default=100, help="polls medidos por caso")
+    p.add_argument("--changes", type=int, default=30, help="mudanças (patch + GET) medidas")
+    p.add_argument("--tz", default="America/Sao_Paulo")
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    tzinfo = ZoneInfo(args.tz)
+    client = TestClient(create_app())
+    db = SessionLocal()
+    provider, appt_ids = seed(db, args.appointments, tzinfo)
+    provider_id, user_id = provider.id, provider.user_id
+    counter = QueryCounter()
+    try:
+        t0 = time.perf_counter()
+        token = enable_feed(db, provider)
+        db.commit()
+        enable_ms = (time.perf_counter() - t0) * 1000
+        url = f"/providers/{provider_id}/calendar.ics"
+
+        first = client.get(url, params={"token": token})
+        first.raise_for_status()
+        etag = first.headers["etag"]
+
+        poll_appt_reads = 0
+
+        def poll(headers: dict, expect: int) -> tuple[float, int]:
+            nonlocal poll_appt_reads
+            before, appt_before = counter.count, counter.appointments
+            t0 = time.perf_counter()
+            r = client.get(url, params={"token": token}, headers=headers)
+            elapsed = (time.perf_counter() - t0) * 1000
+            assert r.status_code == expect, r.status_code
+            poll_appt_reads += counter.appointments - appt_before
+            return elapsed, counter.count - before
+
+        not_modified = [poll({"If-None-Match": etag}, 304) for _ in range(args.requests)]
+        cached = [poll({}, 200) for _ in range(args.requests)]
+
+        patch_lat, changed = [], []
+        for i in range(args.changes):
+            ev = SimpleNamespace(aggregate_id=appt_ids[i % len(appt_ids)], event_type="APPT_CREATED")
+            t0 = time.perf_counter()
+            apply_calendar_events(db, [ev])
+            db.commit()
+            patch_lat.append((time.perf_counter() - t0) * 1000)
+            changed.append(poll({"If-None-Match": etag}, 200))
+
+        rebuild_lat = []
+        for _ in range(max(1, args.changes // 5)):
+            t0 = time.perf_counter()
+            rebuild_calendar(db, provider)
+            db.commit()
+            rebuild_lat.append((time.perf_counter() - t0) * 1000)
+
+        results = {
+            "appointments": args.appointments,
+            "feed_bytes": len(first.content),
+            "enable_ms": round(enable_ms, 2),
+            "poll_304": summarize(*map(list, zip(*not_modified))),
+            "poll_200_cached": summarize(*map(list, zip(*cached))),
+            "patch_ms": summarize(patch_lat),
+            "poll_after_change": summarize(*map(list, zip(*changed))),
+            "full_rebuild": summarize(rebuild_lat),
+            "poll_appointment_queries": poll_appt_reads,
+        }
+        r = results
+        print(f"N={args.appointments} feed={r['feed_bytes'] / 1e3:.0f}KB "
+              f"304 p50={r['poll_304']['p50_ms']}ms ({r['poll_304']['queries']}q) "
+              f"200 cache p50={r['poll_200_cached']['p50_ms']}ms ({r['poll_200_cached']['queries']}q) "
+              f"patch p50={r['patch_ms']['p50_ms']}ms + GET p50={r['poll_after_change']['p50_ms']}ms "
+              f"| rebuild p50={r['full_rebuild']['p50_ms']}ms | leituras de appointments nos polls={poll_appt_reads}")
+    finally:
+        counter.close()
+        cleanup(db, provider_id, user_id)
+        db.close()
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    path = write_results("bench_calendar", {"config": config, "results": results}, args.out)
+    print(f"resultado: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
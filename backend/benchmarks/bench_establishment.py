@@ -0,0 +1,156 @@
+"""
+Benchmark de GET /establishments/{id}/availability por número de prestadores.
+
+Para cada N em --sizes cria um estabelecimento com N prestadores (expediente
+08-18 e ~1/3 dos slots ocupados por agendamentos de 30 a 90 min), mede a rota
+agregada e, para comparar, N chamadas a GET /providers/{id}/availability
+(o que a página do salão fazia antes). Conta também as queries SQL por request:
+a rota agregada deve ficar constante em N.
+
+Roda in-process (TestClient) contra o DATABASE_URL do ambiente, com migrations
+aplicadas. Os dados criados são removidos no final.
+
+Uso:
+    python -m benchmarks.bench_establishment
+    python -m benchmarks.bench_establishment --sizes 1,50 --requests 50
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, event
+
+from app.db.session import SessionLocal, engine
+from app.main import create_app
+from app.models.appointment import Appointment
+from app.models.provider import Establishment, Provider, ProviderWorkHours
+from app.models.user import User
+from app.services.slots import candidate_slots, db_weekday
+from benchmarks.common import percentile, write_results
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def close(self):
+        event.remove(engine, "before_cursor_execute", self._on_execute)
+
+
+def seed(db, n: int, day, tzinfo, rnd: random.Random) -> tuple[uuid.UUID, list[uuid.UUID]]:
+    tag = uuid.uuid4().hex[:8]
+    user = User(email=f"bench-{tag}@loadtest.example.com", password_hash="x")
+    est = Establishment(name=f"Bench {tag}")
+    db.add_all([user, est])
+    db.flush()
+    provider_ids = []
+    blocks = [(dtime(8, 0), dtime(18, 0))]
+    for i in range(n):
+        p = Provider(user_id=user.id, establishment_id=est.id, display_name=f"P{i:02d} {tag}")
+        db.add(p)
+        db.flush()
+        provider_ids.append(p.id)
+        db.add(ProviderWorkHours(provider_id=p.id, weekday=db_weekday(day), start_time=blocks[0][0], end_time=blocks[0][1]))
+        cursor = None
+        for s in candidate_slots(day, blocks, tzinfo):
+            if cursor is not None and s < cursor:
+                continue
+            if rnd.random() < 0.33:
+                minutes = rnd.choice((30, 60, 90))
+                db.add(Appointment(user_id=user.id, provider_id=p.id, starts_at=s, ends_at=s + timedelta(minutes=minutes), status="CONFIRMED"))
+                cursor = s + timedelta(minutes=minutes)
+    db.commit()
+    return est.id, provider_ids
+
+
+def cleanup(db, est_ids: list, provider_ids: list) -> None:
+    users = {p.user_id for p in db.query(Provider).filter(Provider.id.in_(provider_ids))}
+    db.execute(delete(Appointment).where(Appointment.provider_id.in_(provider_ids)))
+    db.execute(delete(ProviderWorkHours).where(ProviderWorkHours.provider_id.in_(provider_ids)))
+    db.execute(delete(Provider).where(Provider.id.in_(provider_ids)))
+    db.execute(delete(Establishment).where(Establishment.id.in_(est_ids)))
+    db.execute(delete(User).where(User.id.in_(users)))
+    db.commit()
+
+
+def timed(fn, n: int, counter: QueryCounter) -> dict:
+    lat = []
+    queries = []
+    for _ in range(n):
+        before = counter.count
+        t0 = time.perf_counter()
+        fn()
+        lat.append((time.perf_counter() - t0) * 1000)
+        queries.append(counter.count - before)
+    lat.sort()
+    return {
+        "p50_ms": round(percentile(lat, 50), 2),
+        "p95_ms": round(percentile(lat, 95), 2),
+        "queries": max(queries),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--sizes", default="1,10,25,50", help="números de prestadores por estabelecimento")
+    p.add_argument("--requests", type=int, default=30, help="requests medidos por caso")
+    p.add_argument("--tz", default="America/Sao_Paulo")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    tzinfo = ZoneInfo(args.tz)
+    day = datetime.now(tzinfo).date() + timedelta(days=1)
+    rnd = random.Random(args.seed)
+    client = TestClient(create_app())
+    counter = QueryCounter()
+    db = SessionLocal()
+    est_ids: list = []
+    all_providers: list = []
+    results = {}
+    try:
+        for n in sizes:
+            est_id, provider_ids = seed(db, n, day, tzinfo, rnd)
+            est_ids.append(est_id)
+            all_providers.extend(provider_ids)
+            params = {"date": day.isoformat(), "tz": args.tz}
+
+            def aggregated():
+                r = client.get(f"/establishments/{est_id}/availability", params=params)
+                r.raise_for_status()
+
+            def fan_out():
+                for pid in provider_ids:
+                    client.get(f"/providers/{pid}/availability", params=params).raise_for_status()
+
+            aggregated()  # aquecimento
+            results[n] = {
+                "establishment": timed(aggregated, args.requests, counter),
+                "per_provider_calls": timed(fan_out, max(1, args.requests // 5), counter),
+            }
+            agg, fan = results[n]["establishment"], results[n]["per_provider_calls"]
+            print(f"N={n:<3} establishment p50={agg['p50_ms']}ms p95={agg['p95_ms']}ms queries={agg['queries']:<3} "
+                  f"| {n} calls p50={fan['p50_ms']}ms queries={fan['queries']}")
+    finally:
+        counter.close()
+        cleanup(db, est_ids, all_providers)
+        db.close()
+
+    path = write_results("bench_establishment", {"day": day.isoformat(), "sizes": results}, args.out)
+    print(f"resultado: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
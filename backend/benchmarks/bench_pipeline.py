@@ -0,0 +1,389 @@
+"""
+Benchmark do pipeline de notificações: outbox.relay -> notifications.send -> requeue_stuck.
+
+Roda as tasks reais contra o Postgres do DATABASE_URL, mas sem Redis nem provedor
+WhatsApp:
+  - broker em memória neste processo: `apply_async` das tasks vai para uma fila por
+    ETA (countdown de retry respeitado) consumida por `--workers` threads; o que
+    escapar cai no modo eager do Celery;
+  - notificador stub (processo separado) em NOTIF_HTTP_BASE_URL com latência
+    `--latency-ms` e taxas de 429 (`--rate-429`) e 5xx (`--rate-5xx`);
+  - o "beat" é uma thread: relay a cada `--relay-interval` e requeue_stuck a cada
+    `--requeue-interval` (defaults = beat_schedule de celery_app).
+Circuit breaker em memória (NOTIF_CIRCUIT_STORAGE=memory, se não definido), um por
+worker com `--pool prefork` (default) ou um compartilhado com `--pool threads`.
+
+Semeia `--events` agendamentos com APPT_CREATED no outbox e mede até todas as
+mensagens ficarem SENT (ou FAILED sem tentativas restantes): tempo de drenagem,
+mensagens/s, envios duplicados vistos pelo stub (deve ser 0) e statements SQL por
+mensagem, no total e por task.
+
+Uso (Postgres com migrations):
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --events 5000 --workers 16 --relay-interval 0.2 --rate-5xx 0.05
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+# sem Redis: o breaker precisa ser escolhido antes de app.workers.tasks ser importado
+os.environ.setdefault("NOTIF_CIRCUIT_STORAGE", "memory")
+
+from celery.exceptions import Retry  # noqa: E402
+from sqlalchemy import create_engine, delete, event, text  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.models.appointment import Appointment  # noqa: E402
+from app.models.notification_message import NotificationMessage  # noqa: E402
+from app.models.outbox import Outbox  # noqa: E402
+from app.models.provider import Provider  # noqa: E402
+from app.models.provider_daily_stats import ProviderDailyStats  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.workers import tasks  # noqa: E402
+from app.workers.breaker import build_breaker  # noqa: E402
+from app.workers.celery_app import celery  # noqa: E402
+from benchmarks.common import write_results  # noqa: E402
+
+
+def _stub_notifier(port_q, run_tag: str, latency_ms: float, rate_429: float, rate_5xx: float, seed: int) -> None:
+    """
+    Provedor WhatsApp falso. GET /stats devolve os contadores: envios aceitos por evento
+    do benchmark (variables.bench_run/seq) e envios de eventos de fora ("foreign").
+    """
+    rnd = random.Random(seed)
+    lock = threading.Lock()
+    statuses: Counter = Counter()
+    accepted: Counter = Counter()
+    foreign = [0]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, body: bytes = b"") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            with lock:
+                body = {"statuses": dict(statuses), "accepted": len(accepted), "foreign": foreign[0],
+                        "duplicates": sum(n - 1 for n in accepted.values() if n > 1)}
+            self._reply(200, json.dumps(body).encode())
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if latency_ms:
+                time.sleep(latency_ms / 1000.0)
+            with lock:
+                roll = rnd.random()
+                status = 429 if roll < rate_429 else 503 if roll < rate_429 + rate_5xx else 200
+                statuses[status] += 1
+                variables = payload.get("variables") or {}
+                if status == 200 and variables.get("bench_run") == run_tag:
+                    accepted[(payload["template"], variables.get("seq"))] += 1
+                elif status == 200:
+                    foreign[0] += 1
+            self._reply(status, b'{"id":"stub"}' if status == 200 else b"{}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_q.put(server.server_address[1])
+    server.serve_forever()
+
+
+class LocalBroker:
+    """Fila em memória ordenada por ETA, consumida por N threads (no lugar do Redis + workers)."""
+
+    def __init__(self, workers: int, current_task: threading.local):
+        self._heap: list = []
+        self._cv = threading.Condition()
+        self._seq = itertools.count()
+        self._inflight = 0
+        self._stop = False
+        self._current = current_task
+        self.stats: Counter = Counter()
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+
+    def patch(self, task) -> None:
+        def apply_async(args=None, kwargs=None, **options):
+            self.put(task, tuple(args or ()), kwargs or {}, options.get("countdown") or 0, options.get("retries") or 0)
+        task.apply_async = apply_async
+
+    def put(self, task, args: tuple, kwargs: dict, countdown: float, retries: int) -> None:
+        with self._cv:
+            heapq.heappush(self._heap, (time.monotonic() + countdown, next(self._seq), task, args, kwargs, retries))
+            self.stats["published"] += 1
+            if retries:
+                self.stats["retries"] += 1
+            self._cv.notify()
+
+    def start(self) -> None:
+        for t in self._threads:
+            t.start()
+
+    def stop(self) -> None:
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+        for t in self._threads:
+            t.join(timeout=10)
+
+    def idle(self) -> bool:
+        with self._cv:
+            return not self._heap and not self._inflight
+
+    def _work(self) -> None:
+        while True:
+            with self._cv:
+                while not self._stop and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cv.wait(timeout=(self._heap[0][0] - time.monotonic()) if self._heap else None)
+                if self._stop:
+                    return
+                _, _, task, args, kwargs, retries = heapq.heappop(self._heap)
+                self._inflight += 1
+            # mesmo contexto que o worker do Celery monta: retry() publica de novo via apply_async
+            task.push_request(id=str(uuid.uuid4()), args=args, kwargs=kwargs, retries=retries,
+                              is_eager=False, called_directly=False, delivery_info={})
+            self._current.name = task.name
+            outcome = "executed"
+            try:
+                task.run(*args, **kwargs)
+            except Retry:
+                pass
+            except Exception:
+                outcome = "errors"
+            finally:
+                task.pop_request()
+                self._current.name = None
+                with self._cv:
+                    self._inflight -= 1
+                    self.stats[outcome] += 1
+
+
+class PerWorkerBreaker:
+    """
+    Um breaker por thread, como no prefork (um processo = um breaker). Com um breaker só,
+    o pybreaker segura um lock durante a chamada HTTP e as threads enviam uma de cada vez.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, func):
+        breaker = getattr(self._local, "breaker", None)
+        if breaker is None:
+            breaker = self._local.breaker = build_breaker(tasks.settings, "notifications-http", exclude=(ValueError,))
+        return breaker(func)
+
+
+def _beat_interval(task_name: str, default: float) -> float:
+    for entry in celery.conf.beat_schedule.values():
+        if entry["task"] == task_name:
+            return float(entry["schedule"])
+    return default
+
+
+def _seed(n: int, tag: str) -> tuple:
+    db = SessionLocal()
+    user = User(email=f"bench-pipeline-{tag}@loadtest.example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    provider = Provider(user_id=user.id, display_name=f"Pipeline {tag}")
+    db.add(provider)
+    db.flush()
+    t0 = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=400)
+    db.execute(
+        text(
+            """
+            INSERT INTO appointments (id, user_id, provider_id, starts_at, ends_at, status)
+            SELECT gen_random_uuid(), :uid, :pid, :t0 + make_interval(mins => 30 * g),
+                   :t0 + make_interval(mins => 30 * g + 30), 'CONFIRMED'
+            FROM generate_series(0, :n - 1) g
+            """
+        ),
+        {"uid": user.id, "pid": provider.id, "t0": t0, "n": n},
+    )
+    db.execute(
+        text(
+            """
+            INSERT INTO outbox (id, aggregate_type, aggregate_id, event_type, payload, headers)
+            SELECT gen_random_uuid(), 'Appointment', a.id, 'APPT_CREATED',
+                   jsonb_build_object('provider_id', a.provider_id, 'starts_at', a.starts_at, 'ends_at', a.ends_at,
+                                      'bench_run', CAST(:tag AS text), 'seq', row_number() OVER (ORDER BY a.starts_at)), '{}'
+            FROM appointments a WHERE a.provider_id = :pid
+            ORDER BY a.starts_at
+            """
+        ),
+        {"pid": provider.id, "tag": tag},
+    )
+    ids = (user.id, provider.id)
+    db.commit()
+    db.close()
+    return ids
+
+
+def _cleanup(user_id, provider_id) -> None:
+    db = SessionLocal()
+    appt_ids = db.execute(text("SELECT id FROM appointments WHERE provider_id = :pid"), {"pid": provider_id}).scalars().all()
+    db.execute(delete(NotificationMessage).where(NotificationMessage.appointment_id.in_(appt_ids)))
+    db.execute(delete(Outbox).where(Outbox.aggregate_id.in_(appt_ids)))
+    db.execute(delete(ProviderDailyStats).where(ProviderDailyStats.provider_id == provider_id))
+    db.execute(delete(Appointment).where(Appointment.provider_id == provider_id))
+    db.execute(delete(Provider).where(Provider.id == provider_id))
+    db.execute(delete(User).where(User.id == user_id))
+    db.commit()
+    db.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--events", type=int, default=1000, help="eventos APPT_CREATED semeados no outbox")
+    p.add_argument("--workers", type=int, default=8, help="threads consumindo o broker em memória")
+    p.add_argument("--pool", choices=("prefork", "threads"), default="prefork",
+                   help="prefork: um circuit breaker por worker; threads: um breaker compartilhado (como -P threads)")
+    p.add_argument("--latency-ms", type=float, default=50.0, help="latência do notificador stub")
+    p.add_argument("--rate-429", type=float, default=0.02)
+    p.add_argument("--rate-5xx", type=float, default=0.03)
+    p.add_argument("--relay-batch", type=int, default=50, help="batch_size do outbox.relay")
+    p.add_argument("--relay-interval", type=float, default=_beat_interval("outbox.relay", 2.0))
+    p.add_argument("--requeue-interval", type=float, default=_beat_interval("notifications.requeue_stuck", 60.0))
+    p.add_argument("--max-seconds", type=float, default=600.0)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    tag = uuid.uuid4().hex[:8]
+    port_q = multiprocessing.Queue()
+    stub = multiprocessing.Process(target=_stub_notifier, args=(port_q, tag, args.latency_ms, args.rate_429, args.rate_5xx, args.seed), daemon=True)
+    stub.start()
+    stub_url = f"http://127.0.0.1:{port_q.get(timeout=10)}"
+    tasks.settings.notif_http_base_url = stub_url
+
+    # statements SQL do pipeline (o monitor usa outro engine e não entra na conta)
+    current = threading.local()
+    statements: Counter = Counter()
+    stmt_lock = threading.Lock()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        with stmt_lock:
+            statements[getattr(current, "name", None) or "other"] += 1
+
+    if args.pool == "prefork":
+        tasks._breaker = PerWorkerBreaker()
+    celery.conf.task_always_eager = True  # salvaguarda: nada vai para um broker de verdade
+    broker = LocalBroker(args.workers, current)
+    for t in (tasks.send_notification, tasks.relay_outbox, tasks.requeue_stuck, tasks.deliver_webhooks):
+        broker.patch(t)
+
+    with SessionLocal() as db:
+        pending = db.execute(text("SELECT count(*) FROM outbox WHERE published_at IS NULL")).scalar()
+    if pending:
+        print(f"aviso: {pending} eventos pendentes no outbox de fora do benchmark entram no relay (foreign_sends)")
+    user_id, provider_id = _seed(args.events, tag)
+    monitor = create_engine(settings.database_url)
+    terminal_q = text(
+        """
+        SELECT count(*) FILTER (WHERE m.status = 'SENT') AS sent,
+               count(*) FILTER (WHERE m.status = 'FAILED' AND m.attempts >= :max_attempts) AS dead,
+               count(*) AS total,
+               coalesce(sum(m.attempts), 0) AS attempts
+        FROM notification_messages m JOIN appointments a ON a.id = m.appointment_id
+        WHERE a.provider_id = :pid
+        """
+    )
+    stop = threading.Event()
+
+    def beat() -> None:
+        next_relay = next_requeue = time.monotonic()
+        while not stop.is_set():
+            now = time.monotonic()
+            if now >= next_relay:
+                current.name = "outbox.relay"
+                tasks.relay_outbox.run(args.relay_batch)
+                next_relay = now + args.relay_interval
+            if now >= next_requeue:
+                current.name = "notifications.requeue_stuck"
+                tasks.requeue_stuck.run()
+                next_requeue = now + args.requeue_interval
+            current.name = None
+            stop.wait(max(0.0, min(next_relay, next_requeue) - time.monotonic()))
+
+    result: dict = {}
+    # notifications.send imprime cada envio; fora do relatório
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        quiet.__enter__()
+        broker.start()
+        t0 = time.monotonic()
+        beat_thread = threading.Thread(target=beat, daemon=True)
+        beat_thread.start()
+        drained = False
+        while time.monotonic() - t0 < args.max_seconds:
+            with monitor.connect() as conn:
+                row = conn.execute(terminal_q, {"pid": provider_id, "max_attempts": settings.notif_failed_max_attempts}).one()
+            if row.total == args.events and row.sent + row.dead == args.events and broker.idle():
+                drained = True
+                break
+            time.sleep(0.1)
+        elapsed = time.monotonic() - t0
+        stop.set()
+        beat_thread.join(timeout=30)
+        broker.stop()
+        stub_stats = httpx.get(f"{stub_url}/stats", timeout=5).json()
+
+        total_statements = sum(statements.values())
+        result = {
+            "drained": drained,
+            "drain_seconds": round(elapsed, 2),
+            "messages_per_s": round(row.sent / elapsed, 1) if elapsed else None,
+            "sent": row.sent,
+            "dead": row.dead,
+            "send_attempts_recorded": int(row.attempts),
+            "duplicate_sends": stub_stats["duplicates"],
+            "foreign_sends": stub_stats["foreign"],
+            "stub_responses": stub_stats["statuses"],
+            "broker": dict(broker.stats),
+            "db_statements": {
+                "total": total_statements,
+                "per_message": round(total_statements / args.events, 2),
+                "by_task": {k: round(v / args.events, 2) for k, v in sorted(statements.items())},
+            },
+        }
+    finally:
+        quiet.__exit__(None, None, None)
+        stop.set()
+        broker.stop()
+        stub.terminate()
+        monitor.dispose()
+        _cleanup(user_id, provider_id)
+
+    print(json.dumps(result, indent=2))
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    path = write_results("bench_pipeline", {"config": config, **result}, args.out)
+    print(f"resultado: {path}")
+    return 0 if result.get("drained") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+"""
+Benchmark de filas Celery: latência da primeira tentativa com backlog de retries.
+
+Cenário: `--backlog` mensagens (default 50k) já estão na fila de retentativas quando
+os workers sobem; em seguida chegam confirmações novas (primeira tentativa) a cada
+`--probe-interval`. Mede quanto cada confirmação espera até executar e quanto tempo
+o backlog leva para drenar.
+
+Modos:
+  - routed: roteamento de app/workers/celery_app.py — retries em `notifications.retry`
+    (prioridade PRIORITY_RETRY, pool próprio) e primeira tentativa em `notifications`;
+  - shared: comportamento anterior — tudo numa fila só, sem distinção de prioridade,
+    um pool com a soma das concorrências.
+
+As tasks de benchmark ficam neste módulo (`bench.*`) e não tocam no banco: o trabalho
+é um sleep de `--work-ms`, como uma chamada HTTP ao provedor. Workers são processos
+`celery worker` reais (`-P threads`) contra o broker de CELERY_BROKER_URL; latências
+vão para listas no Redis de REDIS_URL.
+
+Uso (com Redis de pé):
+    python -m benchmarks.bench_queues
+    python -m benchmarks.bench_queues --backlog 5000 --modes routed
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import redis
+
+from app.core.config import settings
+from app.workers.celery_app import (
+    PRIORITY_FIRST_ATTEMPT,
+    PRIORITY_RETRY,
+    QUEUE_NOTIFICATIONS,
+    QUEUE_NOTIFICATIONS_RETRY,
+    celery,
+)
+from benchmarks.common import percentile, write_results
+
+QUEUE_SHARED = "bench.shared"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _redis() -> redis.Redis:
+    return redis.Redis.from_url(settings.redis_url)
+
+
+@celery.task(name="bench.first_attempt", ignore_result=True)
+def first_attempt(run_key: str, enqueued_at: float) -> None:
+    _redis().rpush(f"{run_key}:latency", time.time() - enqueued_at)
+
+
+@celery.task(name="bench.retry_work", ignore_result=True)
+def retry_work(run_key: str, work_ms: float) -> None:
+    time.sleep(work_ms / 1000.0)
+    _redis().incr(f"{run_key}:drained")
+
+
+def _purge(queues: list[str]) -> None:
+    with celery.connection_for_write() as conn:
+        for q in queues:
+            conn.default_channel.queue_purge(q)
+
+
+def _publish_backlog(run_key: str, n: int, queue: str, priority: int | None, work_ms: float) -> float:
+    t0 = time.monotonic()
+    opts = {"queue": queue}
+    if priority is not None:
+        opts["priority"] = priority
+    with celery.producer_or_acquire() as producer:
+        for _ in range(n):
+            retry_work.apply_async((run_key, work_ms), producer=producer, **opts)
+    return time.monotonic() - t0
+
+
+def _start_worker(name: str, queues: str, concurrency: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "celery", "-A", "app.workers.celery_app:celery", "worker",
+         "--include", "benchmarks.bench_queues", "-Q", queues, "-P", "threads", "-c", str(concurrency),
+         "--prefetch-multiplier", "1", "-n", f"{name}@%h", "-l", "WARNING",
+         "--without-gossip", "--without-mingle", "--without-heartbeat"],
+        cwd=BACKEND_DIR,
+    )
+
+
+def _wait_workers(names: list[str], timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    pending = set(names)
+    while pending and time.monotonic() < deadline:
+        for reply in celery.control.ping(timeout=0.5) or []:
+            for node in reply:
+                pending.discard(node.split("@", 1)[0])
+    if pending:
+        raise SystemExit(f"workers não responderam: {', '.join(sorted(pending))}")
+
+
+def _ms(v: float | None) -> float | None:
+    return round(v, 2) if v is not None else None
+
+
+def run_mode(mode: str, args: argparse.Namespace) -> dict:
+    tag = uuid.uuid4().hex[:8]
+    run_key = f"bench:queues:{tag}"
+    r = _redis()
+
+    if mode == "routed":
+        backlog_queue, backlog_priority = QUEUE_NOTIFICATIONS_RETRY, PRIORITY_RETRY
+        probe_queue, probe_priority = QUEUE_NOTIFICATIONS, PRIORITY_FIRST_ATTEMPT
+        workers = [
+            (f"bench-first-{tag}", QUEUE_NOTIFICATIONS, args.first_concurrency),
+            (f"bench-retry-{tag}", QUEUE_NOTIFICATIONS_RETRY, args.retry_concurrency),
+        ]
+    else:
+        backlog_queue, backlog_priority = QUEUE_SHARED, None
+        probe_queue, probe_priority = QUEUE_SHARED, None
+        workers = [(f"bench-shared-{tag}", QUEUE_SHARED, args.first_concurrency + args.retry_concurrency)]
+
+    _purge([backlog_queue, probe_queue])
+    publish_s = _publish_backlog(run_key, args.backlog, backlog_queue, backlog_priority, args.work_ms)
+    print(f"[{mode}] backlog de {args.backlog} publicado em {publish_s:.1f}s")
+
+    procs = [_start_worker(name, queues, c) for name, queues, c in workers]
+    try:
+        started = time.monotonic()
+        _wait_workers([name for name, _, _ in workers])
+
+        probe_opts = {"queue": probe_queue}
+        if probe_priority is not None:
+            probe_opts["priority"] = probe_priority
+        sent = 0
+        drained_at = None
+        deadline = started + args.max_seconds
+        while time.monotonic() < deadline:
+            if sent < args.probes:
+                first_attempt.apply_async((run_key, time.time()), **probe_opts)
+                sent += 1
+            drained = int(r.get(f"{run_key}:drained") or 0)
+            if drained_at is None and drained >= args.backlog:
+                drained_at = time.monotonic()
+            if sent >= args.probes and drained_at is not None and r.llen(f"{run_key}:latency") >= sent:
+                break
+            time.sleep(args.probe_interval)
+
+        latencies = sorted(float(x) * 1000 for x in r.lrange(f"{run_key}:latency", 0, -1))
+        drained = int(r.get(f"{run_key}:drained") or 0)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=30)
+        _purge([backlog_queue, probe_queue])
+        r.delete(f"{run_key}:latency", f"{run_key}:drained")
+
+    return {
+        "workers": [{"name": n, "queues": q, "concurrency": c} for n, q, c in workers],
+        "probes_sent": sent,
+        "probes_done": len(latencies),
+        "first_attempt_latency_ms": {
+            "p50": _ms(percentile(latencies, 50)),
+            "p95": _ms(percentile(latencies, 95)),
+            "p99": _ms(percentile(latencies, 99)),
+            "max": _ms(latencies[-1] if latencies else None),
+        },
+        "backlog_drained": drained,
+        "drain_seconds": round(drained_at - started, 2) if drained_at else None,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--modes", default="routed,shared", help="lista separada por vírgula: routed, shared")
+    p.add_argument("--backlog", type=int, default=50_000, help="mensagens de retry pré-enfileiradas")
+    p.add_argument("--probes", type=int, default=200, help="confirmações novas (primeira tentativa)")
+    p.add_argument("--probe-interval", type=float, default=0.05, help="segundos entre confirmações novas")
+    p.add_argument("--work-ms", type=float, default=2.0, help="duração simulada de cada envio de retry")
+    p.add_argument("--first-concurrency", type=int, default=4)
+    p.add_argument("--retry-concurrency", type=int, default=8)
+    p.add_argument("--max-seconds", type=float, default=600.0, help="limite por modo")
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - {"routed", "shared"}
+    if unknown:
+        p.error(f"modo desconhecido: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for mode in modes:
+        res = run_mode(mode, args)
+        results[mode] = res
+        lat = res["first_attempt_latency_ms"]
+        print(f"[{mode}] primeira tentativa p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms "
+              f"({res['probes_done']}/{res['probes_sent']}) drain={res['drain_seconds']}s "
+              f"({res['backlog_drained']}/{args.backlog})")
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    path = write_results("bench_queues", {"config": config, "modes": results}, args.out)
+    print(f"resultado: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
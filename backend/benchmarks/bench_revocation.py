@@ -0,0 +1,193 @@
+"""
+Benchmark da checagem de revogação de access tokens (get_current_user_id).
+
+Para cada N em --revocations grava N revogações vigentes em revoked_access_tokens,
+faz a carga completa de um RevocationList novo (como no início de um processo da
+API) e mede, sobre --requests tokens válidos:
+  - decode do JWT (o que a rota já fazia) vs a checagem de revogação somada a ele;
+  - o probe no Bloom filter sozinho e quantos tokens válidos foram ao banco
+    (falsos positivos; alvo ~TOKEN_REVOCATION_BLOOM_FP_RATE);
+  - tokens revogados de fato (--revoked-sample): todos rejeitados, cada um com
+    uma leitura pela PK;
+  - a atualização incremental depois de --burst revogações novas.
+A checagem roda in-process contra o DATABASE_URL do ambiente (migrations
+aplicadas). Os dados criados são removidos no final.
+
+Uso:
+    python -m benchmarks.bench_revocation
+    python -m benchmarks.bench_revocation --revocations 0,100000 --requests 50000
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import random
+import time
+import uuid
+
+from sqlalchemy import delete, text
+
+from app.core.config import settings
+from app.core.security import create_access_token, decode_access_token
+from app.db.session import SessionLocal
+from app.models.revoked_access_token import RevokedAccessToken
+from app.models.user import User
+from app.services.token_revocation import RevocationList
+from benchmarks.common import percentile, write_results
+
+
+def _seed(db, user_id, tag: str, start: int, n: int, spread_minutes: float = 0) -> None:
+    """
+    n revogações com jti = md5(tag || i), i em [start, start + n). Com spread_minutes,
+    revoked_at fica espalhado nesse passado (revogações acumuladas ao longo da vida dos
+    tokens) em vez de tudo agora, que a atualização incremental releria.
+    """
+    if n <= 0:
+        return
+    db.execute(
+        text(
+            """
+            INSERT INTO revoked_access_tokens (jti, user_id, revoked_at, expires_at)
+            SELECT md5(:tag || g), :uid, r, r + make_interval(mins => :life)
+            FROM (
+                SELECT g, now() - random() * make_interval(secs => :spread * 60) AS r
+                FROM generate_series(CAST(:a AS int), CAST(:b AS int)) g
+            ) s
+            """
+        ),
+        {"tag": tag, "uid": user_id, "a": start, "b": start + n - 1,
+         "spread": float(spread_minutes), "life": settings.access_token_expires_min},
+    )
+    db.commit()
+
+
+def _us(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "mean": round(sum(values) / len(values) * 1e6, 2) if values else None,
+        "p50": round(percentile(values, 50) * 1e6, 2) if values else None,
+        "p99": round(percentile(values, 99) * 1e6, 2) if values else None,
+    }
+
+
+def _time_each(fn, items) -> list[float]:
+    out = []
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def run_case(db, user_id, tag: str, n: int, tokens: list[str], args) -> dict:
+    db.execute(delete(RevokedAccessToken).where(RevokedAccessToken.user_id == user_id))
+    db.commit()
+    t0 = time.perf_counter()
+    _seed(db, user_id, tag, 0, n, spread_minutes=settings.access_token_expires_min * 0.9)
+    seed_s = time.perf_counter() - t0
+
+    rl = RevocationList(settings.token_revocation_refresh_seconds, settings.token_revocation_bloom_capacity, args.fp_rate)
+    t0 = time.perf_counter()
+    rl.load()
+    load_s = time.perf_counter() - t0
+    bloom = rl._filter
+
+    jtis = [decode_access_token(t)["jti"] for t in tokens]
+    for t in tokens[:1000]:  # aquecimento
+        decode_access_token(t)
+
+    # decode e checagem medidos no mesmo loop, token a token
+    decode_lat: list[float] = []
+    check_lat: list[float] = []
+    before = rl.exact_lookups
+    for tok in tokens:
+        t0 = time.perf_counter()
+        claims = decode_access_token(tok)
+        t1 = time.perf_counter()
+        if rl.is_revoked(claims["jti"]):
+            raise AssertionError("valid token rejected")
+        check_lat.append(time.perf_counter() - t1)
+        decode_lat.append(t1 - t0)
+    false_positives = rl.exact_lookups - before
+    probe = _time_each(bloom.__contains__, jtis)
+
+    revoked_lat: list[float] = []
+    rejected = 0
+    if n:
+        sample = random.Random(args.seed).sample(range(n), min(args.revoked_sample, n))
+        for i in sample:
+            jti = hashlib.md5(f"{tag}{i}".encode()).hexdigest()
+            t0 = time.perf_counter()
+            rejected += rl.is_revoked(jti)
+            revoked_lat.append(time.perf_counter() - t0)
+
+    # revogações novas de "outro processo" chegam pela atualização incremental
+    _seed(db, user_id, tag, n, args.burst)
+    t0 = time.perf_counter()
+    rl.refresh()
+    refresh_s = time.perf_counter() - t0
+    burst_seen = sum(hashlib.md5(f"{tag}{i}".encode()).hexdigest() in bloom for i in range(n, n + args.burst))
+
+    stats = rl.stats()
+    return {
+        "seed_seconds": round(seed_s, 2),
+        "load_seconds": round(load_s, 3),
+        "filter": {"entries": stats["entries"], "capacity": stats["capacity"], "bytes": stats["filter_bytes"], "hashes": bloom.hashes},
+        "decode_us": _us(decode_lat),
+        "revocation_check_us": _us(check_lat),
+        "bloom_probe_us": _us(probe),
+        "valid_tokens": len(tokens),
+        "false_positive_lookups": false_positives,
+        "false_positive_rate": round(false_positives / len(tokens), 5),
+        "revoked_checked": len(revoked_lat),
+        "revoked_rejected": rejected,
+        "revoked_check_ms": {k: (round(v / 1000, 3) if v is not None else None) for k, v in _us(revoked_lat).items()},
+        "incremental_refresh_ms": round(refresh_s * 1000, 2),
+        "burst_visible_after_refresh": f"{burst_seen}/{args.burst}",
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--revocations", default="0,1000000", help="revogações vigentes por caso")
+    p.add_argument("--requests", type=int, default=100000, help="tokens válidos checados por caso")
+    p.add_argument("--revoked-sample", type=int, default=1000, help="tokens revogados checados por caso")
+    p.add_argument("--burst", type=int, default=1000, help="revogações novas antes da atualização incremental")
+    p.add_argument("--fp-rate", type=float, default=settings.token_revocation_bloom_fp_rate)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    sizes = [int(x) for x in args.revocations.split(",") if x.strip()]
+    tag = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    user = User(email=f"bench-revocation-{tag}@loadtest.example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    # tokens distintos (jti aleatório); o decode domina o custo, não a quantidade
+    tokens = [create_access_token(str(uuid.uuid4())) for _ in range(args.requests)]
+    results = {}
+    try:
+        for n in sizes:
+            res = results[n] = run_case(db, user_id, tag, n, tokens, args)
+            print(f"N={n:<8} load={res['load_seconds']}s filtro={res['filter']['bytes'] / 1e6:.1f}MB "
+                  f"decode={res['decode_us']['mean']}us check={res['revocation_check_us']['mean']}us "
+                  f"probe={res['bloom_probe_us']['mean']}us fp={res['false_positive_lookups']}/{res['valid_tokens']} "
+                  f"revogados={res['revoked_rejected']}/{res['revoked_checked']} ({res['revoked_check_ms']['mean']}ms) "
+                  f"refresh={res['incremental_refresh_ms']}ms")
+    finally:
+        db.rollback()
+        db.execute(delete(RevokedAccessToken).where(RevokedAccessToken.user_id == user_id))
+        db.execute(delete(User).where(User.id == user_id))
+        db.commit()
+        db.close()
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    path = write_results("bench_revocation", {"config": config, "cases": results}, args.out)
+    print(f"resultado: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
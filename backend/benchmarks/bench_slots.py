@@ -0,0 +1,228 @@
+"""
+Microbenchmarks de geração de slots e conversão de fuso (código puro, sem banco).
+
+Cobre app.services.slots (usado por GET /providers/{id}/availability e por
+_is_within_work_hours em POST /appointments):
+  - formatos de expediente (bloco único, partido, muitos blocos curtos, 24h);
+  - dias de transição de DST (America/Sao_Paulo histórico, New_York, Lisboa, Lord_Howe);
+  - dias quase lotados (taken_utc grande);
+  - intervalos ocupados com durações mistas fora da grade (overlapping_starts e
+    free_slots, o caminho de GET /providers/{id}/availability) a 50% e 95%;
+  - verificação de expediente (fits_work_blocks) com acerto/erro.
+
+Cada caso é medido com timeit (melhor de N repetições, µs por chamada) e comparado
+ao baseline gravado em benchmarks/baselines/slots.json. Se algum caso ficar mais
+lento que baseline * (1 + threshold), o script sai com código 1.
+
+Uso:
+    python -m benchmarks.bench_slots                      # compara com o baseline
+    python -m benchmarks.bench_slots --update-baseline    # regrava o baseline
+    python -m benchmarks.bench_slots -k dst --threshold 0.3
+
+Baselines dependem da máquina: regrave-os no hardware onde a comparação roda (CI).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import timeit
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Callable
+from zoneinfo import ZoneInfo
+
+from app.services.slots import UTC, available_slots, candidate_slots, fits_work_blocks, free_slots, overlapping_starts
+from benchmarks.common import write_results
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "slots.json"
+
+SHAPES = {
+    "single": [(time(8, 0), time(18, 0))],
+    "split": [(time(8, 0), time(12, 0)), (time(13, 30), time(19, 0))],
+    "many_short": [(time(h, 0), time(h, 45)) for h in range(7, 19)],
+    "odd_edges": [(time(7, 15), time(11, 50)), (time(12, 10), time(19, 45))],
+    "full_day": [(time(0, 0), time(23, 59))],
+}
+
+# (zona, dia) — dias de transição de DST e um dia comum de referência
+DAYS = {
+    "sao_paulo": ("America/Sao_Paulo", date(2026, 10, 20)),
+    "sao_paulo_dst_start": ("America/Sao_Paulo", date(2018, 11, 4)),
+    "sao_paulo_dst_end": ("America/Sao_Paulo", date(2019, 2, 16)),
+    "new_york_dst_start": ("America/New_York", date(2026, 3, 8)),
+    "new_york_dst_end": ("America/New_York", date(2026, 11, 1)),
+    "lisbon_dst_start": ("Europe/Lisbon", date(2026, 3, 29)),
+    "lord_howe_dst_start": ("Australia/Lord_Howe", date(2026, 10, 4)),
+}
+
+PAST = datetime(2000, 1, 1, tzinfo=UTC)
+
+
+def _taken_fraction(day: date, blocks, tzinfo, fraction: float) -> set[datetime]:
+    slots = candidate_slots(day, blocks, tzinfo)
+    n = int(len(slots) * fraction)
+    return {s.astimezone(UTC) for s in slots[:n]}
+
+
+BUSY_MINUTES = (15, 30, 45, 60, 90)
+
+
+def _busy_fraction(day: date, blocks, tzinfo, fraction: float, seed: int = 7) -> list[tuple[datetime, datetime]]:
+    """
+    Agendamentos de durações mistas (15-90 min, começando em múltiplos de 15) que
+    cobrem `fraction` dos minutos de expediente; ordem embaralhada, como vem do banco.
+    """
+    rnd = random.Random(seed)
+    tiles = []
+    for start, end in blocks:
+        cur = datetime.combine(day, start, tzinfo)
+        stop = datetime.combine(day, end, tzinfo)
+        while cur < stop:
+            nxt = min(cur + timedelta(minutes=rnd.choice(BUSY_MINUTES)), stop)
+            tiles.append((cur.astimezone(UTC), nxt.astimezone(UTC)))
+            cur = nxt
+    total = sum((e - s for s, e in tiles), timedelta())
+    rnd.shuffle(tiles)
+    busy, covered = [], timedelta()
+    for s, e in tiles:
+        if covered >= total * fraction:
+            break
+        busy.append((s, e))
+        covered += e - s
+    return busy
+
+
+def build_cases() -> dict[str, Callable[[], object]]:
+    cases: dict[str, Callable[[], object]] = {}
+
+    # 1) formatos de expediente em um dia comum
+    tz_name, day = DAYS["sao_paulo"]
+    for shape, blocks in SHAPES.items():
+        cases[f"available/{shape}/sao_paulo/empty"] = (
+            lambda b=blocks, d=day, z=tz_name: available_slots(d, b, ZoneInfo(z), set(), PAST)
+        )
+
+    # 2) dias de transição de DST (bloco 24h cruza a transição)
+    for label, (z, d) in DAYS.items():
+        if label == "sao_paulo":
+            continue
+        for shape in ("full_day", "split"):
+            blocks = SHAPES[shape]
+            cases[f"available/{shape}/{label}/empty"] = (
+                lambda b=blocks, d=d, z=z: available_slots(d, b, ZoneInfo(z), set(), PAST)
+            )
+
+    # 3) dias quase lotados (taken grande: conversão/lookup por slot)
+    for shape in ("single", "full_day"):
+        blocks = SHAPES[shape]
+        for fraction in (0.5, 0.95):
+            taken = _taken_fraction(day, blocks, ZoneInfo(tz_name), fraction)
+            cases[f"available/{shape}/sao_paulo/booked{int(fraction * 100)}"] = (
+                lambda b=blocks, t=taken: available_slots(day, b, ZoneInfo(tz_name), t, PAST)
+            )
+
+    # 3b) intervalos ocupados (appointments de durações mistas) -> slots sobrepostos
+    for shape in ("single", "full_day"):
+        blocks = SHAPES[shape]
+        tzinfo = ZoneInfo(tz_name)
+        slots = candidate_slots(day, blocks, tzinfo)
+        for fraction in (0.5, 0.95):
+            busy = _busy_fraction(day, blocks, tzinfo, fraction)
+            label = f"{shape}/sao_paulo/busy{int(fraction * 100)}"
+            cases[f"overlap/{label}"] = lambda s=slots, b=busy: overlapping_starts(s, b)
+            cases[f"free/{label}"] = (
+                lambda bl=blocks, b=busy: free_slots(day, bl, ZoneInfo(tz_name), b, set(), PAST)
+            )
+
+    # 4) verificação de expediente no POST /appointments
+    for shape in ("single", "many_short"):
+        blocks = SHAPES[shape]
+        hit = datetime.combine(day, time(17, 0), ZoneInfo(tz_name))
+        miss = datetime.combine(day, time(21, 0), ZoneInfo(tz_name))
+        cases[f"fits/{shape}/hit"] = lambda b=blocks, s=hit: fits_work_blocks(b, s)
+        cases[f"fits/{shape}/miss"] = lambda b=blocks, s=miss: fits_work_blocks(b, s)
+    z, d = DAYS["new_york_dst_start"]
+    dst_start = datetime.combine(d, time(1, 30), ZoneInfo(z))
+    cases["fits/full_day/new_york_dst_start"] = lambda s=dst_start: fits_work_blocks(SHAPES["full_day"], s)
+
+    # 5) conversão de fuso pura: local -> UTC para um dia inteiro de slots
+    local = candidate_slots(day, SHAPES["full_day"], ZoneInfo(tz_name))
+    cases["tz/astimezone_utc/48_slots"] = lambda s=local: [x.astimezone(UTC) for x in s]
+    cases["tz/zoneinfo_lookup"] = lambda: ZoneInfo(tz_name)
+    return cases
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float) -> dict:
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    # garante pelo menos `min_time` segundos por repetição
+    if elapsed < min_time:
+        number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    runs = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min_us": round(min(runs), 3),
+        "median_us": round(statistics.median(runs), 3),
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text()).get("cases", {})
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-k", "--filter", default=None, help="roda só casos cujo nome contém o texto")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--min-time", type=float, default=0.2, help="segundos mínimos por repetição")
+    p.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_THRESHOLD", "0.20")),
+                   help="regressão tolerada sobre o baseline (0.20 = +20%%)")
+    p.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    p.add_argument("--update-baseline", action="store_true")
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    cases = build_cases()
+    if args.filter:
+        cases = {k: v for k, v in cases.items() if args.filter in k}
+
+    baseline = load_baseline(args.baseline)
+    results: dict[str, dict] = {}
+    regressions: list[str] = []
+    for name, fn in cases.items():
+        r = measure(fn, args.repeat, args.min_time)
+        base = baseline.get(name)
+        if base:
+            r["baseline_min_us"] = base["min_us"]
+            r["ratio"] = round(r["min_us"] / base["min_us"], 3)
+            if r["ratio"] > 1.0 + args.threshold:
+                regressions.append(name)
+        results[name] = r
+        flag = " REGRESSION" if name in regressions else ""
+        ratio = f" x{r['ratio']:.2f}" if "ratio" in r else ""
+        print(f"{name:<52} {r['min_us']:>10.2f} µs{ratio}{flag}")
+
+    path = write_results("bench_slots", {"threshold": args.threshold, "cases": results}, args.out)
+    print(f"resultado: {path}")
+
+    if args.update_baseline:
+        merged = {**baseline, **{k: {"min_us": v["min_us"]} for k, v in results.items()}}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({"cases": dict(sorted(merged.items()))}, indent=2) + "\n")
+        print(f"baseline atualizado: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} caso(s) acima do threshold de {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+"""
+Benchmark do stream SSE de disponibilidade (GET /providers/{id}/availability/stream).
+
+Sobe um uvicorn local (1 processo = 1 listener) contra o DATABASE_URL do ambiente,
+abre `--clients` conexões SSE no mesmo prestador/dia e faz `--ops` agendamentos e
+cancelamentos alternados pela API. Mede:
+  - latência do início do POST/DELETE até cada cliente receber o delta (p50/p99
+    sobre todos os clientes) e quantos deltas se perderam (deve ser 0);
+  - RSS do servidor antes e depois das conexões (memória por conexão).
+O recálculo acontece uma vez por evento no grupo, não por cliente: o custo no
+banco não cresce com `--clients` (ao contrário do polling).
+
+Uso (Postgres com migrations aplicadas):
+    python -m benchmarks.bench_sse
+    python -m benchmarks.bench_sse --clients 2000 --ops 40
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import httpx
+
+from benchmarks.bench_queues import _ms
+from benchmarks.common import percentile, write_results
+from benchmarks.load_booking import _start_server
+
+TZ = "America/Sao_Paulo"
+
+
+def _rss_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+async def _listen(client: httpx.AsyncClient, url: str, received: dict, ready: asyncio.Event, counter: list) -> None:
+    """Um cliente SSE: anota (versão -> instante) de cada delta recebido."""
+    async with client.stream("GET", url) as r:
+        r.raise_for_status()
+        event_id = None
+        async for line in r.aiter_lines():
+            if line.startswith("id: "):
+                event_id = int(line[4:])
+            elif line.startswith("event: snapshot"):
+                counter[0] += 1
+                if counter[0] == counter[1]:
+                    ready.set()
+            elif line.startswith("event: slot-"):
+                received.setdefault(event_id, time.perf_counter())
+
+
+async def run(args: argparse.Namespace, server_pid: int) -> dict:
+    limits = httpx.Limits(max_connections=args.clients + 10, max_keepalive_connections=args.clients + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        tag = uuid.uuid4().hex[:8]
+        owner = (await client.post("/auth/signup", json={"email": f"sse-owner-{tag}@loadtest.example.com", "password": "load-test-pwd"})).json()
+        booker = (await client.post("/auth/signup", json={"email": f"sse-client-{tag}@loadtest.example.com", "password": "load-test-pwd"})).json()
+        auth = {"Authorization": f"Bearer {owner['access_token']}"}
+        booker_auth = {"Authorization": f"Bearer {booker['access_token']}"}
+        pid = (await client.post("/providers", json={"display_name": f"SSE {tag}"}, headers=auth)).json()["id"]
+        for weekday in range(7):
+            r = await client.post(f"/providers/{pid}/work-hours", json={"weekday": weekday, "start_time": "08:00", "end_time": "18:00"}, headers=auth)
+            r.raise_for_status()
+        day = datetime.now(ZoneInfo(TZ)).date() + timedelta(days=1)
+
+        rss_before = _rss_mb(server_pid)
+        url = f"/providers/{pid}/availability/stream?date={day.isoformat()}&tz={TZ}"
+        received = [dict() for _ in range(args.clients)]
+        ready = asyncio.Event()
+        counter = [0, args.clients]
+        t_connect = time.perf_counter()
+        listeners = [asyncio.create_task(_listen(client, url, received[i], ready, counter)) for i in range(args.clients)]
+        await asyncio.wait_for(ready.wait(), timeout=120)
+        connect_s = time.perf_counter() - t_connect
+        await asyncio.sleep(1.0)
+        rss_after = _rss_mb(server_pid)
+
+        # cada op gera uma versão nova do grupo: 1, 2, 3...
+        sent_at: dict[int, float] = {}
+        op_lat: list[float] = []
+        appt_id = None
+        for version in range(1, args.ops + 1):
+            t0 = time.perf_counter()
+            sent_at[version] = t0
+            if appt_id is None:
+                starts = datetime.combine(day, datetime.min.time().replace(hour=9), ZoneInfo(TZ))
+                r = await client.post("/appointments", json={"provider_id": pid, "starts_at_iso": starts.isoformat(), "tz": TZ}, headers=booker_auth)
+                r.raise_for_status()
+                appt_id = r.json()["id"]
+            else:
+                r = await client.delete(f"/appointments/{appt_id}", headers=booker_auth)
+                r.raise_for_status()
+                appt_id = None
+            op_lat.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(args.interval)
+        await asyncio.sleep(2.0)
+        for t in listeners:
+            t.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+
+    lat = sorted(
+        (got[v] - sent_at[v]) * 1000
+        for got in received for v in got if v in sent_at
+    )
+    expected = args.clients * args.ops
+    return {
+        "connect_seconds": round(connect_s, 2),
+        "deltas_expected": expected,
+        "deltas_received": len(lat),
+        "delivery_ms": {"p50": _ms(percentile(lat, 50)), "p95": _ms(percentile(lat, 95)), "p99": _ms(percentile(lat, 99)), "max": _ms(lat[-1] if lat else None)},
+        "write_ms": {"p50": _ms(percentile(sorted(op_lat), 50)), "p99": _ms(percentile(sorted(op_lat), 99))},
+        "server_rss_mb": {"before": rss_before, "after": rss_after},
+        "rss_kb_per_connection": round((rss_after - rss_before) * 1024 / args.clients, 1) if rss_before and rss_after else None,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--clients", type=int, default=1000, help="conexões SSE simultâneas")
+    p.add_argument("--ops", type=int, default=20, help="agendamentos/cancelamentos alternados")
+    p.add_argument("--interval", type=float, default=0.5, help="pausa entre escritas (s)")
+    p.add_argument("--port", type=int, default=8766)
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+    args.base_url = f"http://127.0.0.1:{args.port}"
+    args.server_workers = 1
+
+    proc = _start_server(args)
+    try:
+        result = asyncio.run(run(args, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    print(json.dumps(result, indent=2))
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "base_url")}
+    path = write_results("bench_sse", {"config": config, **result}, args.out)
+    print(f"resultado: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,248 @@
+"""
+Benchmark de webhooks: isolamento entre parceiros e custo do lote.
+
+Sobe um servidor HTTP stub local com quatro endpoints e uma assinatura para cada:
+  - fast          (batch 1)   responde na hora;
+  - fast-batched  (batch 25)  responde na hora, eventos agrupados por POST;
+  - slow          (batch 1)   dorme `--slow-ms` por request (parceiro lento);
+  - flaky         (batch 5)   devolve 500/429 em `--flaky-error-rate` dos requests.
+O stub confere a assinatura HMAC de cada POST (bad_signatures deve ser 0).
+
+Cria `--events` agendamentos com APPT_CREATED no outbox a `--rate` por segundo;
+o relay e o dispatch rodam neste processo (fazendo o papel do beat) e as entregas
+num `celery worker` real (`-Q webhooks`, prefork) contra CELERY_BROKER_URL.
+Mede, por endpoint, a latência de criação do evento até o recebimento: fast não
+deve piorar por causa do slow/flaky.
+
+Uso (Postgres com migrations e Redis de pé):
+    python -m benchmarks.bench_webhooks
+    python -m benchmarks.bench_webhooks --events 200 --slow-ms 0
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import delete, select
+
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+from app.models.notification_message import NotificationMessage
+from app.models.outbox import Outbox
+from app.models.provider import Provider
+from app.models.provider_daily_stats import ProviderDailyStats
+from app.models.user import User
+from app.models.webhook import WebhookDelivery, WebhookSubscription
+from app.services.outbox import enqueue_event
+from app.services.webhooks import SIGNATURE_HEADER
+from app.workers import tasks
+from app.workers.celery_app import QUEUE_WEBHOOKS, celery
+from benchmarks.bench_queues import BACKEND_DIR, _ms, _redis, _wait_workers
+from benchmarks.common import percentile, write_results
+
+ENDPOINTS = {
+    # nome: (batch_size, max_concurrency)
+    "fast": (1, 2),
+    "fast-batched": (25, 2),
+    "slow": (1, 2),
+    "flaky": (5, 2),
+}
+
+
+def _stub_server(port_q, run_key: str, secrets: dict[str, str], slow_ms: float, flaky_error_rate: float, seed: int) -> None:
+    """Processo separado: não disputa o GIL com o relay/criação de eventos deste processo."""
+    rnd = random.Random(seed)
+    r = _redis()
+
+    def verify(name: str, header: str, body: bytes) -> bool:
+        try:
+            parts = dict(p.split("=", 1) for p in header.split(","))
+            expected = hmac.new(secrets[name].encode(), f"{parts['t']}.".encode() + body, hashlib.sha256).hexdigest()
+            return hmac.compare_digest(expected, parts["v1"])
+        except (KeyError, ValueError):
+            return False
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive: o cliente do endpoint reaproveita a conexão
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, headers: dict | None = None) -> None:
+            self.send_response(status)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            name = self.path.strip("/")
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            r.hincrby(f"{run_key}:requests", name, 1)
+            if not verify(name, self.headers.get(SIGNATURE_HEADER, ""), body):
+                r.incr(f"{run_key}:bad_signatures")
+            if name == "slow" and slow_ms:
+                time.sleep(slow_ms / 1000.0)
+            if name == "flaky" and rnd.random() < flaky_error_rate:
+                r.hincrby(f"{run_key}:errors", name, 1)
+                self._reply(429 if rnd.random() < 0.5 else 500, {"Retry-After": "1"})
+                return
+            now = time.time()
+            for ev in json.loads(body)["events"]:
+                r.hsetnx(f"{run_key}:received:{name}", ev["id"], now)
+            self._reply(204)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_q.put(server.server_address[1])
+    server.serve_forever()
+
+
+def _start_worker(name: str, concurrency: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "celery", "-A", "app.workers.celery_app:celery", "worker",
+         "-Q", QUEUE_WEBHOOKS, "-c", str(concurrency),
+         "--prefetch-multiplier", "1", "-n", f"{name}@%h", "-l", "WARNING",
+         "--without-gossip", "--without-mingle", "--without-heartbeat"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+def _beat(stop: threading.Event) -> None:
+    """Papel do beat: relay a cada 0,2s e dispatch a cada 1s."""
+    last_dispatch = 0.0
+    while not stop.is_set():
+        tasks.relay_outbox(200)
+        if time.monotonic() - last_dispatch > 1.0:
+            tasks.dispatch_webhooks()
+            last_dispatch = time.monotonic()
+        stop.wait(0.2)
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--events", type=int, default=500)
+    p.add_argument("--rate", type=float, default=50.0, help="eventos por segundo")
+    p.add_argument("--slow-ms", type=float, default=2000.0)
+    p.add_argument("--flaky-error-rate", type=float, default=0.3)
+    p.add_argument("--concurrency", type=int, default=8, help="processos do worker de webhooks")
+    p.add_argument("--max-seconds", type=float, default=120.0, help="espera máxima pelas entregas rápidas")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default=None, help="diretório de saída (default: benchmarks/results)")
+    args = p.parse_args(argv)
+
+    # notificações WhatsApp fora do escopo: o relay só cria as mensagens
+    tasks.send_notification.apply_async = lambda *a, **k: None
+
+    tag = uuid.uuid4().hex[:8]
+    run_key = f"bench:webhooks:{tag}"
+    secrets = {name: uuid.uuid4().hex for name in ENDPOINTS}
+    port_q = multiprocessing.Queue()
+    stub = multiprocessing.Process(
+        target=_stub_server, args=(port_q, run_key, secrets, args.slow_ms, args.flaky_error_rate, args.seed), daemon=True
+    )
+    stub.start()
+    base_url = f"http://127.0.0.1:{port_q.get(timeout=10)}"
+    r = _redis()
+
+    db = SessionLocal()
+    user = User(email=f"bench-{tag}@loadtest.example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    provider = Provider(user_id=user.id, display_name=f"Webhooks {tag}")
+    db.add(provider)
+    db.flush()
+    for name, (batch_size, max_concurrency) in ENDPOINTS.items():
+        db.add(WebhookSubscription(user_id=user.id, provider_id=provider.id, url=f"{base_url}/{name}",
+                                   secret=secrets[name], batch_size=batch_size, max_concurrency=max_concurrency))
+    db.commit()
+
+    # backoff curto para o flaky se recuperar dentro do benchmark; o stub escuta em 127.0.0.1
+    env = {**os.environ, "WEBHOOK_BACKOFF_BASE_SECONDS": "0.5", "WEBHOOK_BACKOFF_MAX_SECONDS": "5",
+           "WEBHOOK_ALLOW_PRIVATE_HOSTS": "true"}
+    worker_name = f"bench-webhooks-{tag}"
+    with celery.connection_for_write() as conn:
+        conn.default_channel.queue_purge(QUEUE_WEBHOOKS)
+    proc = _start_worker(worker_name, args.concurrency, env)
+    stop = threading.Event()
+    beat = threading.Thread(target=_beat, args=(stop,), daemon=True)
+    created: dict[str, float] = {}
+    appt_ids: list = []
+    try:
+        _wait_workers([worker_name])
+        beat.start()
+        start_at = datetime.now(timezone.utc) + timedelta(days=365)
+        t0 = time.monotonic()
+        for i in range(args.events):
+            starts = start_at + timedelta(minutes=30 * i)
+            appt = Appointment(user_id=user.id, provider_id=provider.id, starts_at=starts, ends_at=starts + timedelta(minutes=30), status="CONFIRMED")
+            db.add(appt)
+            db.flush()
+            ev = enqueue_event(db, "Appointment", str(appt.id), "APPT_CREATED", {"provider_id": str(provider.id), "starts_at": starts.isoformat()})
+            db.commit()
+            created[str(ev.id)] = time.time()
+            appt_ids.append(appt.id)
+            time.sleep(max(0.0, t0 + (i + 1) / args.rate - time.monotonic()))
+
+        deadline = time.monotonic() + args.max_seconds
+        while time.monotonic() < deadline:
+            if all(r.hlen(f"{run_key}:received:{n}") >= args.events for n in ("fast", "fast-batched", "flaky")):
+                break
+            time.sleep(0.2)
+    finally:
+        stop.set()
+        beat.join(timeout=10)
+        proc.terminate()
+        proc.wait(timeout=30)
+        stub.terminate()
+        sub_ids = db.execute(select(WebhookSubscription.id).where(WebhookSubscription.provider_id == provider.id)).scalars().all()
+        db.execute(delete(WebhookDelivery).where(WebhookDelivery.subscription_id.in_(sub_ids)))
+        db.execute(delete(WebhookSubscription).where(WebhookSubscription.id.in_(sub_ids)))
+        db.execute(delete(NotificationMessage).where(NotificationMessage.appointment_id.in_(appt_ids)))
+        db.execute(delete(Outbox).where(Outbox.aggregate_id.in_(appt_ids)))
+        db.execute(delete(ProviderDailyStats).where(ProviderDailyStats.provider_id == provider.id))
+        db.execute(delete(Appointment).where(Appointment.provider_id == provider.id))
+        db.execute(delete(Provider).where(Provider.id == provider.id))
+        db.execute(delete(User).where(User.id == user.id))
+        db.commit()
+        db.close()
+
+    results = {}
+    requests = {k.decode(): int(v) for k, v in r.hgetall(f"{run_key}:requests").items()}
+    errors = {k.decode(): int(v) for k, v in r.hgetall(f"{run_key}:errors").items()}
+    bad_signatures = int(r.get(f"{run_key}:bad_signatures") or 0)
+    for name in ENDPOINTS:
+        received = {k.decode(): float(v) for k, v in r.hgetall(f"{run_key}:received:{name}").items()}
+        lat = sorted((received[eid] - created[eid]) * 1000 for eid in received if eid in created)
+        results[name] = {
+            "received": len(lat),
+            "requests": requests.get(name, 0),
+            "errors_returned": errors.get(name, 0),
+            "latency_ms": {"p50": _ms(percentile(lat, 50)), "p95": _ms(percentile(lat, 95)), "p99": _ms(percentile(lat, 99))},
+        }
+        res = results[name]
+        print(f"{name:<13} recebidos={res['received']}/{args.events} requests={res['requests']:<4} erros={res['errors_returned']:<3} "
+              f"p50={res['latency_ms']['p50']}ms p99={res['latency_ms']['p99']}ms")
+    print(f"assinaturas inválidas: {bad_signatures}")
+    r.delete(*[f"{run_key}:{k}" for k in ("requests", "errors", "bad_signatures")], *[f"{run_key}:received:{n}" for n in ENDPOINTS])
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    path = write_results("bench_webhooks", {"config": config, "endpoints": results, "bad_signatures": bad_signatures}, args.out)
+    print(f"resultado: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
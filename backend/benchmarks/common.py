@@ -0,0 +1,96 @@
+"""
+Utilidades compartilhadas pelos benchmarks (métricas, percentis e saída JSON).
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import platform
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Percentil nearest-rank sobre uma lista já ordenada."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class OpStats:
+    """Acumula latências (segundos) e status HTTP de uma operação."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: list[float] = []
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def record(self, status: int | str, elapsed: float) -> None:
+        self.latencies.append(elapsed)
+        self.statuses[str(status)] += 1
+
+    def record_error(self, exc: BaseException, elapsed: float) -> None:
+        self.latencies.append(elapsed)
+        self.statuses["error"] += 1
+        self.errors[type(exc).__name__] += 1
+
+    def summary(self, duration_s: float) -> dict:
+        lat = sorted(self.latencies)
+        total = len(lat)
+        n_409 = self.statuses.get("409", 0)
+        n_5xx = sum(v for k, v in self.statuses.items() if k.isdigit() and k.startswith("5"))
+
+        def ms(v: float | None) -> float | None:
+            return round(v * 1000.0, 3) if v is not None else None
+
+        return {
+            "requests": total,
+            "throughput_rps": round(total / duration_s, 2) if duration_s > 0 else None,
+            "latency_ms": {
+                "p50": ms(percentile(lat, 50)),
+                "p95": ms(percentile(lat, 95)),
+                "p99": ms(percentile(lat, 99)),
+                "max": ms(lat[-1] if lat else None),
+            },
+            "status": dict(sorted(self.statuses.items())),
+            "rate_409": round(n_409 / total, 4) if total else 0.0,
+            "rate_5xx": round(n_5xx / total, 4) if total else 0.0,
+            "errors": dict(self.errors),
+        }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def write_results(kind: str, payload: dict, out_dir: str | os.PathLike | None = None) -> Path:
+    """Grava o resultado como JSON em benchmarks/results/<kind>-<commit>-<ts>.json."""
+    commit = git_commit() or "nogit"
+    now = datetime.now(timezone.utc)
+    target = Path(out_dir) if out_dir else RESULTS_DIR
+    target.mkdir(parents=True, exist_ok=True)
+    doc = {
+        "kind": kind,
+        "commit": commit,
+        "generated_at": now.isoformat(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        **payload,
+    }
+    path = target / f"{kind}-{commit}-{now.strftime('%Y%m%dT%H%M%SZ')}.json"
+    path.write_text(json.dumps(doc, indent=2, sort_keys=False, default=str))
+    return path
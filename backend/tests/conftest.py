@@ -0,0 +1,89 @@
+"""
+Fixtures dos testes que passam pela API contra o Postgres do DATABASE_URL (migrations aplicadas).
+
+`api` cria usuários/prestadores pelas rotas e, no fim do teste, apaga tudo o que eles
+geraram. Sem banco, os testes que usam `api` são pulados.
+"""
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core.security import decode_access_token
+from app.db.session import engine
+from app.main import create_app
+from app.services.slots import db_weekday
+
+# apaga na ordem das FKs; :p = prestadores, :u = usuários criados no teste
+_CLEANUP_SQL = [
+    "DELETE FROM notification_messages WHERE appointment_id IN (SELECT id FROM appointments WHERE provider_id = ANY(:p) OR user_id = ANY(:u))",
+    "DELETE FROM provider_calendar_events WHERE provider_id = ANY(:p)",
+    "DELETE FROM outbox WHERE aggregate_id IN (SELECT id FROM appointments WHERE provider_id = ANY(:p) OR user_id = ANY(:u))",
+    "DELETE FROM appointments WHERE provider_id = ANY(:p) OR user_id = ANY(:u)",
+    "DELETE FROM slot_holds WHERE provider_id = ANY(:p) OR user_id = ANY(:u)",
+    "DELETE FROM provider_slots WHERE provider_id = ANY(:p)",
+    "DELETE FROM slot_bookings WHERE provider_id = ANY(:p)",
+    "DELETE FROM provider_daily_stats WHERE provider_id = ANY(:p)",
+    "DELETE FROM provider_work_hours WHERE provider_id = ANY(:p)",
+    "DELETE FROM webhook_subscriptions WHERE provider_id = ANY(:p)",
+    "DELETE FROM providers WHERE id = ANY(:p)",
+    "DELETE FROM revoked_access_tokens WHERE user_id = ANY(:u)",
+    "DELETE FROM users WHERE id = ANY(:u)",
+]
+
+
+@pytest.fixture(scope="session")
+def pg():
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1 FROM appointments LIMIT 1"))
+    except OperationalError as e:
+        pytest.skip(f"Postgres indisponível: {e.orig}")
+    return engine
+
+
+class Api:
+    def __init__(self, client: TestClient):
+        self.client = client
+        self.user_ids: list = []
+        self.provider_ids: list = []
+
+    def signup(self) -> dict:
+        r = self.client.post("/auth/signup", json={"email": f"test-{uuid.uuid4().hex[:10]}@example.com", "password": "pw-test-1"})
+        assert r.status_code == 201, r.text
+        token = r.json()["access_token"]
+        self.user_ids.append(uuid.UUID(decode_access_token(token)["sub"]))
+        return {"Authorization": f"Bearer {token}"}
+
+    def provider(self, headers: dict, day: date, start: str = "09:00", end: str = "12:00", **kw) -> str:
+        """Prestador com expediente [start, end) no dia da semana de `day`."""
+        r = self.client.post("/providers", json={"display_name": "Prestador teste", **kw}, headers=headers)
+        assert r.status_code == 201, r.text
+        pid = r.json()["id"]
+        self.provider_ids.append(pid)
+        r = self.client.post(f"/providers/{pid}/work-hours",
+                             json={"weekday": db_weekday(day), "start_time": start, "end_time": end}, headers=headers)
+        assert r.status_code == 201, r.text
+        return pid
+
+    def cleanup(self) -> None:
+        with engine.begin() as conn:
+            params = {"p": [uuid.UUID(p) for p in self.provider_ids], "u": self.user_ids}
+            for sql in _CLEANUP_SQL:
+                conn.execute(text(sql), params)
+
+
+@pytest.fixture
+def api(pg):
+    a = Api(TestClient(create_app()))
+    yield a
+    a.cleanup()
+
+
+@pytest.fixture
+def day() -> date:
+    """Um dia à frente, longe o bastante para não cruzar "agora" em nenhum fuso."""
+    return date.today() + timedelta(days=7)
@@ -0,0 +1,109 @@
+"""Circuit breaker compartilhado (app/workers/breaker.py) contra um Redis em memória (fakeredis)."""
+import threading
+import time
+
+import pybreaker
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.core.config import settings
+from app.workers import breaker as breaker_mod
+
+FAIL_MAX = 3
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    """Cada build_breaker ganha o seu cliente, todos no mesmo servidor (como processos distintos)."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(breaker_mod.redis.Redis, "from_url", classmethod(lambda cls, *a, **kw: fakeredis.FakeRedis(server=server)))
+    return fakeredis.FakeRedis(server=server)
+
+
+@pytest.fixture
+def breaker_settings():
+    return settings.model_copy(update={
+        "notif_circuit_storage": "redis",
+        "notif_circuit_fail_max": FAIL_MAX,
+        "notif_circuit_reset_seconds": 60,
+    })
+
+
+def _fail():
+    raise RuntimeError("upstream down")
+
+
+def _trip(cb):
+    for _ in range(FAIL_MAX):
+        with pytest.raises((RuntimeError, pybreaker.CircuitBreakerError)):
+            cb.call(_fail)
+
+
+def _expire_open_timeout(r, name: str):
+    # opened_at no passado: o próximo call passa para half-open sem esperar reset_timeout
+    # (o setter do pybreaker só avança o valor, então grava direto na chave)
+    for key in r.scan_iter(f"*breaker:{name}*opened_at"):
+        r.set(key, int(time.time()) - 120)
+
+
+def test_tripped_state_is_shared_between_instances(shared_redis, breaker_settings):
+    a = breaker_mod.build_breaker(breaker_settings, "test-shared")
+    b = breaker_mod.build_breaker(breaker_settings, "test-shared")
+    assert isinstance(a._state_storage, pybreaker.CircuitRedisStorage)
+
+    _trip(a)
+    assert a.current_state == pybreaker.STATE_OPEN
+    assert b.current_state == pybreaker.STATE_OPEN
+
+    calls = []
+    with pytest.raises(pybreaker.CircuitBreakerError):
+        b.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_single_half_open_probe_across_instances(shared_redis, breaker_settings):
+    a = breaker_mod.build_breaker(breaker_settings, "test-probe")
+    b = breaker_mod.build_breaker(breaker_settings, "test-probe")
+    c = breaker_mod.build_breaker(breaker_settings, "test-probe")
+    _trip(a)
+    _expire_open_timeout(shared_redis, "test-probe")
+
+    entered, release = threading.Event(), threading.Event()
+    probes = []
+
+    def slow_probe():
+        probes.append(1)
+        entered.set()
+        assert release.wait(5)
+        return "ok"
+
+    result = {}
+    t = threading.Thread(target=lambda: result.setdefault("a", a.call(slow_probe)))
+    t.start()
+    assert entered.wait(5)
+
+    # enquanto o teste de A está em voo, os outros processos não chamam o upstream
+    for other in (b, c):
+        assert other.current_state == pybreaker.STATE_HALF_OPEN
+        with pytest.raises(pybreaker.CircuitBreakerError):
+            other.call(slow_probe)
+    assert probes == [1]
+
+    release.set()
+    t.join(5)
+    assert result["a"] == "ok"
+    assert b.current_state == pybreaker.STATE_CLOSED
+    assert b.call(lambda: "closed") == "closed"
+    assert shared_redis.get("breaker:test-probe:probe") is None
+
+
+def test_failed_probe_reopens_for_everyone(shared_redis, breaker_settings):
+    a = breaker_mod.build_breaker(breaker_settings, "test-reopen")
+    b = breaker_mod.build_breaker(breaker_settings, "test-reopen")
+    _trip(a)
+    _expire_open_timeout(shared_redis, "test-reopen")
+
+    with pytest.raises((RuntimeError, pybreaker.CircuitBreakerError)):
+        a.call(_fail)
+    assert b.current_state == pybreaker.STATE_OPEN
@@ -0,0 +1,90 @@
+"""Rollup diário (provider_daily_stats): cancelamento repetido não mexe nos contadores."""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select, text, update
+
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+from app.models.outbox import Outbox
+from app.services.daily_stats import apply_appointment_events, rebuild_daily_stats
+
+TZ = "America/Sao_Paulo"
+
+
+def _book(api, h, pid, day, hhmm="10:00"):
+    r = api.client.post("/appointments", json={"provider_id": pid, "starts_at_iso": f"{day}T{hhmm}:00-03:00", "tz": TZ}, headers=h)
+    assert r.status_code == 201, r.text
+    return r.json()["id"]
+
+
+def _pending_events(db, pid) -> list:
+    return db.execute(
+        select(Outbox)
+        .where(Outbox.published_at.is_(None),
+               Outbox.aggregate_id.in_(select(Appointment.id).where(Appointment.provider_id == pid)))
+        .order_by(Outbox.created_at)
+        .with_for_update()
+    ).scalars().all()
+
+
+def _relay(pid, events=None) -> None:
+    """O que o outbox.relay faz com os eventos do prestador: aplica o lote e marca publicado."""
+    with SessionLocal() as db:
+        rows = _pending_events(db, pid)
+        apply_appointment_events(db, rows if events is None else events(rows))
+        db.execute(update(Outbox).where(Outbox.id.in_([r.id for r in rows])).values(published_at=func.now()))
+        db.commit()
+
+
+def _rollup(pg, pid) -> tuple:
+    with pg.connect() as conn:
+        row = conn.execute(
+            text("SELECT booked, canceled, booked_minutes FROM provider_daily_stats WHERE provider_id = :p"), {"p": pid}
+        ).one()
+    return tuple(row)
+
+
+def _rebuilt(pg, pid) -> tuple:
+    with SessionLocal() as db:
+        rebuild_daily_stats(db, provider_id=pid)
+        db.commit()
+    return _rollup(pg, pid)
+
+
+def test_concurrent_duplicate_cancel_counts_once(api, pg, day):
+    pid = api.provider(api.signup(), day)
+    h = api.signup()
+    appt_id = _book(api, h, pid, day)
+    _relay(pid)
+    assert _rollup(pg, pid) == (1, 0, 30)
+
+    # dois DELETEs chegam à escrita juntos (linha travada por outra conexão até os dois esperarem)
+    blocker = pg.connect()
+    tx = blocker.begin()
+    blocker.execute(text("SELECT 1 FROM appointments WHERE id = :id FOR UPDATE"), {"id": appt_id})
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(api.client.delete, f"/appointments/{appt_id}", headers=h) for _ in range(2)]
+        time.sleep(0.5)
+        tx.rollback()
+        blocker.close()
+        assert [f.result(timeout=10).status_code for f in futures] == [200, 200]
+    # e um terceiro, depois
+    assert api.client.delete(f"/appointments/{appt_id}", headers=h).status_code == 200
+
+    _relay(pid)
+    assert _rollup(pg, pid) == (1, 1, 0)
+    assert _rebuilt(pg, pid) == (1, 1, 0)
+
+
+def test_duplicate_event_in_a_batch_is_applied_once(api, pg, day):
+    pid = api.provider(api.signup(), day)
+    h = api.signup()
+    appt_id = _book(api, h, pid, day)
+    _book(api, h, pid, day, "11:00")
+    assert api.client.delete(f"/appointments/{appt_id}", headers=h).status_code == 200
+
+    # o mesmo APPT_CANCELED entregue duas vezes no lote
+    _relay(pid, events=lambda rows: rows + [r for r in rows if r.event_type == "APPT_CANCELED"])
+    assert _rollup(pg, pid) == (2, 1, 30)
+    assert _rebuilt(pg, pid) == (2, 1, 30)
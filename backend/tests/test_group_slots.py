@@ -0,0 +1,94 @@
+"""Vagas de horários em grupo (slot_bookings): reservas e cancelamentos concorrentes e disponibilidade."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+TZ = "America/Sao_Paulo"
+CAPACITY = 4
+
+
+def _at(day, hhmm: str) -> str:
+    return f"{day}T{hhmm}:00-03:00"
+
+
+def _book(api, h, pid, day, hhmm="10:00"):
+    return api.client.post("/appointments", json={"provider_id": pid, "starts_at_iso": _at(day, hhmm), "tz": TZ}, headers=h)
+
+
+def _booked(pg, pid) -> int:
+    with pg.connect() as conn:
+        return conn.execute(text("SELECT coalesce(sum(booked), 0) FROM slot_bookings WHERE provider_id = :p"), {"p": pid}).scalar()
+
+
+def _concurrently(calls):
+    barrier = threading.Barrier(len(calls))
+
+    def run(call):
+        barrier.wait(5)
+        return call()
+
+    with ThreadPoolExecutor(len(calls)) as pool:
+        return list(pool.map(run, calls))
+
+
+def test_last_seat_is_sold_once(api, pg, day):
+    pid = api.provider(api.signup(), day, slot_capacity=CAPACITY)
+    clients = [api.signup() for _ in range(CAPACITY + 1)]
+
+    results = _concurrently([lambda h=h: _book(api, h, pid, day) for h in clients])
+
+    codes = sorted(r.status_code for r in results)
+    assert codes == [201] * CAPACITY + [409]
+    assert _booked(pg, pid) == CAPACITY
+    with pg.connect() as conn:
+        active = conn.execute(text("SELECT count(*) FROM appointments WHERE provider_id = :p AND status <> 'CANCELED'"), {"p": pid}).scalar()
+    assert active == CAPACITY
+
+
+def test_concurrent_cancels_release_one_seat(api, pg, day):
+    pid = api.provider(api.signup(), day, slot_capacity=CAPACITY)
+    h = api.signup()
+    appt_id = _book(api, h, pid, day).json()["id"]
+    assert _book(api, api.signup(), pid, day).status_code == 201
+    assert _booked(pg, pid) == 2
+
+    # segura a linha do agendamento: os dois DELETEs chegam à escrita antes de qualquer um fazer commit
+    blocker = pg.connect()
+    tx = blocker.begin()
+    blocker.execute(text("SELECT 1 FROM appointments WHERE id = :id FOR UPDATE"), {"id": appt_id})
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(api.client.delete, f"/appointments/{appt_id}", headers=h) for _ in range(2)]
+        time.sleep(0.5)
+        tx.rollback()
+        blocker.close()
+        results = [f.result(timeout=10) for f in futures]
+
+    assert [r.status_code for r in results] == [200, 200]
+    assert all(r.json()["status"] == "CANCELED" for r in results)
+    assert _booked(pg, pid) == 1
+    with pg.connect() as conn:
+        events = conn.execute(
+            text("SELECT count(*) FROM outbox WHERE aggregate_id = :id AND event_type = 'APPT_CANCELED'"), {"id": appt_id}
+        ).scalar()
+    assert events == 1
+
+
+def test_availability_shows_remaining_seats(api, day):
+    pid = api.provider(api.signup(), day, start="10:00", end="11:00", slot_capacity=2)
+
+    def remaining():
+        r = api.client.get(f"/providers/{pid}/availability", params={"date": str(day), "tz": TZ, "include_remaining": "true"})
+        assert r.status_code == 200, r.text
+        return {item["starts_at"][11:16]: item["remaining"] for item in r.json()}
+
+    assert remaining() == {"10:00": 2, "10:30": 2}
+    assert _book(api, api.signup(), pid, day).status_code == 201
+    assert remaining() == {"10:00": 1, "10:30": 2}
+    h = api.signup()
+    appt_id = _book(api, h, pid, day).json()["id"]
+    # lotado: some da lista
+    assert remaining() == {"10:30": 2}
+    assert api.client.delete(f"/appointments/{appt_id}", headers=h).status_code == 200
+    assert remaining() == {"10:00": 1, "10:30": 2}
@@ -0,0 +1,53 @@
+"""Holds de checkout contra agendamentos fora da grade (conflito por sobreposição, não por início exato)."""
+from sqlalchemy import text
+
+TZ = "America/Sao_Paulo"
+
+
+def _at(day, hhmm: str) -> str:
+    return f"{day}T{hhmm}:00-03:00"
+
+
+def _hold(api, h, pid, day, hhmm):
+    return api.client.post("/appointments/holds", json={"provider_id": pid, "starts_at_iso": _at(day, hhmm), "tz": TZ}, headers=h)
+
+
+def _book(api, h, pid, day, hhmm):
+    return api.client.post("/appointments", json={"provider_id": pid, "starts_at_iso": _at(day, hhmm), "tz": TZ}, headers=h)
+
+
+def test_off_grid_booking_cannot_overlap_a_live_hold(api, day):
+    owner_h, a, b = api.signup(), api.signup(), api.signup()
+    pid = api.provider(owner_h, day)
+    assert _hold(api, a, pid, day, "10:00").status_code == 201
+
+    # 10:15 e 09:45 cruzam [10:00, 10:30)
+    for hhmm in ("10:15", "09:45"):
+        r = _book(api, b, pid, day, hhmm)
+        assert r.status_code == 409 and r.json()["detail"] == "slot is held by another client"
+    # encostado não conflita
+    assert _book(api, b, pid, day, "10:30").status_code == 201
+
+    # o dono do hold conclui o checkout
+    assert _book(api, a, pid, day, "10:00").status_code == 201
+
+
+def test_off_grid_hold_cannot_overlap_a_live_hold(api, day):
+    owner_h, a, b = api.signup(), api.signup(), api.signup()
+    pid = api.provider(owner_h, day)
+    assert _hold(api, a, pid, day, "10:00").status_code == 201
+
+    r = _hold(api, b, pid, day, "10:15")
+    assert r.status_code == 409 and r.json()["detail"] == "slot is held by another client"
+    assert _hold(api, b, pid, day, "10:30").status_code == 201
+
+
+def test_own_overlapping_hold_is_consumed_by_the_booking(api, pg, day):
+    owner_h, a = api.signup(), api.signup()
+    pid = api.provider(owner_h, day)
+    assert _hold(api, a, pid, day, "10:00").status_code == 201
+
+    assert _book(api, a, pid, day, "10:15").status_code == 201
+    with pg.connect() as conn:
+        left = conn.execute(text("SELECT count(*) FROM slot_holds WHERE provider_id = :p"), {"p": pid}).scalar()
+    assert left == 0
@@ -0,0 +1,113 @@
+"""Roteamento de leituras do get_read_db: réplica, failover e janela de read-your-writes (sem Postgres)."""
+import time
+
+import pytest
+from fastapi import Response
+from sqlalchemy.exc import OperationalError
+from starlette.requests import Request
+
+from app.api import deps
+from app.core.security import create_access_token
+from app.db.replica import ReplicaHealth
+
+
+class FakeSession:
+    def __init__(self, name: str):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def health(monkeypatch):
+    """Réplica configurada e saudável, sem check real (o último check acabou de acontecer)."""
+    h = ReplicaHealth(engine=object(), interval=3600, max_lag=5)
+    h._checked_at = time.monotonic()
+    monkeypatch.setattr(deps, "replica_health", h)
+    monkeypatch.setattr(deps, "ReadSessionLocal", lambda: FakeSession("replica"))
+    monkeypatch.setattr(deps, "SessionLocal", lambda: FakeSession("primary"))
+    monkeypatch.setattr(deps, "recent_writers", deps.RecentWriters())
+    return h
+
+
+def _request(headers: dict | None = None, cookies: dict | None = None) -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    if cookies:
+        raw.append((b"cookie", "; ".join(f"{k}={v}" for k, v in cookies.items()).encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def _route(request: Request) -> str:
+    gen = deps.get_read_db(request)
+    db = next(gen)
+    gen.close()
+    assert db.closed
+    return db.name
+
+
+def _bearer(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(user_id)}"}
+
+
+def test_healthy_replica_serves_reads(health):
+    assert _route(_request()) == "replica"
+
+
+def test_replica_marked_down_falls_back_to_primary(health):
+    health.mark_down()
+    assert _route(_request()) == "primary"
+
+
+def test_error_on_replica_marks_it_down(health):
+    gen = deps.get_read_db(_request())
+    assert next(gen).name == "replica"
+    with pytest.raises(OperationalError):
+        gen.throw(OperationalError("SELECT 1", {}, Exception("connection lost")))
+    assert not health.is_healthy()
+    assert _route(_request()) == "primary"
+
+
+def test_no_replica_configured_uses_primary(health, monkeypatch):
+    monkeypatch.setattr(deps, "ReadSessionLocal", None)
+    assert _route(_request()) == "primary"
+
+
+def test_cookie_inside_window_reads_primary(health):
+    until = int(time.time()) + 5
+    assert _route(_request(cookies={deps.PRIMARY_UNTIL_COOKIE: str(until)})) == "primary"
+
+
+def test_header_inside_window_reads_primary(health):
+    until = int(time.time()) + 5
+    assert _route(_request(headers={deps.PRIMARY_UNTIL_HEADER: str(until)})) == "primary"
+
+
+@pytest.mark.parametrize("value", [
+    str(int(time.time()) - 1),          # janela vencida
+    str(int(time.time()) + 10 ** 6),    # além de READ_YOUR_WRITES_SECONDS: ignorado
+    "garbage",
+])
+def test_header_or_cookie_outside_window_reads_replica(health, value):
+    assert _route(_request(headers={deps.PRIMARY_UNTIL_HEADER: value})) == "replica"
+    assert _route(_request(cookies={deps.PRIMARY_UNTIL_COOKIE: value})) == "replica"
+
+
+def test_write_marks_the_user_without_cookie_or_header(health):
+    response = Response()
+    deps.mark_recent_write(response, "user-a")
+
+    assert deps.PRIMARY_UNTIL_HEADER in response.headers
+    assert deps.PRIMARY_UNTIL_COOKIE in response.headers["set-cookie"]
+    # app sem cookie: o Bearer basta para ler do primário
+    assert _route(_request(headers=_bearer("user-a"))) == "primary"
+    # outros usuários e requests anônimos seguem na réplica
+    assert _route(_request(headers=_bearer("user-b"))) == "replica"
+    assert _route(_request()) == "replica"
+    assert _route(_request(headers={"Authorization": "Bearer not-a-jwt"})) == "replica"
+
+
+def test_user_mark_expires(health):
+    deps.recent_writers.mark("user-a", time.time() - 1)
+    assert _route(_request(headers=_bearer("user-a"))) == "replica"
@@ -0,0 +1,280 @@
+"""
+Entrega de webhooks (webhooks.deliver) contra um receptor HTTP stub local.
+
+Precisa do Postgres do DATABASE_URL com as migrations aplicadas; sem banco, os testes
+que entregam são pulados. A task roda in-process (chamada direta, sem broker).
+"""
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import OperationalError
+
+from app.db.session import SessionLocal
+from app.models.appointment import Appointment
+from app.models.outbox import Outbox
+from app.models.provider import Provider
+from app.models.user import User
+from app.models.webhook import WebhookDelivery, WebhookSubscription
+from app.services.outbox import enqueue_event
+from app.services.webhooks import SIGNATURE_HEADER, check_public_url, fan_out_events
+from app.workers import tasks
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/hook",
+    "http://localhost:8000/hook",
+    "http://10.0.0.5/hook",
+    "http://172.16.3.4/hook",
+    "http://192.168.1.10/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "http://[fd12:3456::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_non_public_hosts_are_rejected(url):
+    with pytest.raises(ValueError):
+        check_public_url(url)
+    check_public_url(url, allow_private=True)
+
+
+def test_public_address_is_accepted():
+    check_public_url("https://93.184.216.34/hook")
+
+
+# ---------- receptor stub ----------
+
+class StubReceiver:
+    """Servidor HTTP local: responde com os status da fila `responses` (200 quando vazia) e guarda cada POST."""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+        self.responses: list[int] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                stub.requests.append({"headers": dict(self.headers), "body": body})
+                status = stub.responses.pop(0) if stub.responses else 200
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _verify_signature(secret: str, header: str, body: bytes) -> bool:
+    parts = dict(p.split("=", 1) for p in header.split(","))
+    expected = hmac.new(secret.encode(), f"{parts['t']}.".encode() + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, parts["v1"])
+
+
+# ---------- fixtures ----------
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        session.execute(text("SELECT 1 FROM webhook_subscriptions LIMIT 1"))
+    except OperationalError as e:
+        session.close()
+        pytest.skip(f"Postgres indisponível: {e.orig}")
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def stub():
+    s = StubReceiver()
+    yield s
+    s.close()
+
+
+@pytest.fixture
+def task_settings(monkeypatch):
+    """Backoff de milissegundos para o teste não esperar; o stub está em 127.0.0.1."""
+    s = tasks.settings.model_copy(update={
+        "webhook_allow_private_hosts": True,
+        "webhook_backoff_base_seconds": 0.01,
+        "webhook_backoff_max_seconds": 0.01,
+        "webhook_max_attempts": 10,
+        "webhook_disable_after_failures": 3,
+        "webhook_timeout_seconds": 2.0,
+    })
+    monkeypatch.setattr(tasks, "settings", s)
+    return s
+
+
+@pytest.fixture
+def provider(db):
+    tag = uuid.uuid4().hex[:8]
+    user = User(email=f"webhook-test-{tag}@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    p = Provider(user_id=user.id, display_name=f"Webhook test {tag}")
+    db.add(p)
+    db.commit()
+    yield p
+    db.rollback()
+    sub_ids = select(WebhookSubscription.id).where(WebhookSubscription.provider_id == p.id)
+    db.execute(delete(WebhookDelivery).where(WebhookDelivery.subscription_id.in_(sub_ids)))
+    db.execute(delete(WebhookSubscription).where(WebhookSubscription.provider_id == p.id))
+    appt_ids = select(Appointment.id).where(Appointment.provider_id == p.id)
+    db.execute(delete(Outbox).where(Outbox.aggregate_id.in_(appt_ids)))
+    db.execute(delete(Appointment).where(Appointment.provider_id == p.id))
+    db.execute(delete(Provider).where(Provider.id == p.id))
+    db.execute(delete(User).where(User.id == user.id))
+    db.commit()
+
+
+def _subscribe(db, provider, url, **kw) -> WebhookSubscription:
+    sub = WebhookSubscription(user_id=provider.user_id, provider_id=provider.id, url=url, secret=uuid.uuid4().hex, **kw)
+    db.add(sub)
+    db.commit()
+    return sub
+
+
+def _create_events(db, provider, n: int) -> list:
+    """n agendamentos com APPT_CREATED no outbox, já distribuídos para as assinaturas (como o relay faz)."""
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=400)
+    ids = []
+    for i in range(n):
+        starts = start + timedelta(minutes=30 * i)
+        appt = Appointment(user_id=provider.user_id, provider_id=provider.id, starts_at=starts,
+                           ends_at=starts + timedelta(minutes=30), status="CONFIRMED")
+        db.add(appt)
+        db.flush()
+        ev = enqueue_event(db, "Appointment", str(appt.id), "APPT_CREATED", {"provider_id": str(provider.id)})
+        db.flush()
+        ids.append(ev.id)
+    fan_out_events(db, ids)
+    db.commit()
+    return ids
+
+
+def _deliveries(db, sub) -> list:
+    db.expire_all()
+    return db.execute(
+        select(WebhookDelivery).where(WebhookDelivery.subscription_id == sub.id).order_by(WebhookDelivery.id)
+    ).scalars().all()
+
+
+def _wait_backoff(db, sub):
+    db.refresh(sub)
+    if sub.paused_until is not None:
+        time.sleep(max(0.0, (sub.paused_until - datetime.now(timezone.utc)).total_seconds()) + 0.02)
+
+
+# ---------- entrega ----------
+
+def test_signed_batches_reach_the_receiver(db, stub, task_settings, provider):
+    sub = _subscribe(db, provider, stub.url, batch_size=2)
+    event_ids = _create_events(db, provider, 3)
+
+    result = tasks.deliver_webhooks(str(sub.id))
+
+    assert result == {"sent": 3}
+    assert len(stub.requests) == 2  # lotes de 2 + 1
+    received = []
+    for req in stub.requests:
+        assert _verify_signature(sub.secret, req["headers"][SIGNATURE_HEADER], req["body"])
+        received += [e["id"] for e in json.loads(req["body"])["events"]]
+    assert sorted(received) == sorted(str(i) for i in event_ids)
+    assert {d.status for d in _deliveries(db, sub)} == {"SENT"}
+
+
+def test_tampered_body_fails_signature_check(db, stub, task_settings, provider):
+    sub = _subscribe(db, provider, stub.url)
+    _create_events(db, provider, 1)
+    tasks.deliver_webhooks(str(sub.id))
+
+    req = stub.requests[0]
+    assert not _verify_signature(sub.secret, req["headers"][SIGNATURE_HEADER], req["body"] + b" ")
+    assert not _verify_signature("other-secret", req["headers"][SIGNATURE_HEADER], req["body"])
+
+
+def test_failure_backs_off_and_is_retried(db, stub, task_settings, provider):
+    sub = _subscribe(db, provider, stub.url)
+    _create_events(db, provider, 1)
+    stub.responses = [500]
+
+    assert tasks.deliver_webhooks(str(sub.id))["failed"] == "HTTP 500"
+    db.refresh(sub)
+    assert sub.failure_count == 1 and sub.paused_until is not None and sub.active
+    [d] = _deliveries(db, sub)
+    assert (d.status, d.attempts, d.last_error) == ("PENDING", 1, "HTTP 500")
+
+    _wait_backoff(db, sub)
+    assert tasks.deliver_webhooks(str(sub.id)) == {"sent": 1}
+    db.refresh(sub)
+    assert (sub.failure_count, sub.paused_until) == (0, None)
+    [d] = _deliveries(db, sub)
+    assert (d.status, d.attempts) == ("SENT", 2)
+    # mesmo evento nas duas tentativas, com o número da tentativa no header
+    assert stub.requests[0]["body"] == stub.requests[1]["body"]
+    assert [r["headers"]["X-AgendaFacil-Attempt"] for r in stub.requests] == ["1", "2"]
+
+
+def test_subscription_disabled_after_consecutive_failures(db, stub, task_settings, provider):
+    sub = _subscribe(db, provider, stub.url)
+    _create_events(db, provider, 2)
+    stub.responses = [500] * 10
+
+    for _ in range(task_settings.webhook_disable_after_failures):
+        _wait_backoff(db, sub)
+        assert "failed" in tasks.deliver_webhooks(str(sub.id))
+
+    db.refresh(sub)
+    assert not sub.active
+    assert sub.failure_count == task_settings.webhook_disable_after_failures
+    assert {d.status for d in _deliveries(db, sub)} == {"DEAD"}
+    # desativada: nada mais sai para o endpoint
+    _wait_backoff(db, sub)
+    assert tasks.deliver_webhooks(str(sub.id)) == {"skipped": "inactive"}
+    assert len(stub.requests) == task_settings.webhook_disable_after_failures
+
+
+def test_gone_disables_immediately(db, stub, task_settings, provider):
+    sub = _subscribe(db, provider, stub.url)
+    _create_events(db, provider, 1)
+    stub.responses = [410]
+
+    tasks.deliver_webhooks(str(sub.id))
+    db.refresh(sub)
+    assert not sub.active
+    assert [d.status for d in _deliveries(db, sub)] == ["DEAD"]
+
+
+def test_delivery_rechecks_the_resolved_address(db, stub, task_settings, monkeypatch, provider):
+    # cadastrada quando o host era público; agora resolve para loopback
+    monkeypatch.setattr(tasks, "settings", task_settings.model_copy(update={"webhook_allow_private_hosts": False}))
+    sub = _subscribe(db, provider, stub.url)
+    _create_events(db, provider, 1)
+
+    result = tasks.deliver_webhooks(str(sub.id))
+
+    assert "blocked" in result
+    assert stub.requests == []
+    db.refresh(sub)
+    assert not sub.active
+    [d] = _deliveries(db, sub)
+    assert d.status == "DEAD" and d.last_error.startswith("blocked:")